@@ -50,15 +50,22 @@ def open(filename, times=None, elements=None, load_history=True):
             filename = 'opendrift_tmp.nc'
         except:
             raise ValueError('%s does not exist' % filename)
-    n = Dataset(filename)
+    if os.path.isdir(filename):  # Zarr store
+        import zarr
+        iomodule = 'zarr'
+        attributes = zarr.open_consolidated(filename, mode='r').attrs.asdict()
+    else:
+        iomodule = 'netcdf'
+        n = Dataset(filename)
+        attributes = n.__dict__
+        n.close()
     try:
-        module_name = n.opendrift_module
-        class_name = n.opendrift_class
+        module_name = attributes['opendrift_module']
+        class_name = attributes['opendrift_class']
     except:
         raise ValueError(filename + ' does not contain '
                          'necessary global attributes '
                          'opendrift_module and opendrift_class')
-    n.close()
 
     if class_name == 'OpenOil3D':
         class_name = 'OpenOil'
@@ -70,13 +77,13 @@ def open(filename, times=None, elements=None, load_history=True):
     if cls is None:
         from opendrift.models import oceandrift
         cls = oceandrift.OceanDrift
-    o = cls()
+    o = cls(iomodule=iomodule)
     o.io_import_file(filename, times=times, elements=elements, load_history=load_history)
     logger.info('Returning ' + str(type(o)) + ' object')
     return o
 
 def open_xarray(filename, chunks={'trajectory': 50000, 'time': 1000}):
-    '''Import netCDF output file as OpenDrift object of correct class'''
+    '''Import netCDF output file or Zarr store as OpenDrift object of correct class'''
 
     import os
     import pydoc
@@ -89,7 +96,12 @@ def open_xarray(filename, chunks={'trajectory': 50000, 'time': 1000}):
             filename = 'opendrift_tmp.nc'
         except:
             raise ValueError('%s does not exist' % filename)
-    n = xr.open_dataset(filename)
+    if os.path.isdir(filename):  # Zarr store
+        iomodule = 'zarr'
+        n = xr.open_zarr(filename)
+    else:
+        iomodule = 'netcdf'
+        n = xr.open_dataset(filename)
     try:
         module_name = n.opendrift_module
         class_name = n.opendrift_class
@@ -109,7 +121,7 @@ def open_xarray(filename, chunks={'trajectory': 50000, 'time': 1000}):
     if cls is None:
         from opendrift.models import oceandrift
         cls = oceandrift.OceanDrift
-    o = cls()
+    o = cls(iomodule=iomodule)
     o.io_import_file_xarray(filename, chunks=chunks)
 
     logger.info('Returning ' + str(type(o)) + ' object')
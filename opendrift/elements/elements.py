@@ -46,8 +46,25 @@ class LagrangianArray:
                 - lon: longitude (np.float32)
                 - lat: latitude (np.float32)
                 - z: vertical position of the particle in m, positive upwards (above sea surface)
+
+    Storage:
+
+        Array values are stored in preallocated arrays, with capacity for
+        more elements than present, and the attributes are views of the
+        present elements in these arrays. Adding elements (extend and
+        move_elements) thus copies only the new values, and removing the
+        first elements (e.g. when releasing elements in order of seeding
+        time) only moves the start of the views. Other removals compact the
+        remaining values within the same arrays. Arrays obtained from the
+        attributes may hence be overwritten by later removal of elements,
+        and should be copied if they are to be kept.
+        Attributes may still be replaced by new arrays or scalars, which
+        are moved to the storage when elements are next added or removed.
     """
 
+    # Capacity of storage is increased by this factor when exceeded
+    capacity_growth = 1.5
+
     variables = OrderedDict([
         ('ID', {'dtype': np.int32,  # Unique numerical identifier
                 'seed': False,
@@ -98,6 +115,9 @@ class LagrangianArray:
             An empty object may be created by giving no input.
         """
 
+        # Preallocated arrays: [array, index of first element, view]
+        self._storage = {}
+
         # Collect default values in separate dict, for easier access
         default_values = {variable: self.variables[variable]['dtype'](
                           self.variables[variable]['default'])
@@ -156,6 +176,58 @@ class LagrangianArray:
         variables.update(new_variables)
         return variables
 
+    def __getstate__(self):
+        # Only the present values are copied/pickled, not the storage
+        state = self.__dict__.copy()
+        state['_storage'] = {}
+        return state
+
+    def _stored(self, var, values):
+        """Return storage array and start index, if values is the view."""
+        stored = self.__dict__.get('_storage', {}).get(var)
+        if stored is not None and stored[2] is values and \
+                values.base is stored[0]:
+            return stored[0], stored[1]
+        return None, 0
+
+    def _set_view(self, var, array, start, length):
+        view = array[start:start + length]
+        if '_storage' not in self.__dict__:
+            self._storage = {}
+        self._storage[var] = [array, start, view]
+        setattr(self, var, view)
+
+    def _append(self, var, present_data, new_data):
+        """Append values of new_data (array) to present_data (array) of var."""
+        num_present = len(present_data)
+        num_total = num_present + len(new_data)
+        dtype = np.result_type(present_data, new_data)
+        array, start = self._stored(var, present_data)
+        if array is None or array.dtype != dtype or \
+                start + num_total > len(array):
+            capacity = num_total + max(
+                16, int(num_total*(self.capacity_growth - 1)))
+            new_array = np.empty(capacity, dtype=dtype)
+            new_array[0:num_present] = present_data
+            array, start = new_array, 0
+        array[start + num_present:start + num_total] = new_data
+        self._set_view(var, array, start, num_total)
+
+    def _remove(self, var, present_data, keep, num_keep, prefix):
+        """Keep only elements with given (boolean) indices in array of var.
+
+        If prefix is True, all elements but the last num_keep are removed.
+        """
+        array, start = self._stored(var, present_data)
+        if array is None:
+            setattr(self, var, present_data[keep])
+            return
+        if prefix is False:
+            array[start:start + num_keep] = present_data[keep]
+        else:
+            start = start + len(present_data) - num_keep
+        self._set_view(var, array, start, num_keep)
+
     def extend(self, other):
         """Add elements from another object."""
         len_self = len(self)
@@ -175,8 +247,8 @@ class LagrangianArray:
                     present_data = present_data*np.ones(len_self)
                 if not hasattr(new_data, '__len__'):
                     new_data = new_data*np.ones(len_other)
-                setattr(self, var, np.concatenate((present_data,
-                                                   new_data)))
+                self._append(var, np.asarray(present_data),
+                             np.asarray(new_data))
 
     def move_elements(self, other, indices):
         """Remove elements with given indices, and append to another object.
@@ -187,13 +259,17 @@ class LagrangianArray:
         # NB: scalars and 1D arrays are converted to ndarrays and concatenated
         self_len = len(self)
         other_len = len(other)
+        indices = np.asarray(indices, dtype=bool)
+        keep = ~indices
+        num_moved = np.sum(indices)
+        prefix = not indices[num_moved:].any()  # The first elements are moved
         for var in self.variables:
             self_var = getattr(self, var)
             other_var = getattr(other, var)
             if (not isinstance(self_var, np.ndarray) and
                 not isinstance(other_var, np.ndarray)) and \
                     (other_var == self_var):
-                    if np.sum(indices) == len(self):
+                    if num_moved == self_len:
                         setattr(self, var, [])  # Empty if all elements moved
                     continue  # Equal scalars - we do nothing
 
@@ -204,12 +280,9 @@ class LagrangianArray:
                 self_var = self_var*np.ones(self_len)
             if len(other_var) < other_len:  # Convert scalar to aray
                 other_var = other_var*np.ones(other_len)
-            if len(self_var) > 0:
-                setattr(other, var, np.concatenate((other_var,
-                                                    self_var[indices])))
-            else:
-                setattr(other, var, self_var[indices])
-            setattr(self, var, self_var[~indices])  # Remove from self
+            other._append(var, other_var, self_var[indices])
+            # Remove from self
+            self._remove(var, self_var, keep, self_len - num_moved, prefix)
 
             #if isinstance(self_var, np.ndarray) or\
             #    isinstance(other_var, np.ndarray):  # Array
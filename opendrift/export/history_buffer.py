@@ -0,0 +1,189 @@
+# This file is part of OpenDrift.
+#
+# OpenDrift is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 2
+#
+# OpenDrift is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OpenDrift.  If not, see <https://www.gnu.org/licenses/>.
+
+import numpy as np
+from netCDF4 import default_fillvals
+
+
+def fill_value(dtype):
+    """Return the netCDF default fill value for given numpy dtype"""
+    dtype = np.dtype(dtype)
+    key = '%s%i' % (dtype.kind, dtype.itemsize)
+    if key in default_fillvals:
+        return np.array(default_fillvals[key]).astype(dtype)
+    elif dtype.kind == 'f':
+        return np.array(np.nan).astype(dtype)
+    else:
+        return np.zeros(1, dtype=dtype)[0]
+
+
+class HistoryBuffer():
+    """Buffer of element properties and environment at output time steps.
+
+    Plain ndarray alternative to the masked structured array of
+    OpenDriftSimulation.history (config general:history_backend).
+    Each variable is stored in a separate array of shape
+    (num_elements, length), where values which are not stored (elements
+    not yet seeded, or deactivated) are netCDF default fill values.
+    Which elements are stored at each of the time steps is kept in a
+    bitmap, one bit per element and time step, instead of a mask per
+    variable.
+
+    The time steps are slots of a ring buffer, which is reused for each
+    batch of time steps written to file: the arrays of each variable are
+    written to file directly, and only the bitmap is reset thereafter.
+    """
+
+    def __init__(self, dtype, num_elements, length):
+        self.dtype = np.dtype(dtype)
+        self.shape = (num_elements, length)
+        self.fill_values = {var: fill_value(self.dtype[var])
+                            for var in self.dtype.names}
+        self.data = {var: np.full(self.shape, self.fill_values[var],
+                                  dtype=self.dtype[var])
+                     for var in self.dtype.names}
+        self.valid = np.zeros((length, (num_elements + 7) // 8),
+                              dtype=np.uint8)
+
+    def __getitem__(self, var):
+        return self.data[var]
+
+    def set_valid(self, element_ind, time_ind):
+        """Mark values of given elements at given time step as stored."""
+        row = np.unpackbits(self.valid[time_ind], count=self.shape[0],
+                            bitorder='little')
+        row[element_ind] = 1
+        self.valid[time_ind] = np.packbits(row, bitorder='little')
+
+    def valid_mask(self, num_steps=None):
+        """Boolean array (num_elements, num_steps) of stored values."""
+        if num_steps is None:
+            num_steps = self.shape[1]
+        return np.unpackbits(self.valid[0:num_steps], axis=1,
+                             count=self.shape[0],
+                             bitorder='little').T.astype(bool)
+
+    def fill_invalid(self, num_steps=None):
+        """Set fill values where values are not stored, before writing.
+
+        Data of elements stored in previous cycles of the ring buffer
+        are thus not written again.
+        """
+        if num_steps is None:
+            num_steps = self.shape[1]
+        invalid = ~self.valid_mask(num_steps)
+        for var, data in self.data.items():
+            np.copyto(data[:, 0:num_steps], self.fill_values[var],
+                      where=invalid)
+
+    def clear(self):
+        """Reset buffer, after contents have been written to file."""
+        self.valid[:] = 0
+
+    def masked(self, var, num_steps=None):
+        """Return masked array of given variable."""
+        if num_steps is None:
+            num_steps = self.shape[1]
+        return np.ma.array(self.data[var][:, 0:num_steps],
+                           mask=~self.valid_mask(num_steps))
+
+    def to_masked_array(self, num_steps=None):
+        """Return contents as masked structured array (as history)."""
+        if num_steps is None:
+            num_steps = self.shape[1]
+        history = np.ma.array(np.zeros((self.shape[0], num_steps)),
+                              dtype=self.dtype)
+        invalid = ~self.valid_mask(num_steps)
+        for var in self.dtype.names:
+            history[var] = np.ma.array(self.data[var][:, 0:num_steps],
+                                       mask=invalid)
+        return history
+
+
+class LazyHistory():
+    """History of element properties and environment read from output file.
+
+    Alternative to the masked structured history array for imported
+    output (see load_history of import_file). Indexing by variable name
+    gives a masked array of shape (num_elements, num_steps) as for the
+    history array, but values are read from file only when accessed, for
+    the imported elements and time steps, and are not kept in memory.
+
+    Arguments:
+        read: function read(var, elements, times) returning (masked) array
+            of variable for given element and time step indices of file,
+            or None if variable is not in file.
+        dtype: structured dtype of history.
+        elements, times: indices in file of the imported elements and
+            time steps (increasing).
+        close: optional function closing the file, called by close().
+    """
+
+    def __init__(self, read, dtype, elements, times, close=None):
+        self._read = read
+        self._close = close
+        self.dtype = np.dtype(dtype)
+        self.elements = np.asarray(elements)
+        self.times = np.asarray(times)
+        self.shape = (len(self.elements), len(self.times))
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, var):
+        return self.read(var)
+
+    def read(self, var, elements=None, times=None):
+        """Return masked array of variable for subset of elements and times.
+
+        elements and times are indices (or slices) of the imported
+        elements and time steps. Default is all.
+        """
+        if var not in self.dtype.names:
+            raise ValueError('%s is not in history' % var)
+        elements = self.elements if elements is None else \
+            self.elements[elements]
+        times = self.times if times is None else self.times[times]
+        values = self._read(var, elements, times)
+        if values is None:
+            return np.ma.masked_all((np.size(elements), np.size(times)),
+                                    dtype=self.dtype[var])
+        return np.ma.asarray(values).astype(self.dtype[var])
+
+    def to_masked_array(self):
+        """Return all contents as masked structured array (as history)."""
+        history = np.ma.array(np.zeros(self.shape), dtype=self.dtype,
+                              mask=[True])
+        for var in self.dtype.names:
+            history[var] = self.read(var)
+        return history
+
+    def read_at(self, var, times):
+        """Return masked array (num_elements) of variable at given time step
+        (index of imported time steps) of each element.
+
+        Only one time step is read per element, e.g. the last state.
+        """
+        times = np.asarray(times)
+        values = np.ma.masked_all(self.shape[0], dtype=self.dtype[var])
+        for t in np.unique(times):
+            ind = np.flatnonzero(times == t)
+            values[ind] = self.read(var, elements=ind, times=[t])[:, 0]
+        return values
+
+    def close(self):
+        """Close the file from which the history is read."""
+        if self._close is not None:
+            self._close()
+            self._close = None
@@ -3,11 +3,16 @@ import os
 from datetime import datetime, timedelta
 import logging; logging.captureWarnings(True); logger = logging.getLogger(__name__)
 import string
+import threading
+import queue
 from shutil import move
 
 import numpy as np
 from netCDF4 import Dataset, num2date, date2num
 
+from opendrift.locks import netcdf_locked, shared_with_xarray
+from opendrift.export.history_buffer import HistoryBuffer, LazyHistory
+
 # Module with functions to export/import trajectory data to/from netCDF file
 # Strives to be compliant with netCDF CF-convention on trajectories
 # https://cfconventions.org/Data/cf-conventions/cf-conventions-1.6/build/cf-conventions.html#idp8377728
@@ -16,15 +21,168 @@ from netCDF4 import Dataset, num2date, date2num
 skip_parameters = ['ID']  # Do not write to file
 
 
+class BackgroundWriter():
+    """Thread writing batches of output to an open netCDF file.
+
+    Batches are queued by write_buffer, and written in the order given
+    while the simulation continues. At most max_queued batches are kept
+    in memory, before write_buffer waits for the thread.
+    """
+
+    def __init__(self, max_queued=2):
+        self.queue = queue.Queue(maxsize=max_queued)
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                break
+            if self.error is None:
+                try:
+                    job[0](*job[1:])
+                except Exception as e:
+                    self.error = e
+            self.queue.task_done()
+
+    def submit(self, function, *args):
+        if self.error is not None:
+            raise self.error
+        self.queue.put((function,) + args)
+
+    def close(self):
+        """Wait until all batches are written, and stop thread."""
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+
+def _write_data(outfile, data, first):
+    # The netCDF/HDF5 libraries are not thread safe, hence writing is
+    # serialised with reading of netCDF files by readers (through xarray,
+    # or holding netcdf_lock)
+    num = len(data['time'])
+    with netcdf_locked():
+        for prop, values in data.items():
+            var = outfile.variables[prop]
+            if var.ndim == 2:
+                var[:, first:first+num] = values
+            else:
+                var[first:first+num] = values
+
+
+def _variable_encoding(self, prop, dtype, ragged=False):
+    """Return dtype, createVariable keywords and packing attributes.
+
+    Compression and chunking are taken from config, and may be overridden
+    per variable by the output_encoding argument of run().
+    """
+    encoding = {}
+    level = self.get_config('general:output_compression_level')
+    if level > 0:
+        encoding.update({'zlib': True, 'complevel': level, 'shuffle': True})
+    if self.get_config('general:output_chunking') == 'buffer':
+        # Chunks of the time steps written together, for all trajectories,
+        # or for blocks of trajectories, limiting chunks to about 4 MB
+        num_steps = max(1, min(self.export_buffer_length,
+                               self.expected_steps_output))
+        num_trajectories = max(1, min(self.num_elements_total(),
+                                      2**20 // num_steps))
+        if ragged is True:
+            encoding['chunksizes'] = (num_trajectories*num_steps,)
+        else:
+            encoding['chunksizes'] = (num_trajectories, num_steps)
+    output_encoding = getattr(self, 'output_encoding', None) or {}
+    encoding.update(output_encoding.get(prop, {}))
+
+    dtype = encoding.pop('dtype', dtype)
+    attributes = {att: encoding.pop(att) for att in
+                  ['scale_factor', 'add_offset'] if att in encoding}
+    return dtype, encoding, attributes
+
+
+def _buffer_values(self, prop, num_steps):
+    """Values of buffer to be written to file for given variable"""
+    if isinstance(self.history, HistoryBuffer) and \
+            prop in self.output_packed:
+        # Fill values are masked, as they shall not be packed
+        return self.history.masked(prop, num_steps)
+    return self.history[prop][:, 0:num_steps]
+
+
+def _buffer_data(self, num_steps):
+    """Data of buffer to be written to file, and first index of data.
+
+    Data are given for the time steps, or for the observations (valid
+    element and time step pairs, ordered by time) of ragged array output.
+    """
+    times = date2num([self.start_time + n*self.time_step_output for n in
+                      range(self.steps_exported,
+                            self.steps_exported + num_steps)], self.timeStr)
+    props = [prop for prop in self.history_metadata
+             if prop not in skip_parameters]
+    if self.output_ragged is False:
+        if isinstance(self.history, HistoryBuffer):
+            # Arrays are written directly, with fill values where not valid
+            self.history.fill_invalid(num_steps)
+        data = {prop: _buffer_values(self, prop, num_steps)
+                for prop in props}
+        data['time'] = times
+        return data, self.steps_exported
+
+    if isinstance(self.history, HistoryBuffer):
+        valid = self.history.valid_mask(num_steps)
+    else:
+        valid = ~np.ma.getmaskarray(self.history['status'][:, 0:num_steps])
+    step, element = np.nonzero(valid.T)
+    data = {prop: self.history[prop][element, step] for prop in props}
+    data['time'] = times[step]
+    data['trajectory_index'] = element
+    return data, self.obs_exported
+
+
 def init(self, filename):
 
     self.outfile_name = filename
     self.outfile = Dataset(filename, 'w')
     self.outfile.createDimension('trajectory', self.num_elements_total())
     self.outfile.createVariable('trajectory', 'i4', ('trajectory',))
-    self.outfile.createDimension('time', None)  # Unlimited time dimension
-    self.outfile.createVariable('time', 'f8', ('time',))
-    # NB: trajectory_id must be changed for future ragged array representation
+    self.output_ragged = \
+        self.get_config('general:output_layout') == 'ragged'
+    if self.get_config('general:output_thread') is True and \
+            not shared_with_xarray:
+        logger.warning('Lock of xarray not available, so writing of netCDF '
+                       'output can not be serialised with reading of '
+                       'readers: writing output synchronously')
+        self.output_writer = None
+    elif self.get_config('general:output_thread') is True:
+        # File is kept open, and written by a background thread.
+        self.output_writer = BackgroundWriter()
+    else:
+        self.output_writer = None
+    if self.output_ragged is True:
+        # Only observations of seeded and active elements are stored,
+        # with index of the trajectory of each observation (CF indexed
+        # ragged array), converted to contiguous ragged array on close.
+        self.obs_exported = 0
+        self.outfile.createDimension('obs', None)
+        dimensions = ('obs',)
+        self.outfile.createVariable('time', 'f8', dimensions)
+        index = self.outfile.createVariable('trajectory_index', 'i4',
+                                            dimensions)
+        index.instance_dimension = 'trajectory'
+        index.long_name = 'Index of trajectory of observation'
+    else:
+        if self.output_writer is not None:
+            # Dimensions are fixed from start, for CDM compliance.
+            self.outfile.createDimension('time', self.expected_steps_output)
+        else:
+            self.outfile.createDimension('time', None)  # Unlimited time dimension
+        dimensions = ('trajectory', 'time')
+        self.outfile.createVariable('time', 'f8', ('time',))
     self.outfile.variables['trajectory'][:] = \
         np.arange(self.num_elements_total())+1
     self.outfile.variables['trajectory'].cf_role = 'trajectory_id'
@@ -64,6 +222,7 @@ def init(self, filename):
             self.outfile.setncattr(key, str(value))
 
     # Add all element properties as variables
+    self.output_packed = []
     for prop in self.history.dtype.fields:
         if prop in skip_parameters:
             continue
@@ -73,7 +232,14 @@ def init(self, filename):
             dtype = self.history.dtype[prop]
         except:
             dtype = 'f4'
-        var = self.outfile.createVariable(prop, dtype, ('trajectory', 'time'))
+        dtype, encoding, packing = _variable_encoding(
+            self, prop, dtype, ragged=self.output_ragged)
+        var = self.outfile.createVariable(prop, dtype, dimensions,
+                                          **encoding)
+        if len(packing) > 0:
+            # Values are packed by netCDF4 when written
+            var.setncatts(packing)
+            self.output_packed.append(prop)
         var.setncattr('coordinates', 'lat lon time')
         for subprop in self.history_metadata[prop].items():
             if subprop[0] not in ['dtype', 'constant', 'default', 'seed']:
@@ -83,21 +249,13 @@ def init(self, filename):
                 var.setncattr(subprop[0], subprop[1])
 
 def write_buffer(self):
+    if getattr(self, 'output_writer', None) is not None:
+        return write_buffer_background(self)
     if self.outfile._isopen == 0:
         self.outfile = Dataset(self.outfile_name, 'a')
     num_steps_to_export = self.steps_output - self.steps_exported
-    for prop in self.history_metadata:
-        if prop in skip_parameters:
-            continue
-        var = self.outfile.variables[prop]
-        var[:, self.steps_exported:self.steps_exported+num_steps_to_export] = \
-            self.history[prop][:, 0:num_steps_to_export]
-
-    times = [self.start_time + n*self.time_step_output for n in
-             range(self.steps_exported, self.steps_output)]
-    self.outfile.variables['time'][
-        self.steps_exported:self.steps_exported+len(times)] = \
-            date2num(times, self.timeStr)
+    data, first = _buffer_data(self, num_steps_to_export)
+    _write_data(self.outfile, data, first)
 
     # Write status categories metadata
     status_dtype = self.ElementType.variables['status']['dtype']
@@ -110,14 +268,46 @@ def write_buffer(self):
 
     logger.info('Wrote %s steps to file %s' % (num_steps_to_export,
                                                 self.outfile_name))
-    self.history.mask = True  # Reset history array, for new data
+    # Reset history array, for new data
+    if isinstance(self.history, HistoryBuffer):
+        self.history.clear()
+    else:
+        self.history.mask = True
     self.steps_exported = self.steps_exported + num_steps_to_export
+    if self.output_ragged is True:
+        self.obs_exported = self.obs_exported + len(data['time'])
     self.outfile.steps_exported = self.steps_exported
     self.outfile.sync()  # Flush from memory to disk
     self.outfile.close()  # close file temporarily
 
+def write_buffer_background(self):
+    """Copy buffer and queue it for writing by the background thread."""
+    num_steps_to_export = self.steps_output - self.steps_exported
+    data, first = _buffer_data(self, num_steps_to_export)
+    data = {prop: values.copy() for prop, values in data.items()}
+    self.output_writer.submit(_write_data, self.outfile, data, first)
+    logger.info('Queued %s steps for writing to file %s' %
+                (num_steps_to_export, self.outfile_name))
+
+    # Reset history array, for new data
+    if isinstance(self.history, HistoryBuffer):
+        self.history.clear()
+    else:
+        self.history.mask = True
+    self.steps_exported = self.steps_exported + num_steps_to_export
+    if self.output_ragged is True:
+        self.obs_exported = self.obs_exported + len(data['time'])
+
 def close(self):
-    self.outfile = Dataset(self.outfile_name, 'a')
+    background = getattr(self, 'output_writer', None) is not None
+    if background is True:
+        try:
+            self.output_writer.close()
+        finally:
+            self.output_writer = None
+        self.outfile.steps_exported = self.steps_exported
+    else:
+        self.outfile = Dataset(self.outfile_name, 'a')
     # Write status categories metadata
     status_dtype = self.ElementType.variables['status']['dtype']
     self.outfile.variables['status'].valid_range = np.array(
@@ -138,22 +328,38 @@ def close(self):
             self.outfile.setncattr(key, str(value))
 
     # Write bounds metadata
-    self.outfile.geospatial_lat_min = self.history['lat'].min()
-    self.outfile.geospatial_lat_max = self.history['lat'].max()
+    if isinstance(self.history, HistoryBuffer):
+        lon = self.history.masked('lon')
+        lat = self.history.masked('lat')
+    else:
+        lon = self.history['lon']
+        lat = self.history['lat']
+    self.outfile.geospatial_lat_min = lat.min()
+    self.outfile.geospatial_lat_max = lat.max()
     self.outfile.geospatial_lat_units = 'degrees_north'
     self.outfile.geospatial_lat_resolution = 'point'
-    self.outfile.geospatial_lon_min = self.history['lon'].min()
-    self.outfile.geospatial_lon_max = self.history['lon'].max()
+    self.outfile.geospatial_lon_min = lon.min()
+    self.outfile.geospatial_lon_max = lon.max()
     self.outfile.geospatial_lon_units = 'degrees_east'
     self.outfile.geospatial_lon_resolution = 'point'
     self.outfile.runtime = str(datetime.now() -
                                self.timers['total time'])
 
+    if self.output_ragged is False:
+        num_steps_file = len(self.outfile.dimensions['time'])
     self.outfile.close()  # Finally close file
 
+    if background is True and self.output_ragged is False and \
+            self.num_elements_scheduled() == 0 and \
+            num_steps_file == self.steps_exported:
+        return  # Dimensions were fixed and correct from start
+
     # Finally changing UNLIMITED time dimension to fixed, for CDM compliance.
     # Fortunately this is quite fast.
     # https://www.unidata.ucar.edu/software/thredds/current/netcdf-java/reference/FeatureDatasets/CFpointImplement.html
+    # Fixed time dimension is truncated if simulation stopped early.
+    # Observations of ragged array output are sorted by trajectory
+    # (and time), giving a CF contiguous ragged array.
     try:
         logger.debug('Making netCDF file CDM compliant with fixed dimensions')
         if self.num_elements_scheduled() > 0:
@@ -162,32 +368,72 @@ def close(self):
             mask[self.elements_scheduled.ID-1] = False
         with Dataset(self.outfile_name) as src, \
                 Dataset(self.outfile_name + '_tmp', 'w') as dst:
+            chunked = self.get_config('general:output_chunking') != 'default'
+            output_encoding = getattr(self, 'output_encoding', None) or {}
+            # Packed values and fill values are copied as stored
+            src.set_auto_maskandscale(False)
+            dst.set_auto_maskandscale(False)
+            if self.output_ragged is True:
+                index = src.variables['trajectory_index'][:]
+                order = np.argsort(index, kind='stable')
+                row_size = np.bincount(
+                    index, minlength=len(src.dimensions['trajectory']))
             for name, dimension in src.dimensions.items():
                 if name=='trajectory':
                     # Truncate dimension length to  number actually seeded
                     dst.createDimension(name, self.num_elements_activated())
+                elif name=='time':
+                    # Truncate dimension length to number of steps written
+                    dst.createDimension(name, self.steps_exported)
                 else:
                     dst.createDimension(name, len(dimension))
 
             for name, variable in src.variables.items():
+                if name == 'trajectory_index':
+                    continue
+                # Keeping compression, and any chunking of data variables
+                encoding = {k: v for k, v in variable.filters().items()
+                            if k in ['zlib', 'complevel', 'shuffle']}
+                if (len(variable.dimensions) == 2 or
+                        variable.dimensions == ('obs',)) and (
+                        encoding['zlib'] is True or chunked is True or
+                        'chunksizes' in output_encoding.get(name, {})):
+                    encoding['chunksizes'] = [
+                        max(1, min(c, len(dst.dimensions[d]))) for c, d in
+                        zip(variable.chunking(), variable.dimensions)]
                 dstVar = dst.createVariable(name, variable.datatype,
-                                             variable.dimensions)
+                                            variable.dimensions, **encoding)
                 srcVar = src.variables[name]
+                steps = slice(0, self.steps_exported)
                 # Truncate data to number actually seeded
                 if 'trajectory' in variable.dimensions:
                     if self.num_elements_scheduled() > 0:
                         if len(variable.dimensions) == 2:
-                            dstVar[:] = srcVar[mask, :]
+                            dstVar[:] = srcVar[mask, steps]
                         else:
                             dstVar[:] = srcVar[mask]  # Copy data
+                    elif len(variable.dimensions) == 2:
+                        dstVar[:] = srcVar[:, steps]
                     else:
                         dstVar[:] = srcVar[:]
+                elif variable.dimensions == ('time',):
+                    dstVar[:] = srcVar[steps]
+                elif variable.dimensions == ('obs',):
+                    dstVar[:] = srcVar[:][order]
                 else:
                     dstVar[:] = srcVar[:]
                 for att in src.variables[name].ncattrs():
                     # Copy variable attributes
                     dstVar.setncattr(att, srcVar.getncattr(att))
 
+            if self.output_ragged is True:
+                if self.num_elements_scheduled() > 0:
+                    row_size = row_size[mask]
+                dstVar = dst.createVariable('rowSize', 'i4', ('trajectory',))
+                dstVar[:] = row_size
+                dstVar.long_name = 'Number of observations for this trajectory'
+                dstVar.sample_dimension = 'obs'
+
             for att in src.ncattrs():  # Copy global attributes
                 dst.setncattr(att, src.getncattr(att))
 
@@ -201,7 +447,18 @@ def import_file_xarray(self, filename, chunks):
     import xarray as xr
     logger.debug('Importing with Xarray from ' + filename)
     self.ds = xr.open_dataset(filename, chunks=chunks)
+    if 'obs' in self.ds.dims:
+        raise ValueError('Import of ragged array output with Xarray is not '
+                         'supported, use opendrift.open')
+    import_dataset_xarray(self, filename)
+
+def import_dataset_xarray(self, filename):
+    """Set up simulation from output opened lazily as Xarray self.ds"""
 
+    import xarray as xr
+    # Analysis (e.g. bounds and densities) is saved next to output file
+    self.analysis_file = \
+        os.path.splitext(str(filename).rstrip('/'))[0] + '_analysis.nc'
     self.steps_output = len(self.ds.time)
     ts0 = (self.ds.time[0] - np.datetime64('1970-01-01T00:00:00')) / np.timedelta64(1, 's')
     self.start_time = datetime.utcfromtimestamp(np.float(ts0))
@@ -243,24 +500,52 @@ def import_file_xarray(self, filename, chunks):
         self.latmin = self.af.latmin
         self.latmax = self.af.latmax
 
-def import_file(self, filename, times=None, elements=None):
+def timedelta_from_string(timestring):
+    """Parse time step written to file as str(timedelta)"""
+    if 'day' in timestring:
+        days = int(timestring.split('day')[0])
+        hs = timestring.split(' ')[-1]
+        th = datetime.strptime(hs, '%H:%M:%S')
+        return timedelta(days=days, hours=th.hour, minutes=th.minute, seconds=th.second)
+    else:
+        t = datetime.strptime(timestring, '%H:%M:%S')
+        return timedelta(
+            hours=t.hour, minutes=t.minute, seconds=t.second)
+
+def import_file(self, filename, times=None, elements=None,
+                load_history=True):
     """Create OpenDrift object from imported file.
-     times: indices of time steps to be imported, must be contineous range.
-     elements: indices of elements to be imported
+     times: indices of time steps to be imported, increasing.
+     elements: indices of elements to be imported, increasing.
+     load_history: if False, history is a LazyHistory, reading variables
+        from file only when accessed. The file is then kept open.
     """
 
     logger.debug('Importing from ' + filename)
     infile = Dataset(filename, 'r')
-    # 'times' can be used to import subset. Not yet implemented.
+    # Ragged array output, with observations along dimension obs
+    ragged = 'obs' in infile.dimensions
+    # 'times' can be used to import subset
     if times is None and hasattr(infile, 'steps_exported'):
         self.steps_output = infile.steps_exported
         times = np.arange(infile.steps_exported)
     else:
         #self.steps_output = len(infile.dimensions['time'])
+        times = np.asarray(times)
         self.steps_output = len(times)
 
-    filetime = infile.variables['time'][times]
     units = infile.variables['time'].units
+    if ragged is True:
+        # Time steps of observations, from start time and output time step
+        start_time = datetime.fromisoformat(infile.time_coverage_start)
+        time_step_output = timedelta_from_string(infile.time_step_output)
+        filetime = date2num([start_time + n*time_step_output
+                             for n in times], units)
+        obs_step = np.round((np.ma.getdata(infile.variables['time'][:]) -
+            date2num(start_time, units)) /
+            time_step_output.total_seconds()).astype(int)
+    else:
+        filetime = infile.variables['time'][times]
     self.start_time = num2date(filetime[0], units)
     if len(filetime) > 1:
         self.end_time = num2date(filetime[self.steps_output-1], units)  # Why -1?
@@ -275,8 +560,25 @@ def import_file(self, filename, times=None, elements=None):
         num_elements = len(infile.dimensions['trajectory'])
         elements=np.arange(num_elements)
     else:
+        elements = np.asarray(elements)
         num_elements=len(elements)
 
+    if ragged is True:
+        # Row and column in history of each observation, and which
+        # observations are within the imported elements and times
+        row_size = infile.variables['rowSize'][:]
+        obs_element = np.repeat(np.arange(len(row_size)), row_size)
+        row = np.full(len(row_size), -1)
+        row[elements] = np.arange(num_elements)
+        column = np.full(max(obs_step.max(initial=-1),
+                             np.max(times, initial=-1)) + 1, -1)
+        column[times] = np.arange(len(times))
+        obs_row = row[obs_element]
+        obs_column = column[obs_step]
+        obs = (obs_row >= 0) & (obs_column >= 0)
+        obs_row = obs_row[obs]
+        obs_column = obs_column[obs]
+
     dtype = np.dtype([(var[0], var[1]['dtype'])
                       for var in self.ElementType.variables.items()])
 
@@ -291,14 +593,30 @@ def import_file(self, filename, times=None, elements=None):
             self.history_metadata[env_var] = {}
     history_dtype = np.dtype(history_dtype_fields)
 
+    if load_history is False and ragged is True:
+        logger.warning('Ragged array output is imported to memory')
+        load_history = True
+
     # Import dataset (history)
-    self.history = np.ma.array(
-        np.zeros([num_elements, self.steps_output]),
-        dtype=history_dtype, mask=[True])
+    if load_history is False:
+        def read(var, elements, times):
+            if var not in infile.variables:
+                return None
+            return infile.variables[var][elements, times]
+        self.history = LazyHistory(read, history_dtype, elements, times,
+                                   close=infile.close)
+    else:
+        self.history = np.ma.array(
+            np.zeros([num_elements, self.steps_output]),
+            dtype=history_dtype, mask=[True])
     for var in infile.variables:
-        if var in ['time', 'trajectory']:
+        if var in ['time', 'trajectory', 'rowSize'] or load_history is False:
             continue
         try:
+            if ragged is True:
+                self.history[var][obs_row, obs_column] = \
+                    infile.variables[var][:][obs]
+                continue
             self.history[var] = infile.variables[var][elements, times]
         except Exception as e:
             logger.info(e)
@@ -310,8 +628,12 @@ def import_file(self, filename, times=None, elements=None):
     kwargs = {}
     for var in infile.variables:
         if var in self.ElementType.variables:
-            kwargs[var] = self.history[var][
-                np.arange(len(index_of_last)), index_of_last]
+            if load_history is False:
+                # Reading only the last state of each element
+                kwargs[var] = self.history.read_at(var, index_of_last)
+            else:
+                kwargs[var] = self.history[var][
+                    np.arange(len(index_of_last)), index_of_last]
     kwargs['ID'] = elements + 1
     self.elements = self.ElementType(**kwargs)
     self.elements_deactivated = self.ElementType()
@@ -340,16 +662,6 @@ def import_file(self, filename, times=None, elements=None):
                                 (conf_key, value))
 
     # Import time steps from metadata
-    def timedelta_from_string(timestring):
-        if 'day' in timestring:
-            days = int(timestring.split('day')[0])
-            hs = timestring.split(' ')[-1]
-            th = datetime.strptime(hs, '%H:%M:%S')
-            return timedelta(days=days, hours=th.hour, minutes=th.minute, seconds=th.second)
-        else:
-            t = datetime.strptime(timestring, '%H:%M:%S')
-            return timedelta(
-                hours=t.hour, minutes=t.minute, seconds=t.second)
     try:
         self.time_step = timedelta_from_string(infile.time_step_calculation)
         self.time_step_output = timedelta_from_string(infile.time_step_output)
@@ -357,4 +669,5 @@ def import_file(self, filename, times=None, elements=None):
         logger.warning(e)
         logger.warning('Could not parse time_steps from netCDF file')
 
-    infile.close()
+    if load_history is True:
+        infile.close()
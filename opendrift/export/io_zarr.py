@@ -0,0 +1,326 @@
+import os
+from datetime import datetime, timedelta
+import logging; logger = logging.getLogger(__name__)
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from netCDF4 import num2date, date2num
+
+from opendrift.export.history_buffer import HistoryBuffer, LazyHistory, \
+    fill_value
+from opendrift.export.io_netcdf import BackgroundWriter, \
+    timedelta_from_string, import_dataset_xarray
+
+# Module with functions to export/import trajectory data to/from a Zarr
+# directory store, with the same variables and attributes as netCDF output
+# (io_netcdf), and dimension names (_ARRAY_DIMENSIONS) as read by Xarray.
+# Arrays are chunked in time by export_buffer_length, so that the chunks of
+# each buffer are written independently, by one thread per variable.
+# Requires the zarr package.
+
+skip_parameters = ['ID']  # Do not write to store
+
+
+def _attribute(value):
+    """Config/metadata value as JSON serializable attribute"""
+    if isinstance(value, (bool, int, float, str, type(None))):
+        return value
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (list, tuple)):
+        return [_attribute(v) for v in value]
+    return str(value)
+
+
+def _compressor(self):
+    level = self.get_config('general:output_compression_level')
+    if level == 0:
+        return None
+    from numcodecs import Blosc
+    return Blosc(cname='zstd', clevel=level, shuffle=Blosc.SHUFFLE)
+
+
+def init(self, filename):
+    import zarr
+
+    if self.get_config('general:output_layout') != 'multidimensional':
+        raise ValueError('Zarr output supports only multidimensional layout')
+
+    self.outfile_name = filename
+    self.outfile = zarr.open_group(filename, mode='w')
+    num_elements = self.num_elements_total()
+    num_steps = self.expected_steps_output
+    # Chunks of the time steps written together, for all trajectories,
+    # or for blocks of trajectories, limiting chunks to about 4 MB
+    chunk_steps = max(1, min(self.export_buffer_length, num_steps))
+    chunk_elements = max(1, min(num_elements, 2**20 // chunk_steps))
+
+    trajectory = self.outfile.create_dataset(
+        'trajectory', data=np.arange(num_elements, dtype=np.int32) + 1)
+    trajectory.attrs.update({'_ARRAY_DIMENSIONS': ['trajectory'],
+                             'cf_role': 'trajectory_id', 'units': '1'})
+
+    self.timeStr = 'seconds since 1970-01-01 00:00:00'
+    time = self.outfile.create_dataset(
+        'time', shape=(num_steps,), chunks=(chunk_steps,), dtype='f8',
+        fill_value=fill_value('f8'))
+    time.attrs.update({'_ARRAY_DIMENSIONS': ['time'], 'units': self.timeStr,
+                       'standard_name': 'time', 'long_name': 'time'})
+
+    attributes = {
+        'Conventions': 'CF-1.6',
+        'standard_name_vocabulary': 'CF-1.6',
+        'featureType': 'trajectory',
+        'history': 'Created ' + str(datetime.now()),
+        'source': 'Output from simulation with OpenDrift',
+        'model_url': 'https://github.com/OpenDrift/opendrift',
+        'opendrift_class': self.__class__.__name__,
+        'opendrift_module': self.__class__.__module__,
+        'readers': str(self.readers.keys()),
+        'time_coverage_start': str(self.start_time),
+        'time_step_calculation': str(self.time_step),
+        'time_step_output': str(self.time_step_output)}
+    for key in self._config:
+        attributes['config_' + key] = _attribute(self.get_config(key))
+    if hasattr(self, 'metadata_dict'):
+        for key, value in self.metadata_dict.items():
+            attributes[key] = str(value)
+    self.outfile.attrs.update(attributes)
+
+    # Add all element properties as variables
+    compressor = _compressor(self)
+    for prop in self.history.dtype.fields:
+        if prop in skip_parameters:
+            continue
+        dtype = self.history.dtype[prop]
+        var = self.outfile.create_dataset(
+            prop, shape=(num_elements, num_steps),
+            chunks=(chunk_elements, chunk_steps), dtype=dtype,
+            fill_value=fill_value(dtype), compressor=compressor)
+        var_attributes = {'_ARRAY_DIMENSIONS': ['trajectory', 'time'],
+                          'coordinates': 'lat lon time'}
+        for key, value in self.history_metadata[prop].items():
+            if key not in ['dtype', 'constant', 'default', 'seed']:
+                if prop in ['lon', 'lat'] and key == 'axis':
+                    continue
+                var_attributes[key] = _attribute(value)
+        var.attrs.update(var_attributes)
+
+    if self.get_config('general:output_thread') is True:
+        self.output_writer = BackgroundWriter()
+    else:
+        self.output_writer = None
+
+
+def _write_data(outfile, data, first):
+    num_steps = len(data['time'])
+
+    def write(prop):
+        var = outfile[prop]
+        if var.ndim == 2:
+            var[:, first:first+num_steps] = data[prop]
+        else:
+            var[first:first+num_steps] = data[prop]
+
+    # Variables are separate arrays, and are written concurrently
+    with ThreadPoolExecutor(max_workers=min(len(data),
+                                            os.cpu_count() or 1)) as pool:
+        list(pool.map(write, data))
+
+
+def write_buffer(self):
+    num_steps_to_export = self.steps_output - self.steps_exported
+    if num_steps_to_export == 0:
+        return
+    if isinstance(self.history, HistoryBuffer):
+        # Arrays are written directly, with fill values where not valid
+        self.history.fill_invalid(num_steps_to_export)
+    data = {}
+    for prop in self.history_metadata:
+        if prop in skip_parameters:
+            continue
+        values = self.history[prop][:, 0:num_steps_to_export]
+        data[prop] = np.ma.filled(values, self.outfile[prop].fill_value)
+    data['time'] = date2num(
+        [self.start_time + n*self.time_step_output for n in
+         range(self.steps_exported, self.steps_output)], self.timeStr)
+
+    if self.output_writer is not None:
+        data = {prop: np.array(values) for prop, values in data.items()}
+        self.output_writer.submit(_write_data, self.outfile, data,
+                                  self.steps_exported)
+    else:
+        _write_data(self.outfile, data, self.steps_exported)
+    logger.info('Wrote %s steps to store %s' % (num_steps_to_export,
+                                                 self.outfile_name))
+
+    # Reset history array, for new data
+    if isinstance(self.history, HistoryBuffer):
+        self.history.clear()
+    else:
+        self.history.mask = True
+    self.steps_exported = self.steps_exported + num_steps_to_export
+
+
+def close(self):
+    import zarr
+
+    if self.output_writer is not None:
+        try:
+            self.output_writer.close()
+        finally:
+            self.output_writer = None
+
+    self.outfile['status'].attrs.update({
+        'valid_range': [0, len(self.status_categories) - 1],
+        'flag_values': list(range(len(self.status_categories))),
+        'flag_meanings': ' '.join(self.status_categories)})
+
+    attributes = {'steps_exported': self.steps_exported,
+                  'time_coverage_end': str(self.time),
+                  'performance': self.performance(),
+                  'runtime': str(datetime.now() - self.timers['total time'])}
+    if hasattr(self, 'metadata_dict'):
+        for key, value in self.metadata_dict.items():
+            attributes[key] = str(value)
+    # Bounds from the data written, as history is reset after writing
+    for coordinate, name in [('lat', 'north'), ('lon', 'east')]:
+        values = self.outfile[coordinate][:, 0:self.steps_exported]
+        values = values[values != self.outfile[coordinate].fill_value]
+        if len(values) > 0:
+            attributes['geospatial_%s_min' % coordinate] = float(values.min())
+            attributes['geospatial_%s_max' % coordinate] = float(values.max())
+        attributes['geospatial_%s_units' % coordinate] = 'degrees_' + name
+        attributes['geospatial_%s_resolution' % coordinate] = 'point'
+    self.outfile.attrs.update(attributes)
+
+    # Removing unseeded elements, and time steps not reached
+    if self.num_elements_scheduled() > 0:
+        logger.info('Removing %i unseeded elements already written to store'
+                    % self.num_elements_scheduled())
+        mask = np.ones(self.num_elements_total(), dtype=bool)
+        mask[self.elements_scheduled.ID-1] = False
+    for name, var in self.outfile.arrays():
+        dimensions = var.attrs['_ARRAY_DIMENSIONS']
+        if 'trajectory' in dimensions and self.num_elements_scheduled() > 0:
+            if var.ndim == 1:
+                values = var.oindex[mask]
+            else:
+                values = var.oindex[mask, 0:self.steps_exported]
+            var.resize(*values.shape)
+            var[...] = values
+        elif 'time' in dimensions:
+            shape = list(var.shape)
+            shape[dimensions.index('time')] = self.steps_exported
+            var.resize(*shape)
+
+    zarr.consolidate_metadata(self.outfile.store)
+
+
+def import_file_xarray(self, filename, chunks):
+
+    import xarray as xr
+    logger.debug('Importing with Xarray from ' + filename)
+    self.ds = xr.open_zarr(filename, chunks=chunks)
+    import_dataset_xarray(self, filename)
+
+
+def import_file(self, filename, times=None, elements=None,
+                load_history=True):
+    """Create OpenDrift object from imported Zarr store.
+     times: indices of time steps to be imported, increasing.
+     elements: indices of elements to be imported, increasing.
+     load_history: if False, history is a LazyHistory, reading variables
+        from store only when accessed.
+    """
+    import zarr
+
+    logger.debug('Importing from ' + filename)
+    infile = zarr.open_consolidated(filename, mode='r')
+    attributes = infile.attrs.asdict()
+    if times is None:
+        times = np.arange(attributes['steps_exported'])
+    self.steps_output = len(times)
+
+    units = infile['time'].attrs['units']
+    filetime = infile['time'][:][times]
+    self.start_time = num2date(filetime[0], units)
+    if len(filetime) > 1:
+        self.end_time = num2date(filetime[-1], units)
+        self.time_step_output = num2date(filetime[1], units) - self.start_time
+    else:
+        self.time_step_output = timedelta(hours=1)
+        self.end_time = self.start_time
+    self.time = self.end_time  # Using end time as default
+    self.status_categories = infile['status'].attrs['flag_meanings'].split()
+
+    if elements is None:
+        elements = np.arange(infile['trajectory'].shape[0])
+    elements = np.asarray(elements)
+    num_elements = len(elements)
+
+    history_dtype_fields = [
+        (name, self.ElementType.variables[name]['dtype'])
+        for name in self.ElementType.variables]
+    # Add environment variables
+    self.history_metadata = self.ElementType.variables.copy()
+    for env_var in self.required_variables:
+        if env_var in infile:
+            history_dtype_fields.append((env_var, np.dtype('float32')))
+            self.history_metadata[env_var] = {}
+    history_dtype = np.dtype(history_dtype_fields)
+
+    # Import dataset (history)
+    def read(var, elements, times):
+        if var not in infile:
+            return None
+        return np.ma.masked_equal(infile[var].oindex[elements, times],
+                                  infile[var].fill_value)
+    if load_history is False:
+        self.history = LazyHistory(read, history_dtype, elements, times,
+                                   close=getattr(infile.store, 'close', None))
+    else:
+        self.history = np.ma.array(
+            np.zeros([num_elements, self.steps_output]),
+            dtype=history_dtype, mask=[True])
+        for var in history_dtype.names:
+            if var in infile:
+                self.history[var] = read(var, elements, times)
+
+    # Initialise elements from last state
+    firstlast = np.ma.notmasked_edges(self.history['status'], axis=1)
+    index_of_last = firstlast[1][1]
+    kwargs = {}
+    for var in history_dtype.names:
+        if var in self.ElementType.variables and var in infile:
+            if load_history is False:
+                # Reading only the last state of each element
+                kwargs[var] = self.history.read_at(var, index_of_last)
+            else:
+                kwargs[var] = self.history[var][
+                    np.arange(len(index_of_last)), index_of_last]
+    kwargs['ID'] = elements + 1
+    self.elements = self.ElementType(**kwargs)
+    self.elements_deactivated = self.ElementType()
+
+    # Remove elements which are scheduled for deactivation
+    self.remove_deactivated_elements()
+
+    # Import and apply config settings
+    for key, value in attributes.items():
+        if key.startswith('config_'):
+            try:
+                self.set_config(key[7:], value)
+            except:
+                logger.warning('Could not set config: %s -> %s' %
+                               (key[7:], value))
+
+    # Import time steps from metadata
+    try:
+        self.time_step = timedelta_from_string(
+            attributes['time_step_calculation'])
+        self.time_step_output = timedelta_from_string(
+            attributes['time_step_output'])
+    except Exception as e:
+        logger.warning(e)
+        logger.warning('Could not parse time_steps from Zarr store')
@@ -0,0 +1,72 @@
+"""Serialisation of the use of the netCDF/HDF5 libraries, which are not
+thread safe, by readers and output writers running in several threads.
+
+xarray holds its own lock while using the libraries. When it can be
+imported, `netcdf_lock` is that lock, so that netCDF files read through
+xarray and files read or written with netCDF4 directly are serialised.
+Otherwise `netcdf_lock` is a lock of its own, and `shared_with_xarray` is
+False: reads through xarray are then not serialised with holders of
+`netcdf_lock`, and output is not written in a background thread.
+
+The lock of xarray is not reentrant, and must thus not be held while
+calling xarray, which would wait for it forever.
+"""
+
+import threading
+import functools
+from contextlib import contextmanager
+
+try:
+    from xarray.backends.netCDF4_ import NETCDF4_PYTHON_LOCK as netcdf_lock
+    shared_with_xarray = True
+except ImportError:
+    netcdf_lock = threading.Lock()
+    shared_with_xarray = False
+
+_holder = threading.local()
+
+
+@contextmanager
+def netcdf_locked():
+    """Hold netcdf_lock, unless this thread already holds it from here."""
+    if getattr(_holder, 'depth', 0) > 0:
+        _holder.depth += 1
+        try:
+            yield
+        finally:
+            _holder.depth -= 1
+        return
+    with netcdf_lock:
+        _holder.depth = 1
+        try:
+            yield
+        finally:
+            _holder.depth = 0
+
+
+def is_xarray(dataset):
+    """True if dataset (or variable) is read through xarray."""
+    return type(dataset).__module__.split('.')[0] == 'xarray'
+
+
+def reads_netcdf4(reader):
+    """True if the dataset of reader is read with netCDF4 directly."""
+    dataset = getattr(reader, 'Dataset', getattr(reader, 'dataset', None))
+    return type(dataset).__module__.split('.')[0] == 'netCDF4'
+
+
+def netcdf4_locked(method):
+    """Decorator of reader methods reading with netCDF4 directly.
+
+    netcdf_lock is held while the method is called, unless the dataset
+    of the reader (`Dataset` or `dataset`) is an xarray dataset, which
+    takes the lock itself.
+    """
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        dataset = getattr(self, 'Dataset', getattr(self, 'dataset', None))
+        if is_xarray(dataset):
+            return method(self, *args, **kwargs)
+        with netcdf_locked():
+            return method(self, *args, **kwargs)
+    return locked
@@ -19,12 +19,14 @@ import sys
 import os
 import glob
 import types
+import copy
 import traceback
 import inspect
 import logging; logging.captureWarnings(True); logger = logging.getLogger(__name__)
 import warnings
 from datetime import datetime, timedelta
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from abc import ABCMeta, abstractmethod, abstractproperty
 import geojson
 import netCDF4
@@ -56,6 +58,7 @@ except ImportError:
 
 import opendrift
 from opendrift.timer import Timeable
+from opendrift.export.history_buffer import HistoryBuffer
 from opendrift.readers.basereader import BaseReader, vector_pairs_xy, standard_names
 from opendrift.readers import reader_from_url
 from opendrift.models.physics_methods import PhysicsMethods
@@ -250,6 +253,54 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
 				'units': 'minutes', 'level': self.CONFIG_LEVEL_BASIC, 'description':
 				'Output time step, i.e. the interval at which output is saved. This must be larger than '
 				'the calculation time step, and be an integer multiple of this.'},
+			'general:num_processes': {'type': 'int', 'default': 1,
+				'min': 1, 'max': 1024, 'units': 1,
+				'description': 'Number of processes used by run(). If larger than 1, the '
+					'scheduled elements are split into this number of partitions, which are '
+					'simulated in parallel and merged into one history/output afterwards.',
+				'level': self.CONFIG_LEVEL_ADVANCED},
+			'general:shared_reader_blocks': {'type': 'bool', 'default': False,
+				'description': 'If True, data blocks of structured readers are kept in shared '
+					'memory during runs with several processes, so that each block is read '
+					'and stored only once for all processes.',
+				'level': self.CONFIG_LEVEL_ADVANCED},
+			'general:concurrent_readers': {'type': 'bool', 'default': False,
+				'description': 'If True, variable groups provided by different readers '
+					'(e.g. ocean, wind and waves) are retrieved concurrently in threads. '
+					'Readers of a group are still called in order of priority, for elements '
+					'not covered by the previous readers. The netCDF/HDF5 libraries are not '
+					'thread safe, so readers must serialise their use of them: readers using '
+					'xarray hold the lock of xarray, and readers using netCDF4 directly (e.g. '
+					'ECOM and CF unstructured) hold the same lock (opendrift.locks). Readers of '
+					'other formats must be safe to call from another thread.',
+				'level': self.CONFIG_LEVEL_ADVANCED},
+			'general:history_backend': {'type': 'enum', 'enum': ['masked', 'ndarray'],
+				'default': 'masked', 'level': self.CONFIG_LEVEL_ADVANCED,
+				'description': 'Storage of history during run. masked is a masked structured array. '
+					'ndarray stores each variable in a plain array with fill values, and a bitmap '
+					'of valid values, using less memory and time. The history is in both cases '
+					'a masked array after the run.'},
+			'general:output_thread': {'type': 'bool', 'default': False,
+				'level': self.CONFIG_LEVEL_ADVANCED,
+				'description': 'If True, output to netCDF file is written by a background thread '
+					'while the simulation continues, to a file kept open with dimensions fixed '
+					'from start.'},
+			'general:output_layout': {'type': 'enum', 'enum': ['multidimensional', 'ragged'],
+				'default': 'multidimensional', 'level': self.CONFIG_LEVEL_ADVANCED,
+				'description': 'Layout of trajectories in output netCDF file. multidimensional '
+					'stores all elements at all output time steps, dimensions (trajectory, time). '
+					'ragged stores only observations of seeded and active elements, as a CF '
+					'contiguous ragged array, with dimension obs and variable rowSize.'},
+			'general:output_compression_level': {'type': 'int', 'default': 0,
+				'min': 0, 'max': 9, 'units': 1, 'level': self.CONFIG_LEVEL_ADVANCED,
+				'description': 'Level of zlib compression (with byte shuffling) of variables '
+					'in output netCDF file. 0 means no compression, 9 is the highest and '
+					'slowest compression.'},
+			'general:output_chunking': {'type': 'enum', 'enum': ['default', 'buffer'],
+				'default': 'default', 'level': self.CONFIG_LEVEL_ADVANCED,
+				'description': 'Chunk shape of variables in output netCDF file. default is '
+					'chosen by the netCDF library. buffer gives chunks of the time steps '
+					'written together (export_buffer_length), for (blocks of) all trajectories.'},
 			'seed:ocean_only': {'type': 'bool', 'default': True,
 				'description': 'If True, elements seeded on land will be moved to the closest '
 					'position in ocean', 'level': self.CONFIG_LEVEL_ADVANCED},
@@ -372,6 +423,12 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
 			logger.warning('Dependencies are outdated, please update with: conda env update -f environment.yml')
 			logger.warning('#'*82)
 
+	def __del__(self):
+		# Closing file of history imported with load_history=False
+		close = getattr(getattr(self, 'history', None), 'close', None)
+		if close is not None:
+			close()
+
 	def list_config(self, prefix=''):
 		"""List all possible configuration settings with values"""
 		str = '\n=============================================\n'
@@ -934,7 +991,8 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
 			if self.discard_reader_if_not_relevant(reader):
 				logger.debug('DISCARDED: ' + readername)
 
-	def get_environment(self, variables, time, lon, lat, z, profiles):
+	def get_environment(self, variables, time, lon, lat, z, profiles,
+						ids=None):
 		'''Retrieve environmental variables at requested positions.
 
 		Updates:
@@ -949,6 +1007,23 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
 
 		'''
 		self.timer_start('main loop:readers')
+		env, env_profiles = self.get_environment_from_readers(
+			variables, time, lon, lat, z, profiles, ids)
+		env, env_profiles, missing = self.postprocess_environment(
+			variables, profiles, env, env_profiles)
+		self.timer_end('main loop:readers')
+
+		return env, env_profiles, missing
+
+	def get_environment_from_readers(self, variables, time, lon, lat, z,
+									 profiles, ids=None):
+		'''Interpolate environmental variables from readers.
+
+		Returns masked arrays of environment variables and profiles
+		(or None) at requested positions, as provided by the readers,
+		before fallback values and uncertainties are applied. ids are
+		optional (unique) element IDs of the positions, passed to readers.
+		'''
 		# Initialise ndarray to hold environment variables
 		dtype = [(var, np.float32) for var in variables]
 		env = np.ma.array(np.zeros(len(lon))*np.nan, dtype=dtype)
@@ -1001,150 +1076,225 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
 		# For each variable/reader group:
 		variable_groups, reader_groups, missing_variables = \
 			self.get_reader_groups(variables)
-		for variable in variables:  # Fill with fallback value if no reader
-			co = self.get_config('environment:fallback:%s' % variable)
-			if co is not None:
-				env[variable] = np.ma.ones(env[variable].shape) * co
 
-		for i, variable_group in enumerate(variable_groups):
-			logger.debug('----------------------------------------')
-			logger.debug('Variable group %s' % (str(variable_group)))
-			logger.debug('----------------------------------------')
-			reader_group = reader_groups[i]
-			missing_indices = np.array(range(len(lon)))
-			# For each reader:
-			for reader_name in reader_group:
-				logger.debug('Calling reader ' + reader_name)
-				logger.debug('----------------------------------------')
-				self.timer_start('main loop:readers:' +
-								 reader_name.replace(':', '<colon>'))
-				reader = self.readers[reader_name]
-				if reader.is_lazy:
-					logger.warning('Reader is lazy, should not happen')
-					import sys; sys.exit('Should not happen')
-				if not reader.covers_time(time):
-					logger.debug('\tOutside time coverage of reader.')
-					if reader_name == reader_group[-1]:
-						if self._initialise_next_lazy_reader() is not None:
-							logger.debug('Missing variables: calling get_environment recursively')
-							return self.get_environment(variables,
-										time, lon, lat, z, profiles)
-					continue
-				# Fetch given variables at given positions from current reader
-				try:
-					logger.debug('Data needed for %i elements' %
-								  len(missing_indices))
-					# Check if vertical profiles are requested from reader
-					if profiles is not None:
-						profiles_from_reader = list(
-							set(variable_group) & set(profiles))
-						if profiles_from_reader == []:
-							profiles_from_reader = None
-					else:
-						profiles_from_reader = None
-					env_tmp, env_profiles_tmp = \
-						reader.get_variables_interpolated(
-							variable_group, profiles_from_reader,
-							self.required_profiles_z_range, time,
-							lon[missing_indices], lat[missing_indices],
-							z[missing_indices], self.proj)
+		def fetch(i):
+			return self._get_environment_from_reader_group(
+				variable_groups[i], reader_groups[i], time, lon, lat, z,
+				profiles, ids)
+
+		if self.get_config('general:concurrent_readers') is True and \
+				len(variable_groups) > 1 and len(self._lazy_readers()) == 0:
+			# Groups sharing a reader are fetched in sequence by one thread,
+			# and other groups concurrently. Reads of netCDF files are
+			# serialised by the readers, through xarray or opendrift.locks
+			chains = []  # (group indices, reader names)
+			for i, reader_group in enumerate(reader_groups):
+				joined = [c for c in chains if c[1] & set(reader_group)]
+				chains = [c for c in chains if c not in joined]
+				chains.append((sorted([j for c in joined for j in c[0]] + [i]),
+							   set(reader_group).union(*[c[1] for c in joined])))
+			logger.debug('Fetching %i variable groups in %i threads' %
+						 (len(variable_groups), len(chains)))
+			with ThreadPoolExecutor(max_workers=len(chains)) as pool:
+				chain_results = pool.map(
+					lambda chain: [(i, fetch(i)) for i in chain[0]], chains)
+				group_results = dict(r for results in chain_results
+									 for r in results)
+			group_results = [group_results[i] for i in
+							 range(len(variable_groups))]
+		else:
+			group_results = (fetch(i) for i in range(len(variable_groups)))
+
+		# Results are merged in order of variable groups
+		env_profiles = None
+		for variable_group, results in zip(variable_groups, group_results):
+			if results is None:
+				logger.debug('Missing variables: calling get_environment recursively')
+				return self.get_environment_from_readers(
+					variables, time, lon, lat, z, profiles, ids)
+			for indices, env_tmp, env_profiles_tmp, profiles_from_reader in results:
+				env_profiles = self._merge_environment(
+					env, env_profiles, variable_group, indices, env_tmp,
+					env_profiles_tmp, profiles_from_reader)
 
-				except Exception as e:
-					logger.info('========================')
-					logger.info('Exception:')
-					logger.info(e)
-					logger.debug(traceback.format_exc())
-					logger.info('========================')
-					self.timer_end('main loop:readers:' +
-								   reader_name.replace(':', '<colon>'))
-					if reader_name == reader_group[-1]:
-						if self._initialise_next_lazy_reader() is not None:
-							logger.debug('Missing variables: calling get_environment recursively')
-							return self.get_environment(variables,
-										time, lon, lat, z, profiles)
-					continue
+		logger.debug('---------------------------------------')
+		logger.debug('Finished processing all variable groups')
 
-				# Copy retrieved variables to env array, and mask nan-values
-				for var in variable_group:
-					if var not in self.required_variables:
-						logger.debug('Not returning env-variable: ' + var)
-						continue
-					env[var][missing_indices] = np.ma.masked_invalid(
-						env_tmp[var][0:len(missing_indices)]).astype('float32')
-					if profiles_from_reader is not None and var in profiles_from_reader:
-						if 'env_profiles' not in locals():
-							env_profiles = env_profiles_tmp
-						# TODO: fix to be checked
-						if var in env_profiles and var in env_profiles_tmp:
-							# If one profile has fewer vertical layers than
-							# the other, we use only the overlapping part
-							if len(env_profiles['z']) != len(
-								env_profiles_tmp['z']):
-								logger.debug('Warning: different number of '
-									' vertical layers: %s and %s' % (
-										len(env_profiles['z']),
-										len( env_profiles_tmp['z'])))
-							z_ind = np.arange(np.minimum(
-								len(env_profiles['z'])-1,
-								len(env_profiles_tmp['z'])-1))
-							# len(missing_indices) since 2 points might have been added and not removed
-							env_profiles_tmp[var] = np.ma.atleast_2d(env_profiles_tmp[var])
-							env_profiles[var][np.ix_(z_ind, missing_indices)] = \
-								np.ma.masked_invalid(env_profiles_tmp[var][z_ind,0:len(missing_indices)]).astype('float32')
-							# For profiles with different numbers of layers, we extrapolate
-							if env_profiles[var].shape[0] > 1:
-								missingbottom = np.isnan(env_profiles[var][-1,:])
-								env_profiles[var][-1, missingbottom] = env_profiles[var][-2, missingbottom]
-
-				# Detect elements with missing data, for present reader group
-				if hasattr(env_tmp[variable_group[0]], 'mask'):
-					try:
-						del combined_mask
-					except:
-						pass
-					for var in variable_group:
-						tmp_var = np.ma.masked_invalid(env_tmp[var])
-						# Changed 13 Oct 2016, but uncertain of effect
-						# TODO: to be checked
-						#tmp_var = env_tmp[var]
-						if 'combined_mask' not in locals():
-							combined_mask = np.ma.getmask(tmp_var)
-						else:
-							combined_mask = \
-								np.ma.mask_or(combined_mask,
-											  np.ma.getmask(tmp_var),
-											  shrink=False)
-					try:
-						if len(missing_indices) != len(combined_mask):
-							# TODO: mask mismatch due to 2 added points
-							raise ValueError('Mismatch of masks')
-						missing_indices = missing_indices[combined_mask]
-					except Exception as ex:  # Not sure what is happening here
-						logger.info('Problems setting mask on missing_indices!')
-						logger.exception(ex)
+		return env, env_profiles
+
+	def _get_environment_from_reader_group(self, variable_group, reader_group,
+										   time, lon, lat, z, profiles,
+										   ids=None):
+		'''Interpolate variable group from the readers of a reader group.
+
+		Readers are called in order of priority, each for the elements
+		with data missing from the previous readers. Returns list of
+		(element indices, env_tmp, env_profiles_tmp, profiles_from_reader)
+		for each reader providing data, or None if a lazy reader has been
+		initialised, and the environment shall be retrieved again.
+		'''
+		logger.debug('----------------------------------------')
+		logger.debug('Variable group %s' % (str(variable_group)))
+		logger.debug('----------------------------------------')
+		results = []
+		missing_indices = np.array(range(len(lon)))
+		# For each reader:
+		for reader_name in reader_group:
+			logger.debug('Calling reader ' + reader_name)
+			logger.debug('----------------------------------------')
+			self.timer_start('main loop:readers:' +
+							 reader_name.replace(':', '<colon>'))
+			reader = self.readers[reader_name]
+			if reader.is_lazy:
+				logger.warning('Reader is lazy, should not happen')
+				import sys; sys.exit('Should not happen')
+			if not reader.covers_time(time):
+				logger.debug('\tOutside time coverage of reader.')
+				if reader_name == reader_group[-1]:
+					if self._initialise_next_lazy_reader() is not None:
+						return None
+				continue
+			# Fetch given variables at given positions from current reader
+			try:
+				logger.debug('Data needed for %i elements' %
+							  len(missing_indices))
+				# Check if vertical profiles are requested from reader
+				if profiles is not None:
+					profiles_from_reader = list(
+						set(variable_group) & set(profiles))
+					if profiles_from_reader == []:
+						profiles_from_reader = None
 				else:
-					missing_indices = []  # temporary workaround
-				if (type(missing_indices) == np.int64) or (
-						type(missing_indices) == np.int32):
-					missing_indices = []
+					profiles_from_reader = None
+				env_tmp, env_profiles_tmp = \
+					reader.get_variables_interpolated(
+						variable_group, profiles_from_reader,
+						self.required_profiles_z_range, time,
+						lon[missing_indices], lat[missing_indices],
+						z[missing_indices], self.proj,
+						None if ids is None else ids[missing_indices])
+
+			except Exception as e:
+				logger.info('========================')
+				logger.info('Exception:')
+				logger.info(e)
+				logger.debug(traceback.format_exc())
+				logger.info('========================')
 				self.timer_end('main loop:readers:' +
 							   reader_name.replace(':', '<colon>'))
-				if len(missing_indices) == 0:
-					logger.debug('Obtained data for all elements.')
-					break
-				else:
-					logger.debug('Data missing for %i elements.' %
-								  (len(missing_indices)))
-					if len(self._lazy_readers()) > 0:
-						if self._initialise_next_lazy_reader() is not None:
-							logger.warning('Missing variables: calling get_environment recursively')
-							return self.get_environment(variables,
-								time, lon, lat, z, profiles)
+				if reader_name == reader_group[-1]:
+					if self._initialise_next_lazy_reader() is not None:
+						return None
+				continue
 
-		logger.debug('---------------------------------------')
-		logger.debug('Finished processing all variable groups')
+			results.append((missing_indices, env_tmp, env_profiles_tmp,
+							profiles_from_reader))
 
+			# Detect elements with missing data, for present reader group
+			if hasattr(env_tmp[variable_group[0]], 'mask'):
+				try:
+					del combined_mask
+				except:
+					pass
+				for var in variable_group:
+					tmp_var = np.ma.masked_invalid(env_tmp[var])
+					# Changed 13 Oct 2016, but uncertain of effect
+					# TODO: to be checked
+					#tmp_var = env_tmp[var]
+					if 'combined_mask' not in locals():
+						combined_mask = np.ma.getmask(tmp_var)
+					else:
+						combined_mask = \
+							np.ma.mask_or(combined_mask,
+										  np.ma.getmask(tmp_var),
+										  shrink=False)
+				try:
+					if len(missing_indices) != len(combined_mask):
+						# TODO: mask mismatch due to 2 added points
+						raise ValueError('Mismatch of masks')
+					missing_indices = missing_indices[combined_mask]
+				except Exception as ex:  # Not sure what is happening here
+					logger.info('Problems setting mask on missing_indices!')
+					logger.exception(ex)
+			else:
+				missing_indices = []  # temporary workaround
+			if (type(missing_indices) == np.int64) or (
+					type(missing_indices) == np.int32):
+				missing_indices = []
+			self.timer_end('main loop:readers:' +
+						   reader_name.replace(':', '<colon>'))
+			if len(missing_indices) == 0:
+				logger.debug('Obtained data for all elements.')
+				break
+			else:
+				logger.debug('Data missing for %i elements.' %
+							  (len(missing_indices)))
+				if len(self._lazy_readers()) > 0:
+					if self._initialise_next_lazy_reader() is not None:
+						logger.warning('Missing variables: calling get_environment recursively')
+						return None
+
+		return results
+
+	def _merge_environment(self, env, env_profiles, variable_group,
+						   missing_indices, env_tmp, env_profiles_tmp,
+						   profiles_from_reader):
+		'''Copy variables retrieved from a reader to env array.
+
+		Returns env_profiles, which is env_profiles_tmp of the first
+		reader providing profiles.
+		'''
+		# Copy retrieved variables to env array, and mask nan-values
+		for var in variable_group:
+			if var not in self.required_variables:
+				logger.debug('Not returning env-variable: ' + var)
+				continue
+			env[var][missing_indices] = np.ma.masked_invalid(
+				env_tmp[var][0:len(missing_indices)]).astype('float32')
+			if profiles_from_reader is not None and var in profiles_from_reader:
+				if env_profiles is None:
+					env_profiles = env_profiles_tmp
+				# TODO: fix to be checked
+				if var in env_profiles and var in env_profiles_tmp:
+					# If one profile has fewer vertical layers than
+					# the other, we use only the overlapping part
+					if len(env_profiles['z']) != len(
+						env_profiles_tmp['z']):
+						logger.debug('Warning: different number of '
+							' vertical layers: %s and %s' % (
+								len(env_profiles['z']),
+								len( env_profiles_tmp['z'])))
+					z_ind = np.arange(np.minimum(
+						len(env_profiles['z'])-1,
+						len(env_profiles_tmp['z'])-1))
+					# len(missing_indices) since 2 points might have been added and not removed
+					env_profiles_tmp[var] = np.ma.atleast_2d(env_profiles_tmp[var])
+					env_profiles[var][np.ix_(z_ind, missing_indices)] = \
+						np.ma.masked_invalid(env_profiles_tmp[var][z_ind,0:len(missing_indices)]).astype('float32')
+					# For profiles with different numbers of layers, we extrapolate
+					if env_profiles[var].shape[0] > 1:
+						missingbottom = np.isnan(env_profiles[var][-1,:])
+						env_profiles[var][-1, missingbottom] = env_profiles[var][-2, missingbottom]
+
+		return env_profiles
+
+	def postprocess_environment(self, variables, profiles, env, env_profiles):
+		'''Apply fallback values, parameterisations and uncertainties.
+
+		Takes the output of get_environment_from_readers for the active
+		elements, and returns environment, profiles and missing-mask
+		as get_environment.
+		'''
 		self.timer_start('main loop:readers:postprocessing')
+		if not hasattr(self, 'fallback_values'):
+			self.set_fallback_values(refresh=False)
+		for variable in variables:  # Fill with fallback value if no reader
+			co = self.get_config('environment:fallback:%s' % variable)
+			if co is not None:
+				invalid = np.ma.getmaskarray(env[variable]) | \
+					np.isnan(np.ma.getdata(env[variable]))
+				env[variable][invalid] = co
+
 		for var in self.fallback_values:
 			if (var not in variables) and (profiles is None or var not in profiles):
 				continue
@@ -1155,7 +1305,7 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
 				env[var][mask] = self.fallback_values[var]
 			# Profiles
 			if profiles is not None and var in profiles:
-				if 'env_profiles' not in locals():
+				if env_profiles is None:
 					logger.debug('Creating empty dictionary for profiles not '
 								  'profided by any reader: ' + str(self.required_profiles))
 					env_profiles = {}
@@ -1186,7 +1336,7 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
 			if len(t_kelvin) > 0:
 				logger.warning('Converting temperatures from Kelvin to Celcius')
 				env['sea_water_temperature'][t_kelvin] = env['sea_water_temperature'][t_kelvin] - 273.15
-				if 'env_profiles' in locals() and 'sea_water_temperature' in env_profiles.keys():
+				if env_profiles is not None and 'sea_water_temperature' in env_profiles.keys():
 				  env_profiles['sea_water_temperature'][:,t_kelvin] = \
 					env_profiles['sea_water_temperature'][:,t_kelvin] - 273.15
 
@@ -1280,10 +1430,6 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
 									np.ma.masked_invalid(env[var]).mask,
 									shrink=False)
 
-		# Convert dictionary to recarray and return
-		if 'env_profiles' not in locals():
-			env_profiles = None
-
 		# Convert masked arrays to regular arrays for increased performance
 		env = np.array(env)
 		if env_profiles is not None:
@@ -1291,7 +1437,6 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
 				env_profiles[var] = np.array(env_profiles[var])
 
 		self.timer_end('main loop:readers:postprocessing')
-		self.timer_end('main loop:readers')
 
 		return env.view(np.recarray), env_profiles, missing
 
@@ -1381,7 +1526,12 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
 			self.elements_scheduled.lon[indices],
 			self.elements_scheduled.lat[indices])
 		self.elements_scheduled.move_elements(self.elements, indices)
-		self.elements_scheduled_time = self.elements_scheduled_time[~indices]
+		num_released = np.sum(indices)
+		if not indices[num_released:].any():  # The first elements released
+			self.elements_scheduled_time = \
+				self.elements_scheduled_time[num_released:]
+		else:
+			self.elements_scheduled_time = self.elements_scheduled_time[~indices]
 		logger.debug('Released %i new elements.' % np.sum(indices))
 
 	def closest_ocean_points(self, lon, lat):
@@ -2083,7 +2233,8 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
 
 	def run(self, time_step=None, steps=None, time_step_output=None,
 			duration=None, end_time=None, outfile=None, export_variables=None,
-			export_buffer_length=100, stop_on_error=False):
+			export_buffer_length=100, stop_on_error=False,
+			output_encoding=None):
 		"""Start a trajectory simulation, after initial configuration.
 
 		Performs the main loop:
@@ -2117,6 +2268,13 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
 				- end_time: datetime object defining the end of the simulation
 			export_variables: list of variables and parameter names to be
 				saved to file. Default is None (all variables are saved)
+			output_encoding: dictionary with netCDF encoding of variables
+				in output file, overriding compression and chunking from
+				config, e.g. {'lon': {'dtype': 'i4', 'scale_factor': 1e-6},
+				'sea_water_temperature': {'least_significant_digit': 2}}.
+				Keys are dtype, scale_factor, add_offset (integer packing),
+				least_significant_digit (quantization), chunksizes,
+				zlib, complevel and shuffle.
 		"""
 
 		# Exporting software and hardware specification, for possible debugging
@@ -2127,77 +2285,77 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
 
 		if self.num_elements_scheduled() == 0:
 			raise ValueError('Please seed elements before starting a run.')
-		self.elements = self.ElementType()
 
-		# Export seed_geojson as FeatureCollection string
-		self.add_metadata('seed_geojson', geojson.FeatureCollection(self.seed_geojson))
+		self.output_encoding = output_encoding
 
-		# Collect fallback values from config into dict
-		self.set_fallback_values(refresh=True)
+		if self.get_config('general:num_processes') > 1:
+			return self._run_partitioned(
+				time_step=time_step, steps=steps,
+				time_step_output=time_step_output, duration=duration,
+				end_time=end_time, outfile=outfile,
+				export_variables=export_variables,
+				export_buffer_length=export_buffer_length,
+				stop_on_error=stop_on_error)
 
 		if outfile is None and export_buffer_length is not None:
 			logger.debug('No output file is specified, '
 						  'neglecting export_buffer_length')
 			export_buffer_length = None
 
-		# Set projection to latlong if not taken from any of the readers
-		if self.proj is not None and not (self.proj.crs.is_geographic or
-			'proj=merc' in self.proj.srs):
-			for vector_component in vector_pairs_xy:
-				for component in vector_component:
-					if component in self.fallback_values and \
-							self.fallback_values[component] != 0:
-						logger.info('Setting SRS to latlong, since non-zero '
-									 'value used for fallback vectors (%s)' %
-									 component)
-						self.set_projection('+proj=latlong')
-		if self.proj is None:
-			logger.info('Setting SRS to latlong, since not defined before.')
-			self.set_projection('+proj=latlong')
+		self._prepare_main_loop(time_step=time_step, steps=steps,
+								time_step_output=time_step_output,
+								duration=duration, end_time=end_time,
+								outfile=outfile,
+								export_variables=export_variables,
+								export_buffer_length=export_buffer_length)
 
-		# Check if any readers have same SRS as simulation
-		for reader in self.readers.values():
-			if reader.is_lazy:
-				continue
-			readerSRS = reader.proj.srs.replace(' +ellps=WGS84', '').strip()
-			simulationSRS = self.proj.srs.replace(' +ellps=WGS84', '').strip()
-			if readerSRS == simulationSRS:
-				reader.simulation_SRS = True
-			else:
-				reader.simulation_SRS = False
+		##########################
+		# Main loop
+		##########################
+		self.add_metadata('simulation_time', datetime.now())
+		self.timer_end('preparing main loop')
+		self.timer_start('main loop')
+		for i in range(self.expected_steps_calculation):
+			try:
+				if self._start_step() is False:
+					continue
 
-		# Make constant readers if config environment:constant:<var> is
-		c = self.get_configspec('environment:constant:')
-		mr = {}
-		for var in list(c):
-			if c[var]['value'] is not None:
-				mr[var.split(':')[-1]] = c[var]['value']
-		if len(mr) > 0:
-			from opendrift.readers import reader_constant
-			rc = reader_constant.Reader(mr)
-			self.add_reader(rc, first=True)
+				self.environment, self.environment_profiles, missing = \
+					self.get_environment(list(self.required_variables),
+										 self.time,
+										 self.elements.lon,
+										 self.elements.lat,
+										 self.elements.z,
+										 self.required_profiles,
+										 self.elements.ID)
 
-		missing_variables = self.missing_variables()
-		missing_variables = [m for m in missing_variables if
-							 m != 'land_binary_mask']
-		if len(missing_variables) > 0:
-			has_fallback = [var for var in missing_variables
-							if var in self.fallback_values]
-			has_no_fallback = [var for var in missing_variables
-							   if var not in self.fallback_values]
-			#if has_fallback == missing_variables:
-			if len(has_fallback) > 0:# == missing_variables:
-				logger.info('Fallback values will be used for the following '
-							 'variables which have no readers: ')
-				for var in has_fallback:
-					logger.info('\t%s: %f' % (var, self.fallback_values[var]))
-			#else:
-			if len(has_no_fallback) > 0 and len(self._lazy_readers()) == 0:# == missing_variables:
-				logger.warning('No readers added for the following variables: '
-								+ str(has_no_fallback))
-				raise ValueError('Readers must be added for the '
-								 'following required variables: ' +
-								 str(has_no_fallback))
+				self._complete_step(missing)
+
+			except Exception as e:
+				self._stop_main_loop(e, stop_on_error)
+				break
+
+		self.timer_end('main loop')
+		self._finish_run(outfile, export_buffer_length)
+
+	def _prepare_main_loop(self, time_step, steps, time_step_output,
+						   duration, end_time, outfile, export_variables,
+						   export_buffer_length, prepare_readers=True):
+		"""Prepare time stepping, readers and history array before main loop.
+
+		Readers are prepared for the simulation coverage only if
+		prepare_readers is True, otherwise they are assumed to be prepared
+		by a simulation providing the environment (see run_ensemble).
+		"""
+		self.elements = self.ElementType()
+
+		# Export seed_geojson as FeatureCollection string
+		self.add_metadata('seed_geojson', geojson.FeatureCollection(self.seed_geojson))
+
+		# Collect fallback values from config into dict
+		self.set_fallback_values(refresh=True)
+
+		self._prepare_projection()
 
 		# Some cleanup needed if starting from imported state
 		if self.steps_calculation >= 1:
@@ -2210,6 +2368,121 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
 			# TODO: should start from 1?
 			self.elements.ID = np.arange(0, self.num_elements_active())
 
+		self._prepare_time_steps(time_step=time_step, steps=steps,
+								 time_step_output=time_step_output,
+								 duration=duration, end_time=end_time)
+
+		if prepare_readers is True:
+			self._prepare_readers()
+
+		# Move point seed on land to ocean
+		if self.get_config('seed:ocean_only') is True and \
+			('land_binary_mask' not in self.fallback_values) and \
+			('land_binary_mask' in self.required_variables):
+			self.timer_start('preparing main loop:moving elements to ocean')
+			self.elements_scheduled.lon, self.elements_scheduled.lat = \
+				self.closest_ocean_points(self.elements_scheduled.lon,
+										  self.elements_scheduled.lat)
+			self.timer_end('preparing main loop:moving elements to ocean')
+
+		####################################################################
+		# Preparing history array for storage in memory and eventually file
+		####################################################################
+		if export_buffer_length is None:
+			self.export_buffer_length = self.expected_steps_output
+		else:
+			self.export_buffer_length = export_buffer_length
+
+		if self.time_step.days < 0:
+			# For backwards simulation, we start at last seeded element
+			logger.info('Backwards simulation, starting at '
+						 'time of last seeded element')
+			self.time = self.elements_scheduled_time.max()
+			# Flipping ID array, so that lowest IDs are released first
+			self.elements_scheduled.ID = \
+				np.flipud(self.elements_scheduled.ID)
+		else:
+			# Forward simulation, start time has been set when seeding
+			self.time = self.start_time
+
+		# Add the output variables which are always required
+		if export_variables is not None:
+			export_variables = list(set(export_variables +
+										['lon', 'lat', 'ID', 'status']))
+		self.export_variables = export_variables
+		# Initialise array to hold history (element properties and environment)
+		# for export to file.
+		history_dtype_fields = [(name,
+								 self.ElementType.variables[name]['dtype'])
+								for name in self.ElementType.variables]
+		# Add environment variables
+		self.history_metadata = self.ElementType.variables.copy()
+		for env_var in self.required_variables:
+			history_dtype_fields.append((env_var, np.dtype('float32')))
+			self.history_metadata[env_var] = {}
+
+		# Remove variables from output array, if only subset is requested
+		if self.export_variables is not None:
+			history_dtype_fields = [f for f in history_dtype_fields
+									if f[0] in self.export_variables]
+			for m in list(self.history_metadata):
+				if m not in self.export_variables:
+					del self.history_metadata[m]
+
+		history_dtype = np.dtype(history_dtype_fields)
+		if self.get_config('general:history_backend') == 'ndarray':
+			self.history = HistoryBuffer(history_dtype,
+										 len(self.elements_scheduled),
+										 self.export_buffer_length)
+		else:
+			self.history = np.ma.array(np.zeros((len(self.elements_scheduled),
+												 self.export_buffer_length)),
+									   dtype=history_dtype)
+			self.history.mask = True
+		self.steps_exported = 0
+
+		if outfile is not None:
+			self.io_init(outfile)
+		else:
+			self.outfile = None
+
+		#############################
+		# Check validity domain
+		#############################
+		validity_domain = [
+			self.get_config('drift:deactivate_west_of'),
+			self.get_config('drift:deactivate_east_of'),
+			self.get_config('drift:deactivate_south_of'),
+			self.get_config('drift:deactivate_north_of')]
+		if validity_domain == [None, None, None, None]:
+			self.validity_domain = None
+		else:
+			self.validity_domain = validity_domain
+
+		#############################
+		# Model specific preparation
+		#############################
+		self.prepare_run()
+
+	def _prepare_projection(self):
+		"""Set projection to latlong if not taken from any of the readers"""
+		if self.proj is not None and not (self.proj.crs.is_geographic or
+			'proj=merc' in self.proj.srs):
+			for vector_component in vector_pairs_xy:
+				for component in vector_component:
+					if component in self.fallback_values and \
+							self.fallback_values[component] != 0:
+						logger.info('Setting SRS to latlong, since non-zero '
+									 'value used for fallback vectors (%s)' %
+									 component)
+						self.set_projection('+proj=latlong')
+		if self.proj is None:
+			logger.info('Setting SRS to latlong, since not defined before.')
+			self.set_projection('+proj=latlong')
+
+	def _prepare_time_steps(self, time_step, steps, time_step_output,
+							duration, end_time):
+		"""Set time step, output time step and expected number of steps."""
 		########################
 		# Simulation time step
 		########################
@@ -2284,6 +2557,52 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
 		self.expected_steps_calculation = int(self.expected_steps_calculation)
 		self.expected_end_time = self.start_time + self.expected_steps_calculation*self.time_step
 
+	def _prepare_readers(self):
+		"""Check and prepare readers for the simulation coverage and time."""
+		# Check if any readers have same SRS as simulation
+		for reader in self.readers.values():
+			if reader.is_lazy:
+				continue
+			readerSRS = reader.proj.srs.replace(' +ellps=WGS84', '').strip()
+			simulationSRS = self.proj.srs.replace(' +ellps=WGS84', '').strip()
+			if readerSRS == simulationSRS:
+				reader.simulation_SRS = True
+			else:
+				reader.simulation_SRS = False
+
+		# Make constant readers if config environment:constant:<var> is
+		c = self.get_configspec('environment:constant:')
+		mr = {}
+		for var in list(c):
+			if c[var]['value'] is not None:
+				mr[var.split(':')[-1]] = c[var]['value']
+		if len(mr) > 0:
+			from opendrift.readers import reader_constant
+			rc = reader_constant.Reader(mr)
+			self.add_reader(rc, first=True)
+
+		missing_variables = self.missing_variables()
+		missing_variables = [m for m in missing_variables if
+							 m != 'land_binary_mask']
+		if len(missing_variables) > 0:
+			has_fallback = [var for var in missing_variables
+							if var in self.fallback_values]
+			has_no_fallback = [var for var in missing_variables
+							   if var not in self.fallback_values]
+			#if has_fallback == missing_variables:
+			if len(has_fallback) > 0:# == missing_variables:
+				logger.info('Fallback values will be used for the following '
+							 'variables which have no readers: ')
+				for var in has_fallback:
+					logger.info('\t%s: %f' % (var, self.fallback_values[var]))
+			#else:
+			if len(has_no_fallback) > 0 and len(self._lazy_readers()) == 0:# == missing_variables:
+				logger.warning('No readers added for the following variables: '
+								+ str(has_no_fallback))
+				raise ValueError('Readers must be added for the '
+								 'following required variables: ' +
+								 str(has_no_fallback))
+
 		##############################################################
 		# Prepare readers for the requested simulation domain/time
 		##############################################################
@@ -2336,208 +2655,123 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
 
 			self.timer_end('preparing main loop:making dynamical landmask')
 
-		# Move point seed on land to ocean
-		if self.get_config('seed:ocean_only') is True and \
-			('land_binary_mask' not in self.fallback_values) and \
-			('land_binary_mask' in self.required_variables):
-			self.timer_start('preparing main loop:moving elements to ocean')
-			self.elements_scheduled.lon, self.elements_scheduled.lat = \
-				self.closest_ocean_points(self.elements_scheduled.lon,
-										  self.elements_scheduled.lat)
-			self.timer_end('preparing main loop:moving elements to ocean')
-
-		####################################################################
-		# Preparing history array for storage in memory and eventually file
-		####################################################################
-		if export_buffer_length is None:
-			self.export_buffer_length = self.expected_steps_output
-		else:
-			self.export_buffer_length = export_buffer_length
+	def _start_step(self):
+		"""First part of a time step, before environment is retrieved.
 
-		if self.time_step.days < 0:
-			# For backwards simulation, we start at last seeded element
-			logger.info('Backwards simulation, starting at '
-						 'time of last seeded element')
-			self.time = self.elements_scheduled_time.max()
-			# Flipping ID array, so that lowest IDs are released first
-			self.elements_scheduled.ID = \
-				np.flipud(self.elements_scheduled.ID)
-		else:
-			# Forward simulation, start time has been set when seeding
-			self.time = self.start_time
-
-		# Add the output variables which are always required
-		if export_variables is not None:
-			export_variables = list(set(export_variables +
-										['lon', 'lat', 'ID', 'status']))
-		self.export_variables = export_variables
-		# Initialise array to hold history (element properties and environment)
-		# for export to file.
-		history_dtype_fields = [(name,
-								 self.ElementType.variables[name]['dtype'])
-								for name in self.ElementType.variables]
-		# Add environment variables
-		self.history_metadata = self.ElementType.variables.copy()
-		for env_var in self.required_variables:
-			history_dtype_fields.append((env_var, np.dtype('float32')))
-			self.history_metadata[env_var] = {}
-
-		# Remove variables from output array, if only subset is requested
-		if self.export_variables is not None:
-			history_dtype_fields = [f for f in history_dtype_fields
-									if f[0] in self.export_variables]
-			for m in list(self.history_metadata):
-				if m not in self.export_variables:
-					del self.history_metadata[m]
-
-		history_dtype = np.dtype(history_dtype_fields)
-		self.history = np.ma.array(np.zeros((len(self.elements_scheduled),
-											 self.export_buffer_length)),
-								   dtype=history_dtype)
-		self.history.mask = True
-		self.steps_exported = 0
+		Returns False if the step is skipped, as there are no active
+		elements (but some scheduled for later).
+		"""
+		# Release elements
+		self.release_elements()
 
-		if outfile is not None:
-			self.io_init(outfile)
-		else:
-			self.outfile = None
+		if self.num_elements_active() == 0 and self.num_elements_scheduled() > 0:
+			self.steps_calculation += 1
+			logger.info('No active but %s scheduled elements, skipping timestep %s (%s)'
+							 % (self.num_elements_scheduled(), self.steps_calculation, self.time))
+			self.state_to_buffer()  # Append status to history array
+			if self.time is not None:
+				self.time = self.time + self.time_step
+			return False
 
-		#############################
-		# Check validity domain
-		#############################
-		validity_domain = [
-			self.get_config('drift:deactivate_west_of'),
-			self.get_config('drift:deactivate_east_of'),
-			self.get_config('drift:deactivate_south_of'),
-			self.get_config('drift:deactivate_north_of')]
-		if validity_domain == [None, None, None, None]:
-			self.validity_domain = None
-		else:
-			self.validity_domain = validity_domain
+		self.increase_age_and_retire()
 
-		#############################
-		# Model specific preparation
-		#############################
-		self.prepare_run()
+		self.lift_elements_to_seafloor()  # If seafloor is penetrated
 
-		##########################
-		# Main loop
-		##########################
-		self.add_metadata('simulation_time', datetime.now())
-		self.timer_end('preparing main loop')
-		self.timer_start('main loop')
-		for i in range(self.expected_steps_calculation):
-			try:
-				# Release elements
-				self.release_elements()
-
-				if self.num_elements_active() == 0 and self.num_elements_scheduled() > 0:
-					self.steps_calculation += 1
-					logger.info('No active but %s scheduled elements, skipping timestep %s (%s)'
-									 % (self.num_elements_scheduled(), self.steps_calculation, self.time))
-					self.state_to_buffer()  # Append status to history array
-					if self.time is not None:
-						self.time = self.time + self.time_step
-					continue
+		if self.show_continuous_performance is True:
+			logger.info(self.performance())
+		# Display time to terminal
+		logger.debug('==================================='*2)
+		logger.info('%s - step %i of %i - %i active elements '
+					 '(%i deactivated)' %
+					 (self.time, self.steps_calculation + 1,
+					  self.expected_steps_calculation,
+					  self.num_elements_active(),
+					  self.num_elements_deactivated()))
+		logger.debug('%s elements scheduled.' %
+					  self.num_elements_scheduled())
+		logger.debug('==================================='*2)
 
-				self.increase_age_and_retire()
+		return True
 
-				self.lift_elements_to_seafloor()  # If seafloor is penetrated
+	def _complete_step(self, missing):
+		"""Second part of a time step, after environment is retrieved."""
+		self.store_previous_variables()
 
-				if self.show_continuous_performance is True:
-					logger.info(self.performance())
-				# Display time to terminal
-				logger.debug('==================================='*2)
-				logger.info('%s - step %i of %i - %i active elements '
-							 '(%i deactivated)' %
-							 (self.time, self.steps_calculation + 1,
-							  self.expected_steps_calculation,
-							  self.num_elements_active(),
-							  self.num_elements_deactivated()))
-				logger.debug('%s elements scheduled.' %
-							  self.num_elements_scheduled())
-				logger.debug('==================================='*2)
+		self.calculate_missing_environment_variables()
 
-				self.environment, self.environment_profiles, missing = \
-					self.get_environment(list(self.required_variables),
-										 self.time,
-										 self.elements.lon,
-										 self.elements.lat,
-										 self.elements.z,
-										 self.required_profiles)
+		if any(missing):
+			self.report_missing_variables()
 
-				self.store_previous_variables()
+		self.interact_with_coastline()
 
-				self.calculate_missing_environment_variables()
+		self.lift_elements_to_seafloor()  # If seafloor is penetrated
 
-				if any(missing):
-					self.report_missing_variables()
+		self.deactivate_elements(missing, reason='missing_data')
 
-				self.interact_with_coastline()
+		self.state_to_buffer()  # Append status to history array
 
-				self.lift_elements_to_seafloor()  # If seafloor is penetrated
+		self.remove_deactivated_elements()
 
-				self.deactivate_elements(missing, reason='missing_data')
+		# Propagate one timestep forwards
+		self.steps_calculation += 1
 
-				self.state_to_buffer()  # Append status to history array
+		if self.num_elements_active() == 0 and self.num_elements_scheduled() == 0:
+			raise ValueError('No more active or scheduled elements, quitting.')
 
-				self.remove_deactivated_elements()
+		# Store location, in case elements shall be moved back
+		self.store_present_positions()
 
-				# Propagate one timestep forwards
-				self.steps_calculation += 1
-
-				if self.num_elements_active() == 0 and self.num_elements_scheduled() == 0:
-					raise ValueError('No more active or scheduled elements, quitting.')
-
-				# Store location, in case elements shall be moved back
-				self.store_present_positions()
+		#####################################################
+		if self.num_elements_active() > 0:
+			logger.debug('Calling %s.update()' %
+						  type(self).__name__)
+			self.timer_start('main loop:updating elements')
+			self.update()
+			self.timer_end('main loop:updating elements')
+		else:
+			logger.info('No active elements, skipping update() method')
+		#####################################################
 
-				#####################################################
-				if self.num_elements_active() > 0:
-					logger.debug('Calling %s.update()' %
-								  type(self).__name__)
-					self.timer_start('main loop:updating elements')
-					self.update()
-					self.timer_end('main loop:updating elements')
-				else:
-					logger.info('No active elements, skipping update() method')
-				#####################################################
+		self.horizontal_diffusion()
 
-				self.horizontal_diffusion()
+		if self.num_elements_active() == 0 and self.num_elements_scheduled() == 0:
+			raise ValueError('No active or scheduled elements, quitting simulation')
 
-				if self.num_elements_active() == 0 and self.num_elements_scheduled() == 0:
-					raise ValueError('No active or scheduled elements, quitting simulation')
+		logger.debug('%s active elements (%s deactivated)' %
+					  (self.num_elements_active(),
+					   self.num_elements_deactivated()))
+		# Updating time
+		if self.time is not None:
+			self.time = self.time + self.time_step
 
-				logger.debug('%s active elements (%s deactivated)' %
-							  (self.num_elements_active(),
-							   self.num_elements_deactivated()))
-				# Updating time
-				if self.time is not None:
-					self.time = self.time + self.time_step
+	def _stop_main_loop(self, e, stop_on_error):
+		"""Handle exception raised during a time step, ending the main loop.
 
-			except Exception as e:
-				message = ('The simulation stopped before requested '
-						   'end time was reached.')
-				logger.warning(message)
-				self.store_message(message)
-				logger.info('========================')
-				logger.info('End of simulation:')
-				logger.info(e)
-				logger.info(traceback.format_exc())
-				logger.info(self.get_messages())
-				if not hasattr(self, 'environment'):
-					sys.exit('Simulation aborted. ' +
-							 self.get_messages())
-				logger.info('========================')
-				if stop_on_error is True:
-					sys.exit('Stopping on error. ' +
-							 self.get_messages())
-				if self.steps_calculation <= 1:
-					raise ValueError('Simulation stopped within '
-						'first timestep. ' + self.get_messages())
-				break
-
-		self.timer_end('main loop')
+		Exits if stop_on_error is True, and raises an error if the
+		simulation stopped within the first time step.
+		"""
+		message = ('The simulation stopped before requested '
+				   'end time was reached.')
+		logger.warning(message)
+		self.store_message(message)
+		logger.info('========================')
+		logger.info('End of simulation:')
+		logger.info(e)
+		logger.info(traceback.format_exc())
+		logger.info(self.get_messages())
+		if not hasattr(self, 'environment'):
+			sys.exit('Simulation aborted. ' +
+					 self.get_messages())
+		logger.info('========================')
+		if stop_on_error is True:
+			sys.exit('Stopping on error. ' +
+					 self.get_messages())
+		if self.steps_calculation <= 1:
+			raise ValueError('Simulation stopped within '
+				'first timestep. ' + self.get_messages())
+
+	def _finish_run(self, outfile, export_buffer_length):
+		"""Store final state, add metadata and write/import output file."""
 		self.timer_start('cleaning up')
 		logger.debug('Cleaning up')
 
@@ -2572,6 +2806,8 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
 		#self.remove_deactivated_elements()
 
 		if export_buffer_length is None:
+			if isinstance(self.history, HistoryBuffer):
+				self.history = self.history.to_masked_array()
 			# Remove columns for unseeded elements in history array
 			if self.num_elements_scheduled() > 0:
 				logger.info('Removing %i unseeded elements from history array' %
@@ -2592,6 +2828,391 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
 		self.timer_end('cleaning up')
 		self.timer_end('total time')
 
+	def run_ensemble(self, members, time_step=None, steps=None,
+					 time_step_output=None, duration=None, end_time=None,
+					 outfile=None, export_variables=None, stop_on_error=False,
+					 output_encoding=None):
+		"""Run several variations of this simulation in one time loop.
+
+		The ensemble members are advanced together, and the environment is
+		interpolated from the readers of this simulation once per time step
+		for the elements of all members, instead of once per member.
+		Fallback values, uncertainties (e.g. drift:wind_uncertainty) and
+		parameterisations are thereafter applied per member, according to
+		the configuration of each member. Reader related settings
+		(e.g. drift:truncate_ocean_model_below_m) are taken from this
+		simulation.
+
+		Arguments:
+			members: list of ensemble members, each given as either
+				- a dict with config settings,
+				  e.g. {'drift:wind_uncertainty': 2}, which are applied to
+				  a copy of this simulation, including seeded elements, or
+				- a simulation object of the same class, seeded and
+				  configured separately (e.g. with other seeding parameters
+				  or oil types). Any readers of the member are not used.
+			outfile: file to which the combined history of all members
+				is written.
+			Other arguments are as for run().
+
+		Returns:
+			list of the member simulations, each with its own history.
+			The combined history of all members is stored in self.history,
+			with elements (and IDs) ordered by member, and
+			self.ensemble_member containing the member index of each
+			element of the combined history.
+		"""
+		if len(members) == 0:
+			raise ValueError('No ensemble members given.')
+
+		self.timer_end('configuration')
+		self.timer_start('preparing main loop')
+		self.output_encoding = output_encoding
+
+		members = [m if isinstance(m, OpenDriftSimulation) else
+				   self._ensemble_member(m) for m in members]
+		for m in members:
+			if type(m) is not type(self):
+				raise ValueError('Ensemble members must be of class %s' %
+								 type(self).__name__)
+			if m.num_elements_scheduled() == 0:
+				raise ValueError('Please seed elements of all ensemble '
+								 'members before starting a run.')
+
+		# The combined element axis is used to prepare the readers
+		num_elements = [m.num_elements_scheduled() for m in members]
+		firsts = np.concatenate(([0], np.cumsum(num_elements)[:-1]))
+		self.elements_scheduled = self.ElementType()
+		for m in members:
+			self.elements_scheduled.extend(m.elements_scheduled)
+		self.elements_scheduled.ID = np.arange(1, sum(num_elements) + 1)
+		self.elements_scheduled_time = np.concatenate(
+			[m.elements_scheduled_time for m in members])
+		self.start_time = min(m.start_time for m in members)
+
+		logger.info('Running ensemble of %s members with %s elements' %
+					(len(members), sum(num_elements)))
+		self.set_fallback_values(refresh=True)
+		self._prepare_projection()
+		self._prepare_time_steps(time_step=time_step, steps=steps,
+								 time_step_output=time_step_output,
+								 duration=duration, end_time=end_time)
+		self._prepare_readers()
+
+		for m in members:
+			m.readers = self.readers
+			m.priority_list = self.priority_list
+			m.set_projection(self.proj4)
+			m._prepare_main_loop(time_step=time_step, steps=steps,
+								 time_step_output=time_step_output,
+								 duration=duration, end_time=end_time,
+								 outfile=None,
+								 export_variables=export_variables,
+								 export_buffer_length=None,
+								 prepare_readers=False)
+			m.add_metadata('simulation_time', datetime.now())
+
+		##########################
+		# Main loop
+		##########################
+		self.add_metadata('simulation_time', datetime.now())
+		self.timer_end('preparing main loop')
+		self.timer_start('main loop')
+		variables = list(self.required_variables)
+		running = list(members)
+		for i in range(max(m.expected_steps_calculation for m in members)):
+			# Group members by time, for which environment is needed
+			groups = OrderedDict()
+			for m in list(running):
+				if i >= m.expected_steps_calculation:
+					running.remove(m)
+					continue
+				try:
+					if m._start_step() is True:
+						groups.setdefault(m.time, []).append(m)
+				except Exception as e:
+					m._stop_main_loop(e, stop_on_error)
+					running.remove(m)
+
+			for time, group in groups.items():
+				self.time = time
+				self.timer_start('main loop:readers')
+				env, env_profiles = self.get_environment_from_readers(
+					variables, time,
+					np.concatenate([m.elements.lon for m in group]),
+					np.concatenate([m.elements.lat for m in group]),
+					np.concatenate([m.elements.z for m in group]),
+					self.required_profiles,
+					np.concatenate([m.elements.ID + firsts[members.index(m)]
+									for m in group]))
+				self.timer_end('main loop:readers')
+
+				offsets = np.cumsum([0] + [m.num_elements_active()
+										   for m in group])
+				for m, start, stop in zip(group, offsets[:-1], offsets[1:]):
+					try:
+						if env_profiles is None:
+							profiles = None
+						else:
+							profiles = {var: p if var == 'z' else
+										p[:, start:stop].copy()
+										for var, p in env_profiles.items()}
+						m.environment, m.environment_profiles, missing = \
+							m.postprocess_environment(
+								variables, m.required_profiles,
+								env[start:stop].copy(), profiles)
+						m._complete_step(missing)
+					except Exception as e:
+						m._stop_main_loop(e, stop_on_error)
+						running.remove(m)
+
+			if len(running) == 0:
+				break
+
+		self.timer_end('main loop')
+		for m in members:
+			m._finish_run(outfile=None, export_buffer_length=None)
+
+		self.timer_start('cleaning up')
+		self._merge_run_results(
+			[m._run_result(n) for m, n in zip(members, num_elements)],
+			firsts, sum(num_elements), outfile)
+		ensemble_member = np.repeat(np.arange(len(members)), num_elements)
+		if outfile is None and self.num_elements_scheduled() > 0:
+			# Unseeded elements are removed from history
+			ensemble_member = np.delete(ensemble_member,
+										self.elements_scheduled.ID - 1)
+		self.ensemble_member = ensemble_member
+		self.timer_end('cleaning up')
+		self.timer_end('total time')
+
+		return members
+
+	def _ensemble_member(self, config):
+		"""Return a copy of this simulation, with given config settings.
+
+		Readers are not copied, but shared with this simulation.
+		"""
+		readers = self.readers
+		self.readers = OrderedDict()
+		try:
+			member = copy.deepcopy(self)
+		finally:
+			self.readers = readers
+		member.readers = readers
+		for key, value in config.items():
+			member.set_config(key, value)
+		return member
+
+	def _run_partitioned(self, **run_kwargs):
+		"""Run simulation with scheduled elements split over several processes.
+
+		The scheduled elements are split into contiguous partitions, and each
+		partition is simulated by a forked copy of this object (including
+		readers) in a separate process. As elements do not interact, the
+		partitions are independent, and the histories are merged into one
+		history array (and output file) afterwards, with element IDs and
+		status categories as for a serial run. Random numbers are drawn
+		from per-partition seeds which are taken from the random state of
+		this object, so that results are reproducible for a fixed seed.
+		"""
+		import multiprocessing
+		global _partitioned_simulation
+
+		time_step = run_kwargs['time_step']
+		if time_step is None:
+			time_step = 60*self.get_config('general:time_step_minutes')
+		if type(time_step) is timedelta:
+			time_step = time_step.total_seconds()
+		if time_step < 0:
+			logger.warning('Partitioned run is not supported for backwards '
+						   'simulations, running in a single process')
+			self.set_config('general:num_processes', 1)
+			return self.run(**run_kwargs)
+
+		num_elements = self.num_elements_scheduled()
+		num_processes = min(self.get_config('general:num_processes'),
+							num_elements)
+		partitions = np.array_split(np.arange(num_elements), num_processes)
+		seeds = np.random.randint(0, 2**31 - 1, num_processes)
+		outfile = run_kwargs['outfile']
+		worker_kwargs = dict(run_kwargs, outfile=None,
+							 export_buffer_length=None)
+
+		logger.info('Running %s elements in %s partitions in parallel' %
+					(num_elements, num_processes))
+		self.timer_end('preparing main loop')
+		self.timer_start('main loop')
+		self._shared_block_pool = None
+		if self.get_config('general:shared_reader_blocks') is True:
+			from opendrift.readers.basereader import StructuredReader
+			from opendrift.readers.interpolation import SharedReaderBlockPool
+			self._shared_block_pool = SharedReaderBlockPool()
+			for reader in self.readers.values():
+				if isinstance(reader, StructuredReader):
+					reader.set_shared_block_pool(self._shared_block_pool)
+		_partitioned_simulation = self
+		try:
+			with multiprocessing.get_context('fork').Pool(
+					num_processes) as pool:
+				results = pool.map(_run_partition, [
+					(p[0], p[-1] + 1, seed, worker_kwargs)
+					for p, seed in zip(partitions, seeds)])
+		finally:
+			_partitioned_simulation = None
+			if self._shared_block_pool is not None:
+				self._shared_block_pool.close()
+				for reader in self.readers.values():
+					if getattr(reader, 'shared_block_pool', None) is \
+							self._shared_block_pool:
+						reader.set_shared_block_pool(None)
+				self._shared_block_pool = None
+		self.timer_end('main loop')
+		self.timer_start('cleaning up')
+		self._merge_run_results(results, [p[0] for p in partitions],
+								num_elements, outfile)
+		self.timer_end('cleaning up')
+		self.timer_end('total time')
+
+	def _run_result(self, num_elements):
+		"""Return history and final state of a finished run, for merging.
+
+		num_elements is the number of elements scheduled before the run,
+		i.e. the number of rows of the history array before unseeded
+		elements were removed.
+		"""
+		result = {a: getattr(self, a) for a in [
+			'history', 'elements', 'elements_deactivated', 'elements_scheduled',
+			'elements_scheduled_time', 'status_categories', 'time', 'time_step',
+			'time_step_output', 'start_time', 'expected_steps_output',
+			'expected_steps_calculation', 'expected_end_time',
+			'steps_calculation', 'steps_output', 'history_metadata',
+			'export_variables', 'validity_domain', 'metadata_dict']}
+		# Rows of history, as unseeded elements are removed after run
+		result['rows'] = np.setdiff1d(np.arange(num_elements),
+									  self.elements_scheduled.ID - 1)
+		result['environment'] = getattr(self, 'environment', None)
+		result['messages'] = getattr(self, 'messages', [])
+		result['timing'] = dict(self.timing)
+		return result
+
+	def _merge_run_results(self, results, firsts, num_elements, outfile):
+		"""Merge results of independent runs into one history and element set.
+
+		The elements of results[i] (as returned by _run_result) are placed
+		from row firsts[i] of the merged element axis, and IDs are shifted
+		accordingly. The history of each run is placed from the output
+		step of its start time, and the merged history covers the union
+		of the output times of all runs, which must thus have the same
+		output time step, and start times differing by whole output steps.
+		The given results are not modified.
+		"""
+		# Status categories may have been added in different order
+		for r in results:
+			for category in r['status_categories']:
+				if category not in self.status_categories:
+					self.status_categories.append(category)
+
+		# Output step (column of history) of the start time of each run
+		start_time = min(r['start_time'] for r in results)
+		time_step_output = results[0]['time_step_output']
+		offsets = []
+		for r in results:
+			if r['time_step_output'] != time_step_output:
+				raise ValueError('Runs to be merged have different output '
+								 'time steps: %s and %s' %
+								 (time_step_output, r['time_step_output']))
+			offset, remainder = divmod(r['start_time'] - start_time,
+									   time_step_output)
+			if remainder != timedelta(0):
+				raise ValueError('Start time %s of run is not a whole number '
+								 'of output time steps after %s' %
+								 (r['start_time'], start_time))
+			offsets.append(offset)
+
+		# Attributes which are equal for all runs, or taken from the run
+		# ending last, with numbers of steps counted from start_time
+		last = max(zip(offsets, results),
+				   key=lambda o_r: o_r[0] + o_r[1]['steps_output'])[1]
+		for attr in ['time', 'time_step', 'time_step_output',
+					 'expected_end_time', 'history_metadata',
+					 'export_variables', 'validity_domain']:
+			setattr(self, attr, last[attr])
+		self.start_time = start_time
+		for attr, step in [('steps_output', 'time_step_output'),
+						   ('expected_steps_output', 'time_step_output'),
+						   ('steps_calculation', 'time_step'),
+						   ('expected_steps_calculation', 'time_step')]:
+			setattr(self, attr, max(
+				r[attr] + int((r['start_time'] - start_time) / r[step])
+				for r in results))
+		for key, value in last['metadata_dict'].items():
+			self.add_metadata(key, value)
+		for r in results:
+			for message in r['messages']:
+				self.store_message(message)
+			for category, duration in r['timing'].items():
+				if category not in self.timing or \
+						self.timing[category] < duration:
+					self.timing[category] = duration
+
+		# Merging elements and history, with shifted IDs
+		self.history = np.ma.array(
+			np.zeros((num_elements, self.steps_output)),
+			dtype=last['history'].dtype)
+		self.history.mask = True
+		self.elements = self.ElementType()
+		self.elements_deactivated = self.ElementType()
+		elements_scheduled = self.ElementType()
+		elements_scheduled_time = []
+		environment = []
+		for first, offset, r in zip(firsts, offsets, results):
+			status_map = np.array([self.status_categories.index(c)
+								   for c in r['status_categories']])
+			history = r['history'].copy()
+			history['status'] = np.ma.array(
+				status_map[history['status'].data],
+				mask=np.ma.getmaskarray(history['status']))
+			history['ID'] = history['ID'] + first
+			self.history[first + r['rows'],
+						 offset:offset + history.shape[1]] = history
+			for e, merged in [('elements', self.elements),
+							  ('elements_deactivated',
+							   self.elements_deactivated),
+							  ('elements_scheduled', elements_scheduled)]:
+				elements = self.ElementType()
+				elements.extend(r[e])
+				elements.ID = elements.ID + first
+				if e != 'elements_scheduled':
+					elements.status = status_map[
+						np.atleast_1d(elements.status).astype(int)]
+				merged.extend(elements)
+			elements_scheduled_time.extend(r['elements_scheduled_time'])
+			if r['environment'] is not None:
+				environment.append(r['environment'])
+		self.elements_scheduled = elements_scheduled
+		self.elements_scheduled_time = np.array(elements_scheduled_time)
+		if len(environment) > 0:
+			self.environment = np.concatenate(environment).view(np.recarray)
+
+		if outfile is not None:
+			logger.debug('Writing merged runs to file: %s' % outfile)
+			self.export_buffer_length = self.steps_output
+			self.steps_exported = 0
+			self.io_init(outfile)
+			self.io_write_buffer()
+			self.io_close()
+			# History is reset when written, and is reimported from file
+			if hasattr(self, 'environment'):
+				del self.environment
+			self.io_import_file(outfile)
+		elif self.num_elements_scheduled() > 0:
+			logger.info('Removing %i unseeded elements from history array' %
+						self.num_elements_scheduled())
+			mask = np.ones(self.history.shape[0], dtype=bool)
+			mask[self.elements_scheduled.ID-1] = False
+			self.history = self.history[mask, :]
+
 	def increase_age_and_retire(self):
 		"""Increase age of elements, and retire if older than config setting."""
 		# Increase age of elements
@@ -2654,12 +3275,19 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
 			self.history[var][ID_ind, time_ind] = \
 				getattr(self.elements, var)[element_ind]
 		# Copy environment data to history array
-		for i, var in enumerate(self.environment.dtype.names):
+		if not hasattr(self, 'environment'):
+			# No environment is retrieved before first element is active
+			environment_variables = []
+		else:
+			environment_variables = self.environment.dtype.names
+		for i, var in enumerate(environment_variables):
 			if self.export_variables is not None and \
 					var not in self.export_variables:
 				continue
 			self.history[var][ID_ind, time_ind] = \
 				getattr(self.environment, var)[element_ind]
+		if isinstance(self.history, HistoryBuffer):
+			self.history.set_valid(ID_ind, time_ind)
 
 		# Call writer if buffer is full
 		if (self.outfile is not None) and \
@@ -4534,3 +5162,48 @@ class OpenDriftSimulation(PhysicsMethods, Timeable):
 		#del self.elements
 		self.elements_deactivated = self.ElementType()  # Empty array
 		self.elements = self.ElementType()  # Empty array
+
+
+# Simulation object which is inherited by forked processes of partitioned runs
+_partitioned_simulation = None
+
+def _run_partition(args):
+	"""Run the scheduled elements first:last of the partitioned simulation.
+
+	Called in a forked worker process, thus modifying the inherited copy
+	of the simulation object. Returns the history and final state of the
+	partition, to be merged by OpenDriftSimulation._run_partitioned.
+	"""
+	first, last, seed, run_kwargs = args
+	o = _partitioned_simulation
+	o.set_config('general:num_processes', 1)
+	np.random.seed(seed)
+
+	# Files opened before forking share the file offset with the other
+	# workers, and are thus closed, to be reopened by each worker when
+	# read (by xarray, or by the file catalog of the reader)
+	import xarray as xr
+	for reader in o.readers.values():
+		if isinstance(getattr(reader, 'Dataset', None), xr.Dataset):
+			reader.Dataset.close()
+		if getattr(reader, 'catalog', None) is not None:
+			reader.catalog.close()
+
+	indices = np.zeros(o.num_elements_scheduled(), dtype=bool)
+	indices[first:last] = True
+	elements_scheduled = o.ElementType()
+	o.elements_scheduled.move_elements(elements_scheduled, indices)
+	elements_scheduled.ID = np.arange(1, last - first + 1)
+	o.elements_scheduled = elements_scheduled
+	o.elements_scheduled_time = o.elements_scheduled_time[first:last]
+
+	try:
+		o.run(**run_kwargs)
+	except SystemExit as e:
+		# Exiting would leave the worker pool waiting for this partition
+		raise RuntimeError(str(e))
+	finally:
+		if o._shared_block_pool is not None:
+			o._shared_block_pool.release_all()
+
+	return o._run_result(last - first)
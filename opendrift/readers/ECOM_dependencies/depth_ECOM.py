@@ -8,6 +8,8 @@
   Slice a 3D field in s-coordinates to fixed depth
 :func:`multi_zslice`
   Slice a 3D field to several depth levels
+:func:`nearest_level`
+  Index of nearest z-level of depths
 :func:`z_average`
   Vertical average of a 3D field
 :func:`s_stretch`
@@ -93,6 +95,30 @@ def sdepth_w(H, Hc, cs_w):
 	return sdepth(H, Hc, cs_w, stagger='w')
 
 
+def nearest_level(zlevels, z):
+	"""Index of the level nearest to each depth
+
+	*zlevels* : 1D array of z-levels, in any monotonic order
+	*z* : scalar or array of depths
+
+	Vectorised equivalent of ``np.abs(zlevels - value).argmin()``
+	for each value of *z*, using a binary search of the levels.
+	On ties the lowest index is returned, as with argmin.
+
+	"""
+	zlevels = np.asarray(zlevels)
+	z = np.atleast_1d(z)
+	if len(zlevels) == 1:
+		return np.zeros(z.shape, dtype=int)
+	order = np.argsort(zlevels, kind='stable')
+	i = np.clip(np.searchsorted(zlevels[order], z), 1, len(zlevels) - 1)
+	lower, upper = order[i - 1], order[i]
+	dlower = np.abs(z - zlevels[lower])
+	dupper = np.abs(z - zlevels[upper])
+	use_lower = (dlower < dupper) | ((dlower == dupper) & (lower < upper))
+	return np.where(use_lower, lower, upper)
+
+
 def multi_zslice(F, S, Z):
 
 	"""Slice a 3D ECOM field to fixed depth
@@ -15,6 +15,7 @@
 # Copyright 2015, Knut-Frode Dagestad, MET Norway
 # Copyright 2020, Gaute Hope, MET Norway
 
+import os
 import sys
 import logging
 logger = logging.getLogger(__name__)
@@ -29,6 +30,8 @@ from .unstructured import UnstructuredReader
 from .continuous import ContinuousReader
 from .variables import Variables
 from .consts import *
+from .metadata_cache import metadata_cache_file, load_metadata, \
+    store_metadata
 
 from opendrift.readers.interpolation import ReaderBlock
 
@@ -49,6 +52,13 @@ class BaseReader(Variables):
 
     verticalbuffer = 1  # To be overridden by application as needed
 
+    # Directory where readers store metadata derived from files (coordinates,
+    # times, masks, etc.) for reuse by later readers of the same files,
+    # see `_load_metadata_cache_`. Disabled if None.
+    metadata_cache_dir = None
+    __metadata_cache_file__ = None
+    __metadata_pending__ = frozenset()
+
     # Mapping variable names, e.g. from east-north to x-y, temporarily
     # presuming coordinate system then is lon-lat for equivalence
     variable_aliases = {
@@ -160,6 +170,60 @@ class BaseReader(Variables):
                     self.variables.append(v)
                     self.derived_variables[v] = em['input']
 
+    def _load_metadata_cache_(self, files, *args):
+        """Set attributes from metadata cache of given files, if enabled.
+
+        The cache is keyed by path, modification time and size of the files,
+        the reader class and any other arguments affecting the metadata.
+        Returns True if metadata was found, otherwise False, in which case
+        the reader derives the metadata from the files and stores it with
+        `_store_metadata_cache_` and `_write_metadata_cache_`.
+        """
+        if self.metadata_cache_dir is None:
+            return False
+        self.__metadata_cache_file__ = metadata_cache_file(
+            os.path.expanduser(self.metadata_cache_dir), files,
+            type(self).__module__, type(self).__name__, *args)
+        attributes = load_metadata(self.__metadata_cache_file__)
+        if attributes is None:
+            return False
+        logger.info('Using cached metadata: %s' % self.__metadata_cache_file__)
+        for name, value in attributes.items():
+            setattr(self, name, value)
+        return True
+
+    def _store_metadata_cache_(self, *names):
+        """Add given attributes to metadata cache, if enabled.
+
+        May also be called for metadata derived later (e.g. masks read at
+        first request), which is then available to later readers. The
+        attributes are written to the cache file by `_write_metadata_cache_`,
+        at once for all attributes added since the previous write.
+        """
+        if self.__metadata_cache_file__ is None:
+            return
+        self.__metadata_pending__ = self.__metadata_pending__.union(names)
+
+    def _write_metadata_cache_(self):
+        """Write attributes added with `_store_metadata_cache_` to cache file.
+
+        Called by readers at the end of the constructor and of
+        `get_variables`, so that the file is rewritten once for all
+        attributes derived there.
+        """
+        if self.__metadata_cache_file__ is None or \
+                len(self.__metadata_pending__) == 0:
+            return
+        attributes = load_metadata(self.__metadata_cache_file__) or {}
+        for name in self.__metadata_pending__:
+            if name in self.__dict__:
+                value = self.__dict__[name]
+                if hasattr(value, 'load'):
+                    value.load()  # Xarray, storing values, not file reference
+                attributes[name] = value
+        self.__metadata_pending__ = frozenset()
+        store_metadata(self.__metadata_cache_file__, attributes)
+
     def y_is_north(self):
         if self.proj.crs.is_geographic or '+proj=merc' in self.proj.srs:
             return True
@@ -211,6 +275,25 @@ class BaseReader(Variables):
             for cat, time in self.timing.items():
                 time = str(time)[0:str(time).find('.') + 2]
                 outStr += '%10s  %s\n' % (time, cat)
+        block_cache = getattr(self, 'block_cache', None)
+        if block_cache is not None:
+            outStr += '%10s  block cache hits, %i misses (%.1f MB)\n' % (
+                block_cache.hits, block_cache.misses, block_cache.nbytes / 1e6)
+        tile_cache = getattr(self, 'tile_cache', None)
+        if tile_cache is not None:
+            outStr += '%10s  tile cache hits, %i misses (%.1f MB)\n' % (
+                tile_cache.hits, tile_cache.misses, tile_cache.nbytes / 1e6)
+        catalog = getattr(self, 'catalog', None)
+        if catalog is not None:
+            outStr += '%10s  files opened, of %i in catalog\n' % (
+                catalog.opened, len(catalog.files))
+        locator = getattr(self, 'locator', None)
+        if locator is not None:
+            outStr += '%10s  mesh walking steps, %i positions looked up\n' % (
+                locator.steps, locator.lost)
+        if getattr(self, 'prefetch', False) is True:
+            outStr += '%10s  prefetch hits, %i misses\n' % (
+                self.prefetch_hits, self.prefetch_misses)
         return outStr
 
     def clip_boundary_pixels(self, numpix):
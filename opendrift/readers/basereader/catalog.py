@@ -0,0 +1,164 @@
+import os
+import glob
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from netCDF4 import Dataset, num2date
+
+import logging
+logger = logging.getLogger(__name__)
+
+from opendrift.locks import netcdf_locked
+
+
+class FileCatalog:
+    """Index of the time steps of a set of files, opened only when needed.
+
+    Alternative to opening all files matching a pattern as one dataset
+    (e.g. with `xarray.open_mfdataset`), for readers of long archives of
+    which a simulation needs only a few files. The time variable of each
+    file is scanned once, and the times of all files are concatenated (in
+    order of filename) as if the files were one dataset. Files are opened
+    (with `open_dataset`) when data for one of their time steps is requested,
+    and the most recently used files are kept open. The file last located
+    by each thread is not closed, as it may still be read by that thread
+    (e.g. while prefetching), so that more than `max_open` files may be
+    open when several threads read.
+
+    Arguments:
+        pattern: file pattern (glob).
+        open_dataset: function returning dataset of a file.
+        cache_dir: optional directory where the times of the files are
+            stored, and reused for files with same path, modification time
+            and size, so that only new or modified files are scanned.
+        max_open: number of files kept open.
+        time_names: names of time variable, if not identified by
+            standard_name or axis.
+        decode_times: optional function decode_times(values, units)
+            returning datetimes of time values, as decoded by the reader.
+            Default is num2date.
+    """
+
+    def __init__(self, pattern, open_dataset, cache_dir=None, max_open=4,
+                 time_names=('time', 'vtime', 'ocean_time'),
+                 decode_times=None):
+        self.pattern = str(pattern)
+        self.open_dataset = open_dataset
+        self.decode_times = decode_times or num2date
+        self.max_open = max_open
+        self.time_names = time_names
+        self.files = sorted(glob.glob(self.pattern))
+        if len(self.files) == 0:
+            raise ValueError('No files matching %s' % self.pattern)
+        self.datasets = OrderedDict()  # filename -> dataset, LRU order
+        self.located = {}  # thread id -> filename last located by thread
+        self.lock = threading.Lock()
+        self.opened = 0
+
+        cachefile = None
+        entries = {}
+        if cache_dir is not None:
+            cache_dir = os.path.expanduser(cache_dir)
+            cachefile = os.path.join(cache_dir, 'catalog_%s.pickle' %
+                                     hashlib.md5(os.path.abspath(
+                                         self.pattern).encode()).hexdigest())
+            if os.path.exists(cachefile):
+                try:
+                    with open(cachefile, 'rb') as f:
+                        entries = pickle.load(f)
+                except Exception as e:
+                    logger.warning('Could not read catalog %s: %s' %
+                                   (cachefile, e))
+
+        times = []
+        scanned = 0
+        for filename in self.files:
+            stat = os.stat(filename)
+            signature = (stat.st_mtime_ns, stat.st_size)
+            entry = entries.get(filename)
+            if entry is None or entry[0] != signature:
+                entry = (signature, self.scan_times(filename))
+                entries[filename] = entry
+                scanned += 1
+            times.append(entry[1])
+        logger.info('Catalog of %i files (%i scanned)' %
+                    (len(self.files), scanned))
+
+        self.file_index = np.concatenate(
+            [np.full(len(t), i) for i, t in enumerate(times)])
+        self.time_index = np.concatenate([np.arange(len(t)) for t in times])
+        self.times = np.concatenate(times)
+
+        if cachefile is not None and scanned > 0:
+            entries = {f: entries[f] for f in self.files}
+            tmpfile = cachefile + '.tmp%i' % os.getpid()
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                with open(tmpfile, 'wb') as f:
+                    pickle.dump(entries, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmpfile, cachefile)
+            except OSError as e:
+                logger.warning('Could not store catalog %s: %s' %
+                               (cachefile, e))
+
+    def scan_times(self, filename):
+        """Return array of times of given file."""
+        with netcdf_locked(), Dataset(filename) as d:
+            for name, var in d.variables.items():
+                if getattr(var, 'standard_name', '') == 'time' or \
+                        getattr(var, 'axis', '') == 'T' or \
+                        name in self.time_names:
+                    return np.atleast_1d(self.decode_times(
+                        np.ma.getdata(var[:]), var.units))
+        raise ValueError('No time variable found in %s' % filename)
+
+    def _open_(self, filename):
+        if filename in self.datasets:
+            self.datasets.move_to_end(filename)
+            return self.datasets[filename]
+        logger.debug('Opening %s' % filename)
+        dataset = self.open_dataset(filename)
+        self.opened += 1
+        self.datasets[filename] = dataset
+        return dataset
+
+    def _close_least_recently_used_(self):
+        """Close files beyond max_open, except those which may be in use."""
+        alive = set(t.ident for t in threading.enumerate())
+        self.located = {t: f for t, f in self.located.items() if t in alive}
+        in_use = set(self.located.values())
+        for filename in [f for f in self.datasets if f not in in_use]:
+            if len(self.datasets) <= self.max_open:
+                break
+            logger.debug('Closing %s' % filename)
+            self.datasets.pop(filename).close()
+
+    def dataset(self, filename):
+        """Return (open) dataset of given file."""
+        with self.lock:
+            dataset = self._open_(filename)
+            self._close_least_recently_used_()
+            return dataset
+
+    def locate(self, indxTime):
+        """Return dataset and its time index of given time index of catalog.
+
+        The dataset is kept open until the calling thread locates another
+        time step, or the catalog is closed.
+        """
+        filename = self.files[self.file_index[indxTime]]
+        with self.lock:
+            self.located[threading.get_ident()] = filename
+            dataset = self._open_(filename)
+            self._close_least_recently_used_()
+        return dataset, int(self.time_index[indxTime])
+
+    def close(self):
+        with self.lock:
+            for dataset in self.datasets.values():
+                dataset.close()
+            self.datasets.clear()
+            self.located.clear()
@@ -30,7 +30,7 @@ class ContinuousReader(Variables):
 
     def _get_variables_interpolated_(self, variables, profiles,
                                    profiles_depth, time,
-                                   reader_x, reader_y, z):
+                                   reader_x, reader_y, z, ids=None):
 
         env = self.get_variables(variables, time, reader_x, reader_y, z)
 
@@ -0,0 +1,148 @@
+import os
+import pickle
+import hashlib
+import numpy as np
+from scipy.spatial import cKDTree
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class CurvilinearGridIndex:
+    """Inverse mapping (lon, lat) -> (x, y) of a curvilinear grid.
+
+    Used by readers without projection (:class:`.fakeproj.fakeproj`), where
+    x and y are the column and row indices of the lon/lat arrays. The
+    centres of the grid cells are indexed in a KD-tree (as unit vectors,
+    so that the dateline and poles need no special treatment), and each
+    position is located by inverting the bilinear mapping of the corners
+    of the nearest cells, with a few Newton iterations. The result is thus
+    the exact inverse of the bilinear interpolation of lon/lat in
+    `StructuredReader.xy2lonlat`, and is NaN outside the grid cells.
+
+    Arguments:
+        lon, lat: 2D arrays of the grid coordinates.
+        cache_dir: optional directory where the KD-tree is stored, with a
+            key from the grid coordinates, and reused for the same grid.
+        candidates: number of nearest cells tested for each position.
+    """
+
+    tolerance = 1e-6  # Of cell coordinates to accept a position in cell
+    iterations = 6  # Newton iterations
+
+    def __init__(self, lon, lat, cache_dir=None, candidates=4):
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.candidates = candidates
+        ny, nx = self.lon.shape
+        self.shape = (ny - 1, nx - 1)  # Cells
+
+        filename = None
+        if cache_dir is not None:
+            cache_dir = os.path.expanduser(cache_dir)
+            key = hashlib.md5()
+            key.update(np.array(self.lon.shape).tobytes())
+            key.update(self.lon.tobytes())
+            key.update(self.lat.tobytes())
+            filename = os.path.join(cache_dir,
+                                    'gridindex_%s.pickle' % key.hexdigest())
+            if os.path.exists(filename):
+                logger.debug('Reading grid index from %s' % filename)
+                with open(filename, 'rb') as f:
+                    self.cells, self.tree = pickle.load(f)
+                return
+
+        # Cells with all corners defined, with centre as mean of corners,
+        # projected onto the unit sphere as the positions queried
+        corners = np.stack(self._unit_vectors(self.lon, self.lat), axis=-1)
+        centres = (corners[:-1, :-1] + corners[1:, :-1] +
+                   corners[:-1, 1:] + corners[1:, 1:]).reshape(-1, 3)
+        with np.errstate(invalid='ignore'):
+            centres /= np.linalg.norm(centres, axis=1)[:, np.newaxis]
+        valid = np.isfinite(centres).all(axis=1)
+        self.cells = np.flatnonzero(valid)
+        self.tree = cKDTree(centres[valid])
+
+        if filename is not None:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                with open(filename + '.tmp%i' % os.getpid(), 'wb') as f:
+                    pickle.dump((self.cells, self.tree), f,
+                                protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(filename + '.tmp%i' % os.getpid(), filename)
+                logger.debug('Stored grid index in %s' % filename)
+            except OSError as e:
+                logger.warning('Could not store grid index: %s' % e)
+
+    @staticmethod
+    def _unit_vectors(lon, lat):
+        lon = np.radians(lon)
+        lat = np.radians(lat)
+        return (np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon),
+                np.sin(lat))
+
+    def _invert(self, cell, lon, lat):
+        """Bilinear cell coordinates (s, t) of positions in given cells."""
+        j, i = np.unravel_index(cell, self.shape)
+        lon00 = self.lon[j, i]
+        lat00 = self.lat[j, i]
+        coslat = np.cos(np.radians(lat00))
+
+        def local(lo, la):
+            # Planar coordinates (degrees) relative to lower left corner
+            return ((lo - lon00 + 180.) % 360. - 180.) * coslat, la - lat00
+
+        px, py = local(lon, lat)
+        ax, ay = local(self.lon[j, i + 1], self.lat[j, i + 1])
+        bx, by = local(self.lon[j + 1, i], self.lat[j + 1, i])
+        cx, cy = local(self.lon[j + 1, i + 1], self.lat[j + 1, i + 1])
+        cx, cy = cx - ax - bx, cy - ay - by
+
+        s = np.full(len(cell), .5)
+        t = np.full(len(cell), .5)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for _ in range(self.iterations):
+                fx = s * ax + t * bx + s * t * cx - px
+                fy = s * ay + t * by + s * t * cy - py
+                j11, j12 = ax + t * cx, bx + s * cx
+                j21, j22 = ay + t * cy, by + s * cy
+                det = j11 * j22 - j12 * j21
+                s = s - (j22 * fx - j12 * fy) / det
+                t = t - (j11 * fy - j21 * fx) / det
+        return s, t
+
+    def __call__(self, lon, lat):
+        """Return x and y (column and row indices) of positions."""
+        lon = np.atleast_1d(np.asarray(lon, dtype=np.float64))
+        lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        lon, lat = np.broadcast_arrays(lon, lat)
+        shape = lon.shape
+        lon, lat = lon.ravel(), lat.ravel()
+        x = np.full(lon.shape, np.nan)
+        y = np.full(lon.shape, np.nan)
+
+        finite = np.flatnonzero(np.isfinite(lon) & np.isfinite(lat))
+        k = min(self.candidates, len(self.cells))
+        if len(finite) == 0 or k == 0:
+            return x.reshape(shape), y.reshape(shape)
+        _, nearest = self.tree.query(
+            np.stack(self._unit_vectors(lon[finite], lat[finite]), axis=-1),
+            k=k)
+        nearest = nearest.reshape(len(finite), k)
+
+        # Testing candidate cells in order of distance, until found
+        remaining = np.arange(len(finite))
+        for c in range(k):
+            ind = finite[remaining]
+            cell = self.cells[nearest[remaining, c]]
+            s, t = self._invert(cell, lon[ind], lat[ind])
+            inside = ((s >= -self.tolerance) & (s <= 1 + self.tolerance) &
+                      (t >= -self.tolerance) & (t <= 1 + self.tolerance))
+            j, i = np.unravel_index(cell[inside], self.shape)
+            x[ind[inside]] = i + np.clip(s[inside], 0, 1)
+            y[ind[inside]] = j + np.clip(t[inside], 0, 1)
+            remaining = remaining[~inside]
+            if len(remaining) == 0:
+                break
+
+        return x.reshape(shape), y.reshape(shape)
@@ -0,0 +1,208 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class MeshLocator:
+    """Location of positions in the triangles of an unstructured mesh.
+
+    Positions are located by walking from a first guess of the containing
+    triangle (e.g. the triangle of the previous time step) to the neighbour
+    across the edge opposite to the most negative barycentric coordinate
+    (among edges not at the boundary), until the triangle containing the
+    position is found. Positions which are not found within `max_steps`,
+    or which walk out through the boundary, are looked up from the
+    triangles with nearest centroids (in a KD-tree), and walked again from
+    there. Walks stopped by holes or concave boundaries are completed by
+    testing all triangles near the position. Positions not found are
+    outside the mesh, so that this is an exact test of the mesh coverage
+    (including concave boundaries and holes).
+
+    Arguments:
+        x, y: arrays of node coordinates.
+        triangles: array [E x 3] of nodes of each triangle.
+        neighbours: optional array [E x 3] of neighbouring triangles (e.g.
+            `nbe` of FVCOM, 0-based), negative at the boundary, in any order.
+            Derived from the triangles if not given.
+        tree: optional cKDTree of triangle centroids.
+    """
+
+    max_steps = 8  # Steps of walk before falling back to KD-tree
+    candidates = 4  # Nearest centroids from which to walk
+    eps = 1e-9  # Tolerance of barycentric coordinates
+
+    def __init__(self, x, y, triangles, neighbours=None, tree=None):
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        self.triangles = np.asarray(triangles)
+        if neighbours is None:
+            self.neighbours = self._neighbours_(self.triangles)
+        else:
+            self.neighbours = self._opposite_(self.triangles,
+                                              np.asarray(neighbours))
+        centroids = np.vstack((self.x[self.triangles].mean(axis=1),
+                               self.y[self.triangles].mean(axis=1))).T
+        if tree is None:
+            tree = cKDTree(centroids)
+        self.tree = tree
+
+        # Triangles containing a position have centroids within their
+        # radius (largest distance from centroid to a node) of it. The few
+        # triangles with much larger radius than typical are tested
+        # separately, so that a small search radius can be used for others.
+        self.radius = np.hypot(
+            self.x[self.triangles] - centroids[:, 0:1],
+            self.y[self.triangles] - centroids[:, 1:2]).max(axis=1)
+        self.large = np.flatnonzero(self.radius > 3*np.median(self.radius))
+        small = np.setdiff1d(np.arange(len(self.triangles)), self.large)
+        self.small_radius = self.radius[small].max(initial=0)
+        self.bounds = (self.x.min(), self.x.max(), self.y.min(), self.y.max())
+        self.steps = 0  # Number of walking steps, for diagnostics
+        self.lost = 0  # Number of positions looked up in KD-tree
+
+    @staticmethod
+    def _neighbours_(triangles):
+        """Neighbour opposite to each node of each triangle, -1 at boundary."""
+        ntri = len(triangles)
+        neighbours = np.full((ntri, 3), -1)
+        # Edge opposite to node k is (k+1, k+2)
+        edges = np.concatenate([np.sort(triangles[:, [(k + 1) % 3,
+                                                       (k + 2) % 3]], axis=1)
+                                for k in range(3)])
+        owner = np.tile(np.arange(ntri), 3)
+        slot = np.repeat(np.arange(3), ntri)
+        order = np.lexsort((edges[:, 1], edges[:, 0]))
+        edges, owner, slot = edges[order], owner[order], slot[order]
+        shared = np.flatnonzero((edges[1:] == edges[:-1]).all(axis=1))
+        neighbours[owner[shared], slot[shared]] = owner[shared + 1]
+        neighbours[owner[shared + 1], slot[shared + 1]] = owner[shared]
+        return neighbours
+
+    @staticmethod
+    def _opposite_(triangles, neighbours):
+        """Order given neighbours so that column k is opposite to node k."""
+        ordered = np.full((len(triangles), 3), -1)
+        for s in range(neighbours.shape[1]):
+            nb = neighbours[:, s]
+            valid = np.flatnonzero(nb >= 0)
+            for k in range(3):
+                # Node k is not shared with the neighbour opposite to it
+                node = triangles[valid, k][:, np.newaxis]
+                opposite = ~(triangles[nb[valid]] == node).any(axis=1)
+                ordered[valid[opposite], k] = nb[valid[opposite]]
+        return ordered
+
+    def barycentric(self, faces, x, y):
+        """Barycentric coordinates [3 x N] of positions in given triangles."""
+        tri = self.triangles[faces]
+        x1, x2, x3 = (self.x[tri[:, i]] for i in range(3))
+        y1, y2, y3 = (self.y[tri[:, i]] for i in range(3))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            det = (y2 - y3) * (x1 - x3) + (x3 - x2) * (y1 - y3)
+            l1 = ((y2 - y3) * (x - x3) + (x3 - x2) * (y - y3)) / det
+            l2 = ((y3 - y1) * (x - x3) + (x1 - x3) * (y - y3)) / det
+        return np.array([l1, l2, 1 - l1 - l2])
+
+    def _walk_(self, start, x, y, faces, weights, remaining):
+        """Walk positions `remaining` from triangles `start`.
+
+        Found triangles and weights are stored in `faces` and `weights`.
+        Positions walking out through the boundary, or not found within
+        `max_steps`, are left at -1.
+        """
+        current = start
+        for _ in range(self.max_steps + 1):
+            if len(remaining) == 0:
+                break
+            w = self.barycentric(current, x[remaining], y[remaining])
+            inside = (w >= -self.eps).all(axis=0)
+            faces[remaining[inside]] = current[inside]
+            weights[:, remaining[inside]] = w[:, inside]
+            remaining = remaining[~inside]
+            current = current[~inside]
+            w = w[:, ~inside]
+            # Crossing the edge opposite to most negative coordinate,
+            # among the edges which are not at the boundary
+            nb = self.neighbours[current].T
+            w = np.where((nb >= 0) & (w < -self.eps), w, np.inf)
+            edge = np.argmin(w, axis=0)
+            nxt = nb[edge, np.arange(len(edge))]
+            moving = np.isfinite(w[edge, np.arange(len(edge))])
+            remaining, current = remaining[moving], nxt[moving]
+            self.steps += len(remaining)
+
+    def locate(self, x, y, guess=None):
+        """Return triangle containing each position (-1 if outside mesh),
+        and barycentric coordinates [3 x N] of positions in the triangles.
+
+        Arguments:
+            x, y: arrays of positions.
+            guess: optional array of first guess of triangle of each
+                position (e.g. from previous call), negative if unknown.
+        """
+        x = np.atleast_1d(x).astype(np.float64)
+        y = np.atleast_1d(y).astype(np.float64)
+        faces = np.full(len(x), -1)
+        weights = np.zeros((3, len(x)))
+        finite = np.isfinite(x) & np.isfinite(y)
+
+        lost = np.flatnonzero(finite)
+        if guess is not None and len(guess) == len(x):
+            guess = np.asarray(guess)
+            known = lost[guess[lost] >= 0]
+            lost = np.setdiff1d(lost, known, assume_unique=True)
+            self._walk_(guess[known], x, y, faces, weights, known)
+            lost = np.union1d(lost, known[faces[known] < 0])
+
+        # Walking from nearest centroids
+        if len(lost) > 0:
+            self.lost += len(lost)
+            k = min(self.candidates, self.tree.n)
+            _, nearest = self.tree.query(np.vstack((x[lost], y[lost])).T,
+                                         k=k, workers=-1)
+            nearest = nearest.reshape(len(lost), k)
+            rows = np.arange(len(lost))
+            for c in range(k):
+                self._walk_(nearest[rows, c], x, y, faces, weights,
+                            lost[rows])
+                rows = rows[faces[lost[rows]] < 0]
+                if len(rows) == 0:
+                    break
+            # Walks may be stopped by holes or concave boundaries
+            self._search_(x, y, faces, weights, lost[rows])
+
+        return faces, weights
+
+    def _test_(self, candidates, points, x, y, faces, weights):
+        """Test pairs of candidate triangles and positions."""
+        w = self.barycentric(candidates, x[points], y[points])
+        inside = (w >= -self.eps).all(axis=0)
+        faces[points[inside]] = candidates[inside]
+        weights[:, points[inside]] = w[:, inside]
+
+    def _search_(self, x, y, faces, weights, lost):
+        """Test all triangles which may contain positions `lost`."""
+        b = self.bounds
+        lost = lost[(x[lost] >= b[0]) & (x[lost] <= b[1]) &
+                    (y[lost] >= b[2]) & (y[lost] <= b[3])]
+        if len(lost) == 0:
+            return
+        candidates = self.tree.query_ball_point(
+            np.vstack((x[lost], y[lost])).T, r=self.small_radius, workers=-1)
+        counts = np.array([len(c) for c in candidates])
+        if counts.sum() > 0:
+            self._test_(np.concatenate(candidates).astype(int),
+                        np.repeat(lost, counts), x, y, faces, weights)
+        lost = lost[faces[lost] < 0]
+        if len(lost) > 0 and len(self.large) > 0:
+            tx = self.x[self.triangles[self.large]]
+            ty = self.y[self.triangles[self.large]]
+            inbox = ((x[lost, np.newaxis] >= tx.min(axis=1)) &
+                     (x[lost, np.newaxis] <= tx.max(axis=1)) &
+                     (y[lost, np.newaxis] >= ty.min(axis=1)) &
+                     (y[lost, np.newaxis] <= ty.max(axis=1)))
+            points, candidates = np.nonzero(inbox)
+            self._test_(self.large[candidates], lost[points], x, y, faces,
+                        weights)
@@ -0,0 +1,66 @@
+import os
+import glob
+import pickle
+import hashlib
+
+from opendrift.version import __version__
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Version of the format of cache files, to be increased when changed
+metadata_format = 1
+
+
+def metadata_cache_file(cache_dir, files, *args):
+    """Name of file in cache_dir with metadata of reader of given files.
+
+    The key is made from the absolute path, modification time and size of
+    each file (patterns are expanded), and any other arguments affecting the
+    metadata (e.g. reader class). The key also includes the cache format and
+    the OpenDrift version, so that metadata derived by other versions of the
+    readers is not reused. Returns None for remote files (URLs) or files
+    which do not exist, which are not cached.
+    """
+    key = hashlib.md5(repr((metadata_format, __version__) + args).encode())
+    for pattern in files:
+        if pattern is None:
+            continue
+        pattern = str(pattern)
+        if '://' in pattern:
+            return None
+        filenames = sorted(glob.glob(pattern))
+        if len(filenames) == 0:
+            return None
+        for filename in filenames:
+            stat = os.stat(filename)
+            key.update(('%s %i %i' % (os.path.abspath(filename),
+                                      stat.st_mtime_ns,
+                                      stat.st_size)).encode())
+    return os.path.join(cache_dir, 'metadata_%s.pickle' % key.hexdigest())
+
+
+def load_metadata(filename):
+    """Return dictionary of attributes stored in file, or None."""
+    if filename is None or not os.path.exists(filename):
+        return None
+    try:
+        with open(filename, 'rb') as f:
+            return pickle.load(f)
+    except Exception as e:
+        logger.warning('Could not read metadata cache %s: %s' % (filename, e))
+        return None
+
+
+def store_metadata(filename, attributes):
+    """Store dictionary of attributes, replacing file atomically."""
+    tmpfile = filename + '.tmp%i' % os.getpid()
+    try:
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(tmpfile, 'wb') as f:
+            pickle.dump(attributes, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmpfile, filename)
+    except Exception as e:
+        logger.warning('Could not store metadata cache %s: %s' % (filename, e))
+        if os.path.exists(tmpfile):
+            os.remove(tmpfile)
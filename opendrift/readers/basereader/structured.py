@@ -1,9 +1,14 @@
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import pyproj
 from scipy.ndimage import map_coordinates
 from abc import abstractmethod
 
-from opendrift.readers.interpolation.structured import ReaderBlock
+from opendrift.readers.interpolation.structured import ReaderBlock, \
+    ClusteredReaderBlock, ReaderBlockCache, ReaderTileCache
+from opendrift.locks import netcdf_locked, reads_netcdf4
 from .variables import Variables
 
 import logging
@@ -35,12 +40,44 @@ class StructuredReader(Variables):
     var_block_before = None
     var_block_after = None
     interpolation = 'linearNDFast'
+    # Extrapolation of data towards land, 'dilation' or 'nearest'
+    # (see `opendrift.readers.interpolation.interpolators.extrapolate_missing`)
+    coast_extrapolation = 'dilation'
     convolve = None  # Convolution kernel or kernel size
 
+    # Files of a pattern opened only when needed, see `catalog.FileCatalog`
+    catalog = None
+
+    # Pool of blocks in shared memory, see `set_shared_block_pool`
+    shared_block_pool = None
+    shared_block_alignment = 32  # pixels
+
+    # Cache of recently used blocks, see `set_block_cache`
+    block_cache = None
+
+    # Separate blocks for clusters of elements, see `set_block_clustering`
+    cluster_cell_size = None
+
+    # Cache of tiles of the grid read from file, see `set_tile_cache`
+    tile_cache = None
+
+    # Reading of block for next time step in background, see `set_prefetch`
+    prefetch = False
+    __prefetch_pool__ = None
+    __prefetched__ = None  # (variables, time, future) of pending block
+    __prefetch_extent__ = None
+    __read_lock__ = None
+
     # Used to enable and track status of parallel coordinate transformations.
     __lonlat2xy_parallel__ = None
     __disable_parallel__ = False
 
+    # Inverse mapping of lon, lat for readers without projection, see
+    # `gridindex.CurvilinearGridIndex`, stored in this directory if not None
+    # (default is `BaseReader.metadata_cache_dir`)
+    grid_index = None
+    grid_index_cache_dir = None
+
     def __init__(self):
         if self.proj is None and (self.proj4 is None
                                   or self.proj4 == 'fakeproj'):
@@ -49,14 +86,13 @@ class StructuredReader(Variables):
                 "No proj string or projection could be derived, using 'fakeproj'. This assumes that the variables are structured and gridded approximately equidistantly on the surface (i.e. in meters). This must be guaranteed by the user. You can get rid of this warning by suppling a valid projection to the reader."
             )
 
-            from scipy.interpolate import LinearNDInterpolator
-            import copy
             from . import fakeproj
+            from .gridindex import CurvilinearGridIndex
 
             self.proj4 = 'None'
             self.proj = fakeproj.fakeproj()
             self.projected = False
-            logger.info('Making interpolator for lon,lat to x,y conversion...')
+            logger.info('Making grid index for lon,lat to x,y conversion...')
             self.xmin = self.ymin = 0.
             self.delta_x = self.delta_y = 1.
             self.xmax = self.lon.shape[1] - 1
@@ -64,21 +100,11 @@ class StructuredReader(Variables):
             self.numx = self.xmax
             self.numy = self.ymax
 
-            block_x, block_y = np.mgrid[self.xmin:self.xmax + 1,
-                                        self.ymin:self.ymax + 1]
-            block_x, block_y = block_x.T, block_y.T
-
-            # Making interpolator (lon, lat) -> x
-            self.spl_x = LinearNDInterpolator(
-                (self.lon.ravel(), self.lat.ravel()),
-                block_x.ravel(),
-                fill_value=np.nan)
-            # Reusing x-interpolator (deepcopy) with data for y
-            self.spl_y = copy.deepcopy(self.spl_x)
-            self.spl_y.values[:, 0] = block_y.ravel()
-            # Call interpolator to avoid threading-problem:
-            # https://github.com/scipy/scipy/issues/8856
-            self.spl_x((0, 0)), self.spl_y((0, 0))
+            cache_dir = self.grid_index_cache_dir
+            if cache_dir is None:
+                cache_dir = getattr(self, 'metadata_cache_dir', None)
+            self.grid_index = CurvilinearGridIndex(self.lon, self.lat,
+                                                   cache_dir=cache_dir)
         else:
             self.projected = True
 
@@ -116,6 +142,310 @@ class StructuredReader(Variables):
         """Set a convolution kernel or kernel size (of array of ones) used by `get_variables` on read variables."""
         self.convolve = convolve
 
+    def set_shared_block_pool(self, pool):
+        """
+        Store data blocks in a shared memory pool
+        (:class:`opendrift.readers.interpolation.structured.SharedReaderBlockPool`),
+        to be reused by other processes requesting the same blocks.
+
+        To make requests from different processes match, the block extents
+        are aligned to multiples of `shared_block_alignment` pixels from the
+        corner of the reader grid. A block is only shared by processes
+        whose elements give the same aligned extent, i.e. whose element
+        clouds span the same cells of this grid; otherwise each process
+        reads and stores its own block. Blocks are read with `_read_block_`
+        (using any tile cache), but not split into clusters of elements.
+        """
+        self.shared_block_pool = pool
+        self.__shared_keys__ = set()
+
+    def set_block_cache(self, max_mb):
+        """
+        Keep recently used data blocks in a cache
+        (:class:`opendrift.readers.interpolation.structured.ReaderBlockCache`)
+        of at most `max_mb` megabytes, in addition to the blocks before and
+        after present time. Blocks are reused when the same variables are
+        requested again for the same time, within the extent of the block.
+        `max_mb=0` disables the cache.
+
+        Cache hits and misses are included in `performance()`.
+        """
+        if max_mb > 0:
+            self.block_cache = ReaderBlockCache(max_mb)
+        else:
+            self.block_cache = None
+
+    def set_block_clustering(self, cell_size=16):
+        """
+        Read separate blocks for clusters of elements, e.g. from distant
+        release sites, instead of one block covering all elements.
+
+        Elements are clustered by occupancy of grid cells of `cell_size`
+        by `cell_size` pixels: each group of connected (also diagonally)
+        occupied cells is a cluster. The blocks of the clusters are used
+        together as a
+        :class:`opendrift.readers.interpolation.structured.ClusteredReaderBlock`.
+        `cell_size=None` disables clustering.
+        """
+        self.cluster_cell_size = cell_size
+
+    def _clusters_(self, x, y):
+        """
+        Return list of arrays of indices of clusters of positions (x, y).
+        """
+        from scipy import ndimage
+        cell_size = self.cluster_cell_size
+        cx = np.floor((x - self.xmin) /
+                      np.abs(self.delta_x*cell_size)).astype(int)
+        cy = np.floor((y - self.ymin) /
+                      np.abs(self.delta_y*cell_size)).astype(int)
+        cx = cx - cx.min()
+        cy = cy - cy.min()
+        occupied = np.zeros((cy.max() + 1, cx.max() + 1), dtype=bool)
+        occupied[cy, cx] = True
+        labels, num_clusters = ndimage.label(occupied,
+                                             structure=np.ones((3, 3)))
+        if num_clusters == 1:
+            return [np.arange(len(x))]
+        element_labels = labels[cy, cx]
+        return [np.where(element_labels == label)[0]
+                for label in range(1, num_clusters + 1)]
+
+    def set_tile_cache(self, max_mb, tile_shape=(8, 64, 64)):
+        """
+        Read data from file in tiles of `tile_shape` (z, y, x) grid cells,
+        which are kept in a cache
+        (:class:`opendrift.readers.interpolation.structured.ReaderTileCache`)
+        of at most `max_mb` megabytes. Blocks are assembled from the cached
+        tiles, so that only tiles not read before are read from file,
+        e.g. along the edges of a block growing with the spreading
+        elements. `max_mb=0` disables the cache.
+
+        Used by readers reading data with `_read_tiled_`, such as
+        :class:`opendrift.readers.reader_netCDF_CF_generic.Reader`.
+        Tile hits and misses are included in `performance()`.
+        """
+        if max_mb > 0:
+            self.tile_cache = ReaderTileCache(max_mb, tile_shape)
+        else:
+            self.tile_cache = None
+
+    def _read_tiled_(self, name, var, indxTime, indz, indy, indx):
+        """
+        Read values of variable `var` (e.g. a netCDF variable) with
+        dimensions (y, x), (time, y, x) or (time, z, y, x) at the given
+        indices through the tile cache. Indices are integers or index
+        arrays, and x-indices may be negative (wrapping around).
+        """
+        if var.ndim == 2:
+            key, prefix, indices = (name, None), (), [indy, indx]
+        elif var.ndim == 3:
+            key, prefix, indices = (name, indxTime), (indxTime,), [indy, indx]
+        else:
+            key, prefix, indices = (name, indxTime), (indxTime,), \
+                [indz, indy, indx]
+        values = self.tile_cache.get(
+            key, [np.atleast_1d(i) for i in indices],
+            var.shape[len(prefix):], lambda tile: var[prefix + tile])
+        return values[tuple(0 if np.ndim(i) == 0 else slice(None)
+                            for i in indices)]
+
+    def set_prefetch(self, prefetch=True):
+        """
+        Read the block of the next reader time step in a background thread,
+        as soon as a new block is taken into use, so that reading of data
+        overlaps with the calculations of the simulation.
+
+        The extent of the prefetched block is the extent of the element
+        positions, extrapolated by their displacement since the previous
+        prefetch. If the elements are not covered by the prefetched block
+        when the next time step is needed, the block is read again.
+
+        Prefetch hits and misses are included in `performance()`.
+        """
+        self.prefetch = prefetch
+        self.prefetch_hits = 0
+        self.prefetch_misses = 0
+        self.__prefetched__ = None
+        self.__prefetch_extent__ = None
+        if prefetch is True:
+            if self.__prefetch_pool__ is None:
+                self.__prefetch_pool__ = ThreadPoolExecutor(max_workers=1)
+            # Serialising reading from file between threads
+            self.__read_lock__ = threading.RLock()
+        elif self.__prefetch_pool__ is not None:
+            self.__prefetch_pool__.shutdown(wait=True)
+            self.__prefetch_pool__ = None
+
+    def _prefetch_next_(self, variables, block, previous, x, y, z):
+        """
+        Start reading block of variables for the reader time following the
+        time of block, continuing in direction from the previous block.
+        """
+        if previous is None or previous.time is None or block.time is None \
+                or previous.time == block.time:
+            return
+        time = block.time + (block.time - previous.time)
+        if time < self.start_time or time > self.end_time:
+            return
+        if self.times is not None:  # Time steps may be irregular
+            time = self.nearest_time(time)[0]
+            if time == block.time:
+                return
+
+        # Extent of positions, extrapolated by change since last prefetch
+        extent = np.array([np.nanmin(x), np.nanmax(x),
+                           np.nanmin(y), np.nanmax(y)])
+        previous_extent = self.__prefetch_extent__
+        self.__prefetch_extent__ = extent
+        if previous_extent is not None:
+            change = extent - previous_extent
+            extent = extent + np.where(
+                np.array([-1, 1, -1, 1])*change > 0, change, 0)
+        px = np.clip(extent[0:2], self.xmin, self.xmax)
+        py = np.clip(extent[2:4], self.ymin, self.ymax)
+        if self.cluster_cell_size is not None:
+            # Present positions of each cluster, covered within buffer
+            px, py = np.array(x), np.array(y)
+
+        if self.__prefetched__ is not None:
+            self.prefetch_misses += 1  # Not used
+        logger.debug('Prefetching block for time %s' % time)
+        future = self.__prefetch_pool__.submit(
+            self._make_block_, list(variables), time, px, py,
+            None if z is None else np.array(z))
+        self.__prefetched__ = (set(variables), time, future)
+
+    def _prefetched_block_(self, variables, time, x, y, z):
+        """
+        Return prefetched block, if it matches variables and time and
+        covers positions, otherwise None.
+        """
+        if self.__prefetched__ is None:
+            return None
+        prefetched_variables, prefetched_time, future = self.__prefetched__
+        if prefetched_time != time or \
+                not set(variables).issubset(prefetched_variables):
+            return None
+        self.__prefetched__ = None
+        try:
+            block = future.result()
+        except Exception as e:
+            logger.warning('Prefetching from %s failed: %s' % (self.name, e))
+            block = None
+        if block is None or not self._block_covers_(block, x, y, z):
+            self.prefetch_misses += 1
+            return None
+        self.prefetch_hits += 1
+        return block
+
+    def _make_block_(self, variables, time, x, y, z):
+        if self.cluster_cell_size is not None and len(np.atleast_1d(x)) > 1:
+            clusters = self._clusters_(np.atleast_1d(x), np.atleast_1d(y))
+            if len(clusters) > 1:
+                logger.debug('Reading %i blocks for clusters of elements' %
+                             len(clusters))
+                # Same vertical levels for all clusters
+                return ClusteredReaderBlock([
+                    self._read_block_(variables, time, x[c], y[c], z)
+                    for c in clusters])
+        return self._read_block_(variables, time, x, y, z)
+
+    def _read_block_(self, variables, time, x, y, z):
+        # Readers using netCDF4 directly are also serialised with reading
+        # of other readers and writing of output in other threads
+        with self.__read_lock__ or nullcontext(), \
+                netcdf_locked() if reads_netcdf4(self) else nullcontext():
+            return ReaderBlock(
+                self.__convolve_block__(
+                    self.get_variables(variables, time, x, y, z)),
+                interpolation_horizontal=self.interpolation,
+                coast_extrapolation=self.coast_extrapolation)
+
+    def _block_covers_(self, block, x, y, z):
+        """
+        Return True if block covers positions (x, y, z) horizontally, and
+        vertically within the z-levels of the block, or beyond if these
+        include the top or bottom level of the reader.
+        """
+        if not block.covers_positions(x, y):
+            return False
+        if z is None or block.z is None:
+            return True
+        block_z = np.atleast_1d(block.z)
+        levels = np.atleast_1d(getattr(self, 'z', None))
+        top, bottom = np.max(block_z), np.min(block_z)
+        if levels[0] is not None and len(block_z) > 1:
+            if top >= np.max(levels):
+                top = np.inf
+            if bottom <= np.min(levels):
+                bottom = -np.inf
+        return bool(np.min(z) >= bottom and np.max(z) <= top)
+
+    def _shared_block_extent_(self, x, y, z):
+        """
+        Return corners (x, y, z) of block covering given positions,
+        aligned to a grid of `shared_block_alignment` pixels (and 100 m).
+        """
+        nx = self.delta_x * self.shared_block_alignment
+        ny = self.delta_y * self.shared_block_alignment
+        x = self.xmin + nx * np.array([np.floor((np.min(x) - self.xmin) / nx),
+                                       np.ceil((np.max(x) - self.xmin) / nx)])
+        y = self.ymin + ny * np.array([np.floor((np.min(y) - self.ymin) / ny),
+                                       np.ceil((np.max(y) - self.ymin) / ny)])
+        x = np.clip(x, self.xmin, self.xmax)
+        y = np.clip(y, self.ymin, self.ymax)
+        if z is not None:
+            z = 100. * np.array([np.floor(np.min(z) / 100.),
+                                 np.ceil(np.max(z) / 100.)])
+        return x, y, z
+
+    def _fetch_block_(self, variables, time, x, y, z):
+        """
+        Read a block of data with `get_variables` and store in a ReaderBlock,
+        or reuse the block from the shared memory pool, the block cache or
+        the prefetched block if available.
+        """
+        if self.shared_block_pool is None:
+            if self.prefetch is True:
+                block = self._prefetched_block_(variables, time, x, y, z)
+                if block is not None:
+                    return block
+
+            def make_block():
+                return self._make_block_(variables, time, x, y, z)
+            if self.block_cache is None:
+                return make_block()
+            return self.block_cache.get(
+                variables, time,
+                lambda block: self._block_covers_(block, x, y, z),
+                make_block)
+
+        # Key of the aligned extent, which is only equal for processes
+        # with elements spanning the same cells of the alignment grid
+        x, y, z = self._shared_block_extent_(x, y, z)
+        key = (self.name, tuple(sorted(variables)), str(time), tuple(x),
+               tuple(y), None if z is None else tuple(z))
+        block = self.shared_block_pool.get(
+            key, lambda: self._read_block_(variables, time, x, y, z))
+        if hasattr(block, 'shared_key'):
+            self.__shared_keys__.add(block.shared_key)
+        return block
+
+    def _release_shared_blocks_(self):
+        """
+        Release shared blocks which are no longer used as before/after block.
+        """
+        if self.shared_block_pool is None:
+            return
+        in_use = set(
+            getattr(b, 'shared_key', None)
+            for b in list(self.var_block_before.values()) +
+            list(self.var_block_after.values()))
+        for key in self.__shared_keys__ - in_use:
+            self.shared_block_pool.release(key)
+        self.__shared_keys__ &= in_use
+
     def __convolve_block__(self, env):
         """
         Convolve arrays with a kernel, if reader.convolve is set
@@ -144,7 +474,7 @@ class StructuredReader(Variables):
         return env
 
     def _get_variables_interpolated_(self, variables, profiles, profiles_depth,
-                                     time, reader_x, reader_y, z):
+                                     time, reader_x, reader_y, z, ids=None):
 
         # Find reader time_before/time_after
         time_nearest, time_before, time_after, i1, i2, i3 = \
@@ -204,16 +534,12 @@ class StructuredReader(Variables):
                     self.var_block_after[blockvars_after] = block_after
 
         # Fetch data, if no buffer is available
+        fetched_before = fetched_after = False
         if block_before is None or \
                 block_before.time != time_before:
-            reader_data_dict = \
-                    self.__convolve_block__(
-                self.get_variables(blockvariables_before, time_before,
-                                    mx, my, mz)
-                )
-            self.var_block_before[blockvars_before] = \
-                ReaderBlock(reader_data_dict,
-                            interpolation_horizontal=self.interpolation)
+            fetched_before = True
+            self.var_block_before[blockvars_before] = self._fetch_block_(
+                blockvariables_before, time_before, mx, my, mz)
             try:
                 len_z = len(self.var_block_before[blockvars_before].z)
             except:
@@ -228,13 +554,9 @@ class StructuredReader(Variables):
             if time_after is None:
                 self.var_block_after[blockvars_after] = block_before
             else:
-                reader_data_dict = self.__convolve_block__(
-                    self.get_variables(blockvariables_after, time_after, mx,
-                                       my, mz))
-                self.var_block_after[blockvars_after] = \
-                    ReaderBlock(
-                        reader_data_dict,
-                        interpolation_horizontal=self.interpolation)
+                fetched_after = True
+                self.var_block_after[blockvars_after] = self._fetch_block_(
+                    blockvariables_after, time_after, mx, my, mz)
                 try:
                     len_z = len(self.var_block_after[blockvars_after].z)
                 except:
@@ -247,6 +569,17 @@ class StructuredReader(Variables):
                               len_z, time_after))
                 block_after = self.var_block_after[blockvars_after]
 
+        self._release_shared_blocks_()
+
+        # Start reading the next block, forwards or backwards in time
+        if self.prefetch is True and time_after is not None:
+            if fetched_after:
+                self._prefetch_next_(blockvariables_after, block_after,
+                                     block_before, mx, my, mz)
+            elif fetched_before:
+                self._prefetch_next_(blockvariables_before, block_before,
+                                     block_after, mx, my, mz)
+
         if (block_before is not None and block_before.covers_positions(
             reader_x, reader_y) is False) or (\
             block_after is not None and block_after.covers_positions(
@@ -386,18 +719,16 @@ class StructuredReader(Variables):
                 split_lat = np.array_split(lat, nproc)
 
                 with ThreadPoolExecutor() as x:
-                    out_x = np.concatenate(
-                        list(x.map(self.spl_x, zip(split_lon, split_lat))))
-                    out_y = np.concatenate(
-                        list(x.map(self.spl_y, zip(split_lon, split_lat))))
+                    out = list(x.map(self.grid_index, split_lon, split_lat))
+                out_x = np.concatenate([o[0] for o in out])
+                out_y = np.concatenate([o[1] for o in out])
 
                 return (out_x, out_y)
 
             else:
                 logger.debug('Calculating lonlat2xy sequentially')
                 self.__lonlat2xy_parallel__ = False
-                x = self.spl_x(lon, lat)
-                y = self.spl_y(lon, lat)
+                x, y = self.grid_index(lon, lat)
                 return (x, y)
 
     def pixel_size(self):
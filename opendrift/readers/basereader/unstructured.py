@@ -4,6 +4,8 @@ import logging
 logger = logging.getLogger(__name__)
 
 from .variables import Variables
+from .meshlocator import MeshLocator
+from opendrift.readers.interpolation.unstructured import UnstructuredBlock
 
 
 class UnstructuredReader(Variables):
@@ -37,6 +39,24 @@ class UnstructuredReader(Variables):
     face_variables = None # list of std-name variables defined at center of faces
     faces_idx = None
 
+    # mesh: nodes of each face [E x 3], if provided by reader, and
+    # optionally neighbouring faces of each face [E x 3] (-1 at boundary)
+    triangles = None
+    neighbours = None
+    locator = None  # MeshLocator, built on first use
+    __located__ = None  # Element IDs (if given) and faces of previous call
+
+    block = None  # UnstructuredBlock of previous call
+
+    # Optional hook of readers providing `triangles`, reading time slices
+    # of variables for given nodes and faces, which are then interpolated
+    # in time, within triangles and vertically:
+    #   _read_block_(variables, indx_before, indx_after, nodes, faces)
+    # returning dicts variable -> (before, after) arrays (levels, ids), and
+    # variable -> array (levels, ids) of z of levels. Without it, values
+    # are taken from nearest time and position with `get_variables`.
+    _read_block_ = None
+
     def __init__(self):
         super().__init__()
 
@@ -53,12 +73,14 @@ class UnstructuredReader(Variables):
 
     def _get_variables_interpolated_(self, variables, profiles,
                                    profiles_depth, time,
-                                   reader_x, reader_y, z):
+                                   reader_x, reader_y, z, ids=None):
 
-        env = self.get_variables(variables, time, reader_x, reader_y, z)
-
-        # We probably have to use an UnstructuredBlock to store closest time-steps, and thus avoid fetching
-        # more data on every call.
+        if self._has_blocks_() and time is not None:
+            env = self._interpolate_block_(variables, time, reader_x,
+                                           reader_y, z, ids)
+        else:
+            # Nearest time and position, without a mesh to interpolate
+            env = self.get_variables(variables, time, reader_x, reader_y, z)
 
         logger.debug('Fetched env-before')
         env_profiles = None
@@ -70,6 +92,129 @@ class UnstructuredReader(Variables):
 
         return env, env_profiles
 
+    def _has_blocks_(self):
+        """
+        True if the reader provides the mesh (`triangles`) and implements
+        `_read_block_`, so that values are interpolated from blocks.
+        """
+        return self.triangles is not None and self._read_block_ is not None
+
+    def _block_subset_(self, x, y):
+        """
+        Faces and nodes of block around positions, with a margin of
+        `buffer` (typical) face sizes.
+        """
+        margin = self.buffer * (self.pixel_size() or 0)
+        faces = np.flatnonzero((self.xc >= x.min() - margin) &
+                               (self.xc <= x.max() + margin) &
+                               (self.yc >= y.min() - margin) &
+                               (self.yc <= y.max() + margin))
+        nodes = np.unique(self.triangles[faces])
+        return faces, nodes
+
+    def _interpolate_block_(self, variables, time, x, y, z, ids=None):
+        """
+        Interpolate linearly in time, within triangles and vertically,
+        from a block which is reused for later calls it covers.
+        """
+        x = np.atleast_1d(x)
+        y = np.atleast_1d(y)
+        z = np.atleast_1d(z)
+        if len(z) == 1:
+            z = z[0] * np.ones(x.shape)
+
+        faces, weights = self._locate_(x, y, ids)
+        inside = faces >= 0
+        if inside.sum() == 0:
+            logger.debug('No elements inside mesh')
+            return {var: np.full(len(x), np.nan) for var in variables}
+        nodes = self.triangles[faces[inside]].T
+
+        _nearest, time_before, time_after, _indx_nearest, indx_before, \
+            indx_after = self.nearest_time(time)
+        if time_after is None or indx_after == indx_before:
+            time_after = time_before
+
+        if self.block is None or \
+                not set(variables).issubset(self.block.data) or \
+                self.block.time_before != time_before or \
+                self.block.time_after != time_after or \
+                not self.block.covers(time, faces[inside], nodes):
+            self.timer_start('reading block')
+            block_faces, block_nodes = self._block_subset_(x[inside],
+                                                           y[inside])
+            logger.debug('Reading block of %i faces and %i nodes' %
+                         (len(block_faces), len(block_nodes)))
+            data, depths = self._read_block_(variables, indx_before,
+                                             indx_after, block_nodes,
+                                             block_faces)
+            self.block = UnstructuredBlock((time_before, time_after),
+                                           block_nodes, block_faces,
+                                           data, depths)
+            self.timer_end('reading block')
+        else:
+            logger.debug('Reusing block')
+
+        env = {}
+        values = self.block.interpolate(time, faces[inside], nodes,
+                                        weights[:, inside], z[inside],
+                                        variables, self.node_variables)
+        for var in variables:
+            env[var] = np.full(len(x), np.nan)
+            env[var][inside] = values[var]
+
+        return env
+
+    def _mesh_locator_(self):
+        if self.locator is None:
+            logger.debug('Building mesh locator..')
+            self.locator = MeshLocator(self.x, self.y, self.triangles,
+                                       self.neighbours, tree=self.faces_idx)
+        return self.locator
+
+    def _locate_(self, x, y, ids=None):
+        """
+        Return face containing each position (-1 if outside mesh) and the
+        barycentric coordinates [3 x N] of the positions in these faces.
+
+        Faces are found by walking from the faces of the same elements in
+        the previous call, usually at the previous time step (see
+        :class:`.meshlocator.MeshLocator`). Elements are matched by their
+        `ids` if given (in this and the previous call), so that elements
+        seeded or deactivated in between do not affect the others.
+        Otherwise positions are matched by order, if their number is
+        unchanged (e.g. repeated calls for the same elements).
+        """
+        x = np.atleast_1d(x)
+        guess = None
+        previous_ids = None
+        if self.__located__ is not None:
+            previous_ids, previous_faces = self.__located__
+            if ids is not None and previous_ids is not None and \
+                    len(previous_ids) > 0:
+                ids = np.atleast_1d(ids)
+                order = np.argsort(previous_ids)
+                index = order[np.minimum(np.searchsorted(
+                    previous_ids, ids, sorter=order), len(order) - 1)]
+                guess = np.where(previous_ids[index] == ids,
+                                 previous_faces[index], -1)
+            elif len(previous_faces) == len(x):
+                guess = previous_faces
+        faces, weights = self._mesh_locator_().locate(x, y, guess=guess)
+        if ids is None and previous_ids is not None and \
+                len(previous_ids) == len(x):
+            ids = previous_ids  # Same elements as in previous call
+        self.__located__ = (None if ids is None else np.atleast_1d(ids),
+                            faces)
+        return faces, weights
+
+    def pixel_size(self):
+        """Typical size of faces, from area of domain and number of faces."""
+        if self.xc is None or len(self.xc) == 0:
+            return None
+        return np.sqrt((self.xmax - self.xmin) * (self.ymax - self.ymin) /
+                       len(self.xc))
+
     def _build_boundary_polygon_(self, x, y):
         """
         Build a polygon of the boundary of the mesh.
@@ -131,12 +276,19 @@ class UnstructuredReader(Variables):
     def covers_positions(self, x, y, z=0):
         """
         Check which points are within boundary of mesh.
-        """
-        assert self.boundary is not None, "Boundary of mesh has not been prepared by reader"
 
+        With the mesh (`triangles`), this is an exact test of the positions
+        being in a face, otherwise the positions are tested against the
+        (approximate) boundary polygon.
+        """
         # TODO: Check z coordinates
         logger.warning("z-coordinates are not bounds-checked")
 
+        if self.triangles is not None:
+            return self._mesh_locator_().locate(x, y)[0] >= 0
+
+        assert self.boundary is not None, "Boundary of mesh has not been prepared by reader"
+
         from shapely.vectorized import contains
         return contains(self.boundary, x, y)
 
@@ -180,6 +332,16 @@ class UnstructuredReader(Variables):
     def _nearest_face_(self, xc, yc):
         """
         Return nearest element or face (id) for xc and yc
-        """
-        return self.__nearest_ckdtree__(self.faces_idx, xc, yc)
 
+        With the mesh, this is the face containing the position (KD-tree
+        lookup for positions outside the mesh).
+        """
+        if self.triangles is None:
+            return self.__nearest_ckdtree__(self.faces_idx, xc, yc)
+        xc = np.atleast_1d(xc)
+        yc = np.atleast_1d(yc)
+        faces = self._locate_(xc, yc)[0].copy()
+        outside = faces < 0
+        faces[outside] = self.__nearest_ckdtree__(self.faces_idx,
+                                                  xc[outside], yc[outside])
+        return faces
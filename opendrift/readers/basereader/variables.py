@@ -517,13 +517,15 @@ class Variables(ReaderDomain):
 
     @abstractmethod
     def _get_variables_interpolated_(self, variables, profiles, profiles_depth,
-                                     time, reader_x, reader_y, z):
+                                     time, reader_x, reader_y, z, ids=None):
         """
         This method _must_ be implemented by every reader. Usually by
         subclassing one of the reader types (e.g.
         :class:`structured.StructuredReader`).
 
-        Arguments are in _native projection_ of reader.
+        Arguments are in _native projection_ of reader. `ids` are the
+        element IDs of the positions, if given, which readers may use to
+        recognise elements between calls.
 
         .. seealso:
 
@@ -540,7 +542,8 @@ class Variables(ReaderDomain):
                                       x=None,
                                       y=None,
                                       z=None,
-                                      rotate_to_proj=None):
+                                      rotate_to_proj=None,
+                                      ids=None):
         """
         Get variables in native projection of reader.
 
@@ -603,8 +606,10 @@ class Variables(ReaderDomain):
             variables.remove(v)
         variables.extend(list(set(derived_input)))
 
+        if ids is not None:
+            ids = np.atleast_1d(ids)[ind_covered]
         env, env_profiles = self._get_variables_interpolated_(
-            variables, profiles, profiles_depth, time, x, y, z)
+            variables, profiles, profiles_depth, time, x, y, z, ids)
 
         # Calculate derived variables
         if len(derived) > 0:
@@ -688,7 +693,8 @@ class Variables(ReaderDomain):
                                    lon=None,
                                    lat=None,
                                    z=None,
-                                   rotate_to_proj=None):
+                                   rotate_to_proj=None,
+                                   ids=None):
         """
         `get_variables_interpolated` is the main interface to
         :class:`opendrift.basemodel.OpenDriftSimulation`, and is responsible
@@ -720,6 +726,11 @@ class Variables(ReaderDomain):
 
             rotate_to_proj: N/A
 
+            ids: optional element IDs of the positions, allowing readers
+                to recognise elements between calls (e.g. to find their
+                faces in an unstructured mesh from those of the previous
+                time step).
+
           Returns:
 
             (env, env_profiles)
@@ -736,6 +747,7 @@ class Variables(ReaderDomain):
         x, y = self.lonlat2xy(lon, lat)
 
         env, env_profiles = self.get_variables_interpolated_xy(
-            variables, profiles, profiles_depth, time, x, y, z, rotate_to_proj)
+            variables, profiles, profiles_depth, time, x, y, z, rotate_to_proj,
+            ids)
 
         return env, env_profiles
@@ -1,3 +1,6 @@
 from .interpolators import *
-from .structured import ReaderBlock
+from .structured import ReaderBlock, ClusteredReaderBlock, \
+    SharedReaderBlockPool, ReaderBlockCache, \
+    ReaderTileCache
+from .unstructured import UnstructuredBlock
 
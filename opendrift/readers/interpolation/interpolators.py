@@ -20,6 +20,50 @@ def expand_numpy_array(data):
     data[data==np.finfo(np.float64).min] = np.nan
 
 
+def extrapolate_missing(data, method='dilation', max_iterations=10,
+                        index_maps=None):
+    """Return copy of 2D or 3D (layer, y, x) array, with missing (NaN)
+    values replaced by nearby valid values within each layer.
+
+    Methods:
+        dilation: repeated expansion of valid values to neighbouring
+            missing values (as expand_numpy_array), at most max_iterations
+            times.
+        nearest: value of nearest valid grid cell, from a distance
+            transform. The map of nearest indices for each mask of missing
+            values is stored in the dictionary index_maps, if given, to be
+            reused for other variables with the same mask.
+    """
+    data = np.array(np.ma.filled(data, fill_value=np.nan))
+    layers = data.reshape((-1,) + data.shape[-2:])
+    if method == 'dilation':
+        lowest = np.finfo(data.dtype).min
+        for i in range(max_iterations):
+            mask = ~np.isfinite(layers)
+            if not mask.any():
+                break
+            layers[mask] = lowest
+            layers[mask] = ndimage.grey_dilation(layers, size=(1, 3, 3))[mask]
+            layers[layers == lowest] = np.nan
+    elif method == 'nearest':
+        for layer in layers:
+            mask = ~np.isfinite(layer)
+            if not mask.any() or mask.all():
+                continue
+            key = mask.tobytes()
+            if index_maps is not None and key in index_maps:
+                indices = index_maps[key]
+            else:
+                indices = ndimage.distance_transform_edt(
+                    mask, return_distances=False, return_indices=True)
+                if index_maps is not None:
+                    index_maps[key] = indices
+            layer[...] = layer[tuple(indices)]
+    else:
+        raise ValueError('Unknown extrapolation method: %s' % method)
+    return data
+
+
 ###########################
 # 2D interpolator classes
 ###########################
@@ -29,12 +73,13 @@ class Nearest2DInterpolator():
     def __init__(self, xgrid, ygrid, x, y):
         self.x = x
         self.y = y
-        self.xi = (x - xgrid.min())/(xgrid.max()-xgrid.min())*len(xgrid)
-        self.yi = (y - ygrid.min())/(ygrid.max()-ygrid.min())*len(ygrid)
+        self.xi = (x - xgrid.min())/(xgrid.max()-xgrid.min())*(len(xgrid)-1)
+        self.yi = (y - ygrid.min())/(ygrid.max()-ygrid.min())*(len(ygrid)-1)
         self.xi = np.round(self.xi).astype(np.int)
         self.yi = np.round(self.yi).astype(np.int)
-        self.xi[self.xi >= len(xgrid)] = len(xgrid)-1
-        self.yi[self.yi >= len(ygrid)] = len(ygrid)-1
+        # Positions outside grid take the value of the nearest edge
+        self.xi = np.clip(self.xi, 0, len(xgrid)-1)
+        self.yi = np.clip(self.yi, 0, len(ygrid)-1)
 
     def __call__(self, array2d):
         return array2d[self.yi, self.xi]
@@ -45,8 +90,8 @@ class NDImage2DInterpolator():
     def __init__(self, xgrid, ygrid, x, y):
         self.x = x
         self.y = y
-        self.xi = (x - xgrid.min())/(xgrid.max()-xgrid.min())*len(xgrid)
-        self.yi = (y - ygrid.min())/(ygrid.max()-ygrid.min())*len(ygrid)
+        self.xi = (x - xgrid.min())/(xgrid.max()-xgrid.min())*(len(xgrid)-1)
+        self.yi = (y - ygrid.min())/(ygrid.max()-ygrid.min())*(len(ygrid)-1)
 
     def __call__(self, array2d):
         try:
@@ -112,11 +157,58 @@ class Linear2DInterpolator():
     def __init__(self, xgrid, ygrid, x, y):
         self.x = x
         self.y = y
-        self.xi = (x - xgrid.min())/(xgrid.max()-xgrid.min())*len(xgrid)
-        self.yi = (y - ygrid.min())/(ygrid.max()-ygrid.min())*len(ygrid)
+        self.xi = (x - xgrid.min())/(xgrid.max()-xgrid.min())*(len(xgrid)-1)
+        self.yi = (y - ygrid.min())/(ygrid.max()-ygrid.min())*(len(ygrid)-1)
+
+        # Indices (of flattened grid) and weights of the four corners
+        # of the grid cells containing the points, for all layers
+        nx, ny = len(xgrid), len(ygrid)
+        with np.errstate(invalid='ignore'):
+            ix0 = np.clip(np.floor(self.xi), 0, max(nx - 2, 0))
+            iy0 = np.clip(np.floor(self.yi), 0, max(ny - 2, 0))
+            inside = (self.xi >= 0) & (self.xi <= nx - 1) & \
+                (self.yi >= 0) & (self.yi <= ny - 1)
+        ix0 = np.where(inside, ix0, 0).astype(int)
+        iy0 = np.where(inside, iy0, 0).astype(int)
+        ix1 = np.minimum(ix0 + 1, nx - 1)
+        iy1 = np.minimum(iy0 + 1, ny - 1)
+        fx = self.xi - ix0
+        fy = self.yi - iy0
+        self.corners = np.array([iy0*nx + ix0, iy0*nx + ix1,
+                                 iy1*nx + ix0, iy1*nx + ix1])
+        self.weights = np.array([(1 - fx)*(1 - fy), fx*(1 - fy),
+                                 (1 - fx)*fy, fx*fy])
+        self.weights[:, ~inside] = np.nan  # Outside grid
+
+    def layers(self, array3d, extrapolated=None):
+        """Interpolate all layers of 3D array (layer, y, x) at once.
+
+        Returns array (layer, point). Layers with missing (NaN) values
+        at any of the points are interpolated with __call__, filling
+        NaN-values with nearby values.
+        """
+        if isinstance(array3d, np.ma.MaskedArray):
+            array3d = np.ma.filled(array3d, fill_value=np.nan)
+        values = array3d.reshape(array3d.shape[0], -1)
+        interp = values[:, self.corners[0]]*self.weights[0]
+        for corner in range(1, 4):
+            interp += values[:, self.corners[corner]]*self.weights[corner]
+        for layer in np.where(~np.isfinite(interp).all(axis=1))[0]:
+            interp[layer] = self(
+                array3d[layer], None if extrapolated is None else
+                lambda layer=layer: extrapolated()[layer])
+        return interp
 
+    def __call__(self, array2d, extrapolated=None):
+        """Interpolate 2D array (y, x) at the points.
 
-    def __call__(self, array2d):
+        Values at points next to missing (NaN) values are interpolated
+        from the array returned by function extrapolated, with missing
+        values replaced by nearby values, if given. Otherwise missing
+        values of array2d are replaced (in place) by repeated expansion
+        of valid values, until the values at all points are valid, or in
+        a copy if array2d is read-only (e.g. shared between processes).
+        """
         if isinstance(array2d,np.ma.MaskedArray):
             logger.debug('Converting masked array to numpy array for interpolation')
             array2d = np.ma.filled(array2d, fill_value=np.nan)
@@ -128,6 +220,15 @@ class Linear2DInterpolator():
         interp = map_coordinates(array2d, [self.yi, self.xi],
                                  cval=np.nan, order=1)
         missing = np.where(~np.isfinite(interp))[0]
+        if len(missing) > 0 and extrapolated is not None:
+            interp[missing] = map_coordinates(
+                extrapolated(), [self.yi[missing], self.xi[missing]],
+                cval=np.nan, order=1, mode='nearest')
+            if not np.isfinite(interp[missing]).all():
+                logger.warning('Still NaN-values after extrapolation')
+            return interp
+        if len(missing) > 0 and not array2d.flags.writeable:
+            array2d = array2d.copy()
         i=0
         while len(missing) > 0:
             i += 1
@@ -1,9 +1,15 @@
+import os
+import glob
+import pickle
+import hashlib
+import itertools
+from collections import OrderedDict
 import numpy as np
 from scipy.ndimage import map_coordinates
 import scipy.ndimage as ndimage
 from scipy.interpolate import interp1d, LinearNDInterpolator
 
-from .interpolators import Nearest2DInterpolator, fill_NaN_towards_seafloor, horizontal_interpolation_methods, vertical_interpolation_methods
+from .interpolators import Nearest2DInterpolator, fill_NaN_towards_seafloor, horizontal_interpolation_methods, vertical_interpolation_methods, extrapolate_missing
 from opendrift.readers.basereader import variables
 
 import logging
@@ -14,7 +20,8 @@ class ReaderBlock():
 
     def __init__(self, data_dict,
                  interpolation_horizontal='linearNDFast',
-                 interpolation_vertical='linear'):
+                 interpolation_vertical='linear',
+                 coast_extrapolation='dilation'):
 
         # Make pointers to data values, for convenience
         self.x = data_dict['x']
@@ -53,7 +60,26 @@ class ReaderBlock():
             logger.debug('Filled NaN-values toward seafloor for :'
                           + str(list(filled_variables)))
 
-        # Set 1D (vertical) and 2D (horizontal) interpolators
+        self._set_interpolators(interpolation_horizontal,
+                                interpolation_vertical, coast_extrapolation)
+
+        if 'land_binary_mask' in self.data_dict.keys() and \
+                interpolation_horizontal != 'nearest':
+            logger.debug('Nearest interpolation will be used '
+                          'for landmask, and %s for other variables'
+                          % interpolation_horizontal)
+
+    def _set_interpolators(self, interpolation_horizontal,
+                           interpolation_vertical,
+                           coast_extrapolation='dilation'):
+        """Set 1D (vertical) and 2D (horizontal) interpolator classes"""
+        self.interpolation_horizontal = interpolation_horizontal
+        self.interpolation_vertical = interpolation_vertical
+        # Arrays with missing values (e.g. land) extrapolated, made when
+        # first needed, and reused for all interpolations of the block
+        self.coast_extrapolation = coast_extrapolation
+        self.extrapolated_dict = {}
+        self._index_maps = {}
         try:
             self.Interpolator2DClass = \
                 horizontal_interpolation_methods[interpolation_horizontal]
@@ -70,12 +96,6 @@ class ReaderBlock():
                 'Valid interpolation methods are: ' +
                 str(vertical_interpolation_methods.keys()))
 
-        if 'land_binary_mask' in self.data_dict.keys() and \
-                interpolation_horizontal != 'nearest':
-            logger.debug('Nearest interpolation will be used '
-                          'for landmask, and %s for other variables'
-                          % interpolation_horizontal)
-
     def _initialize_interpolator(self, x, y, z=None):
         logger.debug('Initialising interpolator.')
         self.interpolator2d = self.Interpolator2DClass(self.x, self.y, x, y)
@@ -111,7 +131,10 @@ class ReaderBlock():
                     else:
                         horizontal[:, elnum] = int_full[:, elnum]
             else:
-                horizontal = self._interpolate_horizontal_layers(data, nearest=nearest)
+                horizontal = self._interpolate_horizontal_layers(
+                    data, nearest=nearest,
+                    extrapolated=lambda varname=varname:
+                        self._extrapolated(varname))
             if profiles is not None and varname in profiles:
                 profiles_dict[varname] = horizontal
             if horizontal.ndim > 1:
@@ -123,16 +146,37 @@ class ReaderBlock():
 
         return env_dict, profiles_dict
 
-    def _interpolate_horizontal_layers(self, data, nearest=False):
-        '''Interpolate all layers of 3d (or 2d) array.'''
+    def _extrapolated(self, varname):
+        '''Array of variable with missing values extrapolated.'''
+        if varname not in self.extrapolated_dict:
+            logger.debug('Extrapolating missing values of %s (%s)' %
+                         (varname, self.coast_extrapolation))
+            self.extrapolated_dict[varname] = extrapolate_missing(
+                self.data_dict[varname], method=self.coast_extrapolation,
+                index_maps=self._index_maps)
+        return self.extrapolated_dict[varname]
+
+    def _interpolate_horizontal_layers(self, data, nearest=False,
+                                       extrapolated=None):
+        '''Interpolate all layers of 3d (or 2d) array.
+
+        extrapolated: function returning data with missing values
+        extrapolated, used by interpolators supporting it.
+        '''
 
         if nearest is True:
             interpolator2d = self.interpolator2d_nearest
         else:
             interpolator2d = self.interpolator2d
         if data.ndim == 2:
+            if hasattr(interpolator2d, 'layers'):
+                return interpolator2d(data, extrapolated)
             return interpolator2d(data)
         if data.ndim == 3:
+            if hasattr(self.interpolator2d, 'layers'):
+                # All layers interpolated with same corners and weights
+                return np.ma.array(self.interpolator2d.layers(data,
+                                                              extrapolated))
             num_layers = data.shape[0]
             # Allocate output array
             result = np.ma.empty((num_layers, len(interpolator2d.x)))
@@ -150,3 +194,418 @@ class ReaderBlock():
         else:
             return False
 
+
+    def is_shareable(self):
+        '''Return True if block data can be stored in shared memory.'''
+        return all(isinstance(data, np.ndarray)
+                   for data in self.data_dict.values())
+
+    def to_shared_memory(self, name):
+        '''Copy block data to a new shared memory segment with given name.
+
+        The segment starts with a reference counter (int64), followed by the
+        length and contents of pickled metadata (coordinates and layout
+        of variables), followed by the variable arrays.
+        '''
+        from multiprocessing import shared_memory
+
+        layout = []
+        offset = 0
+        for varname, data in self.data_dict.items():
+            layout.append((varname, data.dtype.str, data.shape, offset))
+            offset += (data.nbytes + 63) // 64 * 64  # 64-byte alignment
+        meta = pickle.dumps({
+            'x': self.x, 'y': self.y, 'z': self.z, 'time': self.time,
+            'interpolation_horizontal': self.interpolation_horizontal,
+            'interpolation_vertical': self.interpolation_vertical,
+            'coast_extrapolation': self.coast_extrapolation,
+            'layout': layout})
+        data_start = (16 + len(meta) + 63) // 64 * 64
+
+        shm = shared_memory.SharedMemory(name=name, create=True,
+                                         size=data_start + max(offset, 1))
+        header = np.ndarray((2, ), dtype=np.int64, buffer=shm.buf)
+        header[:] = [0, len(meta)]
+        shm.buf[16:16 + len(meta)] = meta
+        for varname, dtype, shape, offset in layout:
+            np.ndarray(shape, dtype=dtype, buffer=shm.buf,
+                       offset=data_start + offset)[...] = \
+                self.data_dict[varname]
+        del header
+        return shm
+
+    @classmethod
+    def from_shared_memory(cls, shm):
+        '''Make ReaderBlock with data arrays backed by shared memory segment.
+
+        The arrays are used as they are, as processing of raw data
+        (masking, filling towards seafloor) was done before sharing, and
+        are read-only, as other processes may read them concurrently.
+        '''
+        header = np.ndarray((2, ), dtype=np.int64, buffer=shm.buf)
+        meta_length = int(header[1])
+        del header
+        meta = pickle.loads(bytes(shm.buf[16:16 + meta_length]))
+        data_start = (16 + meta_length + 63) // 64 * 64
+
+        block = cls.__new__(cls)
+        block.x = meta['x']
+        block.y = meta['y']
+        block.z = meta['z']
+        block.time = meta['time']
+        block.data_dict = {
+            varname: np.ndarray(shape, dtype=dtype, buffer=shm.buf,
+                                offset=data_start + offset)
+            for varname, dtype, shape, offset in meta['layout']}
+        for data in block.data_dict.values():
+            data.flags.writeable = False
+        block._set_interpolators(meta['interpolation_horizontal'],
+                                 meta['interpolation_vertical'],
+                                 meta['coast_extrapolation'])
+        return block
+
+
+class ClusteredReaderBlock():
+    """Separate ReaderBlocks covering clusters of elements, used as one block.
+
+    For elements in distant clusters (e.g. from several release sites),
+    a block for each cluster is much smaller than one block covering all
+    elements. Positions are interpolated from the first block covering
+    them, or from the nearest block if no block covers them. All blocks
+    must have the same time, variables and vertical levels.
+    """
+
+    def __init__(self, blocks):
+        self.blocks = blocks
+        self.time = blocks[0].time
+        self.z = blocks[0].z
+        self.data_dict = blocks[0].data_dict
+        # Grid coordinates of all blocks, as for ReaderBlock
+        self.x = np.unique(np.concatenate([b.x for b in blocks]))
+        self.y = np.unique(np.concatenate([b.y for b in blocks]))
+
+    def _covered(self, block, x, y):
+        return (x >= block.x.min()) & (x <= block.x.max()) & \
+            (y >= block.y.min()) & (y <= block.y.max())
+
+    def block_indices(self, x, y):
+        """Index of block used for each of the positions (x, y)."""
+        covered = np.array([self._covered(b, x, y) for b in self.blocks])
+        distance = np.array([
+            np.hypot(x - (b.x.min() + b.x.max())/2,
+                     y - (b.y.min() + b.y.max())/2) for b in self.blocks])
+        # First covering block, or nearest block
+        return np.where(covered.any(axis=0), np.argmax(covered, axis=0),
+                        np.argmin(distance, axis=0))
+
+    def interpolate(self, x, y, z=None, variables=None,
+                    profiles=[], profiles_depth=None):
+        x = np.atleast_1d(x)
+        y = np.atleast_1d(y)
+        indices = self.block_indices(x, y)
+        env_dict = {}
+        profiles_dict = {}
+        for i, block in enumerate(self.blocks):
+            elements = np.where(indices == i)[0]
+            if len(elements) == 0:
+                continue
+            env, env_profiles = block.interpolate(
+                x[elements], y[elements],
+                z[elements] if np.ndim(z) > 0 else z,
+                variables, profiles, profiles_depth)
+            for var, values in env.items():
+                if var not in env_dict:
+                    env_dict[var] = np.ma.masked_all(len(x))
+                env_dict[var][elements] = values
+            for var, values in env_profiles.items():
+                if var == 'z':
+                    profiles_dict['z'] = values
+                    continue
+                if var not in profiles_dict:
+                    profiles_dict[var] = np.ma.masked_all(
+                        (values.shape[0], len(x)))
+                profiles_dict[var][:, elements] = values
+        return env_dict, profiles_dict
+
+    def covers_positions(self, x, y, z=None):
+        """Check if given positions are covered by any of the blocks."""
+        return bool(np.all(np.any([self._covered(b, x, y)
+                                   for b in self.blocks], axis=0)))
+
+    def is_shareable(self):
+        return False
+
+
+class SharedReaderBlockPool():
+    """Pool of ReaderBlocks stored in shared memory, for use by several processes.
+
+    Blocks are identified by a key (typically reader name, variables, time
+    and extent of block), and stored in one shared memory segment per key.
+    The first process requesting a key reads the data and creates the
+    segment, and subsequent requests from any process attach to the same
+    segment. Each segment holds a counter of the processes using it, and is
+    unlinked when the last process releases it. Within a process, a key is
+    held once however many times it is requested, and is released by one
+    call to `release`.
+
+    The pool must be created before worker processes are forked, so that
+    they inherit the lock used to update reference counters.
+    """
+
+    def __init__(self, prefix=None):
+        import multiprocessing
+        if prefix is None:
+            prefix = 'od%i_' % os.getpid()
+        self.prefix = prefix
+        self.lock = multiprocessing.get_context('fork').Lock()
+        self.held = {}  # key -> (ReaderBlock, SharedMemory)
+        self.pid = os.getpid()
+        self.hits = 0
+        self.misses = 0
+
+    def _segment_name(self, key):
+        return self.prefix + hashlib.md5(
+            repr(key).encode()).hexdigest()[0:20]
+
+    @staticmethod
+    def _add_reference(shm, increment):
+        counter = np.ndarray((1, ), dtype=np.int64, buffer=shm.buf)
+        counter[0] += increment
+        references = int(counter[0])
+        del counter
+        return references
+
+    def _held_(self):
+        '''Blocks held by this process, not those inherited at fork.'''
+        if os.getpid() != self.pid:
+            self.held = {}
+            self.pid = os.getpid()
+        return self.held
+
+    def get(self, key, make_block):
+        '''Return block for given key, calling make_block() if not in pool.'''
+        from multiprocessing import shared_memory
+
+        self._held_()
+        if key in self.held:
+            self.hits += 1
+            return self.held[key][0]
+
+        name = self._segment_name(key)
+        shm = None
+        with self.lock:
+            try:
+                shm = shared_memory.SharedMemory(name=name)
+                self._add_reference(shm, 1)
+            except FileNotFoundError:
+                pass
+
+        if shm is not None:
+            self.hits += 1
+            logger.debug('Using shared block %s' % name)
+        else:
+            self.misses += 1
+            block = make_block()
+            if not block.is_shareable():
+                logger.debug('Block for %s can not be shared' % str(key))
+                return block
+            with self.lock:
+                try:
+                    shm = block.to_shared_memory(name)
+                    logger.debug('Stored block in shared memory %s' % name)
+                except FileExistsError:  # Made by other process meanwhile
+                    shm = shared_memory.SharedMemory(name=name)
+                self._add_reference(shm, 1)
+            del block  # Private copy is replaced by shared copy
+
+        block = ReaderBlock.from_shared_memory(shm)
+        block.shared_key = key
+        self.held[key] = (block, shm)
+        return block
+
+    def release(self, key):
+        '''Release a block, and unlink segment if not used by any process.'''
+        if key not in self._held_():
+            return
+        block, shm = self.held.pop(key)
+        del block
+        with self.lock:
+            references = self._add_reference(shm, -1)
+            if references <= 0:
+                logger.debug('Unlinking shared block %s' % shm.name)
+                shm.unlink()
+        try:
+            shm.close()
+        except BufferError:
+            pass  # Arrays still in use, mapping is closed when collected
+
+    def release_all(self):
+        '''Release all blocks held by this process.'''
+        logger.debug('Shared block pool: %i hits, %i misses' %
+                     (self.hits, self.misses))
+        for key in list(self._held_()):
+            self.release(key)
+
+    def close(self):
+        '''Release blocks, and unlink any segments left by other processes.
+
+        Leftover segments are found in /dev/shm, and are thus only removed
+        on Linux.
+        '''
+        self.release_all()
+        if not os.path.isdir('/dev/shm'):
+            return
+        for f in glob.glob('/dev/shm/%s*' % self.prefix):
+            logger.debug('Removing leftover shared block %s' % f)
+            try:
+                os.remove(f)
+            except OSError:
+                pass
+
+
+class ReaderBlockCache():
+    """Least recently used ReaderBlocks of a reader, within a memory budget.
+
+    Blocks are stored by variables and time, and are reused for later
+    requests of (a subset of) the same variables at the same time, if the
+    block covers the requested positions. This avoids reading the same
+    data again when a simulation revisits reader times, e.g. with
+    Runge-Kutta midpoint steps, backward runs or repeated runs over the
+    same period. When the total size of the data arrays exceeds max_mb,
+    the least recently used blocks are removed.
+    """
+
+    def __init__(self, max_mb):
+        self.max_bytes = max_mb * 1e6
+        self.blocks = OrderedDict()  # key -> [ReaderBlock, nbytes]
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def block_nbytes(block):
+        nbytes = 0
+        for b in getattr(block, 'blocks', [block]):  # ClusteredReaderBlock
+            for data in b.data_dict.values():
+                if isinstance(data, list):  # Ensemble data
+                    nbytes += sum(np.asarray(d).nbytes for d in data)
+                else:
+                    nbytes += np.asarray(data).nbytes
+        return nbytes
+
+    def get(self, variables, time, covers, make_block):
+        """Return cached block for variables and time, if covers(block),
+        otherwise block from make_block() which is added to cache."""
+        variables = set(variables)
+        for key in reversed(self.blocks):  # Most recently used first
+            block = self.blocks[key][0]
+            if key[1] == time and variables.issubset(key[0]) and \
+                    covers(block):
+                self.blocks.move_to_end(key)
+                self.hits += 1
+                return block
+
+        self.misses += 1
+        block = make_block()
+        nbytes = self.block_nbytes(block)
+        if nbytes <= self.max_bytes:
+            key = (frozenset(block.data_dict), time, id(block))
+            self.blocks[key] = [block, nbytes]
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes:
+                key, (old, old_nbytes) = self.blocks.popitem(last=False)
+                self.nbytes -= old_nbytes
+                logger.debug('Removed block for %s from cache' % str(key[1]))
+        return block
+
+    def clear(self):
+        self.blocks.clear()
+        self.nbytes = 0
+
+
+class ReaderTileCache():
+    """Tiles of gridded variables read from file, within a memory budget.
+
+    The (z,) y and x dimensions of the grid of each variable and time index
+    are split into tiles of fixed size (tile_shape). Arrays of values at
+    given grid indices are assembled from the tiles covering the indices,
+    and only tiles not already in the cache are read from file. When
+    elements spread out, only the tiles along the edges of the growing
+    block are read at each reader time step. When the total size of the
+    tiles exceeds max_mb, the least recently used tiles are removed.
+    """
+
+    def __init__(self, max_mb, tile_shape=(8, 64, 64)):
+        self.max_bytes = max_mb * 1e6
+        self.tile_shape = tuple(tile_shape)  # (z, y, x)
+        self.tiles = OrderedDict()  # (key, tile index) -> array
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, indices, shape, read):
+        """Return array of values at grid indices, from cached tiles.
+
+        Arguments:
+            key: identifying the grid, e.g. (variable, time index).
+            indices: list of index arrays, one for each dimension of grid,
+                wrapped around (modulo) shape.
+            shape: shape of grid.
+            read: function read(slices) returning values of the grid
+                within the tuple of slices.
+        """
+        tile_shape = self.tile_shape[-len(shape):]
+        indices = [np.asarray(i) % n for i, n in zip(indices, shape)]
+        tile_numbers = [i // t for i, t in zip(indices, tile_shape)]
+        needed = [np.unique(n) for n in tile_numbers]
+
+        # Reading missing tiles, in runs of consecutive tiles along x
+        missing = [tile for tile in itertools.product(*needed)
+                   if (key, tile) not in self.tiles]
+        self.hits += np.prod([len(n) for n in needed]) - len(missing)
+        self.misses += len(missing)
+        runs = []
+        for tile in missing:
+            if runs and runs[-1][-1][:-1] == tile[:-1] and \
+                    runs[-1][-1][-1] == tile[-1] - 1:
+                runs[-1].append(tile)
+            else:
+                runs.append([tile])
+        for run in runs:
+            slices = tuple(
+                slice(n*t, min((n + 1)*t, s)) for n, t, s in
+                zip(run[0][:-1], tile_shape[:-1], shape[:-1])) + \
+                (slice(run[0][-1]*tile_shape[-1],
+                       min((run[-1][-1] + 1)*tile_shape[-1], shape[-1])),)
+            values = np.asarray(read(slices))
+            for i, tile in enumerate(run):
+                self._add((key, tile), values[..., i*tile_shape[-1]:
+                                              (i + 1)*tile_shape[-1]].copy())
+
+        # Assembling requested array from tiles
+        out = None
+        for tile in itertools.product(*needed):
+            values = self.tiles[(key, tile)]
+            self.tiles.move_to_end((key, tile))
+            if out is None:
+                out = np.empty([len(i) for i in indices], dtype=values.dtype)
+            target = [np.nonzero(n == t)[0] for n, t in
+                      zip(tile_numbers, tile)]
+            source = [i[p] - t*s for i, p, t, s in
+                      zip(indices, target, tile, tile_shape)]
+            out[np.ix_(*target)] = values[np.ix_(*source)]
+        self._evict()
+        return out
+
+    def _add(self, key, values):
+        self.tiles[key] = values
+        self.nbytes += values.nbytes
+
+    def _evict(self):
+        while self.nbytes > self.max_bytes and len(self.tiles) > 0:
+            key, values = self.tiles.popitem(last=False)
+            self.nbytes -= values.nbytes
+
+    def clear(self):
+        self.tiles.clear()
+        self.nbytes = 0
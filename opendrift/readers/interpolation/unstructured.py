@@ -0,0 +1,109 @@
+import numpy as np
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class UnstructuredBlock():
+    """Class to store and interpolate the output from a reader with data on
+    a triangular (unstructured) mesh.
+
+    The block holds the time steps before and after the requested time, for
+    a subset of the nodes and faces of the mesh, and interpolates linearly
+    in time. Node variables are interpolated barycentrically within the
+    triangle containing each element, while face variables take the value
+    of the containing triangle, which is constant within the face (as in
+    FVCOM). Both are interpolated linearly in the vertical.
+
+    Arguments:
+        times: time before and after (after may equal before)
+        nodes: sorted array of node ids of the block
+        faces: sorted array of face ids of the block
+        data: dict variable -> (before, after) arrays (levels, nodes/faces)
+        depths: dict variable -> array (levels, nodes/faces) of z of levels
+            (negative downwards, decreasing along first axis)
+    """
+
+    def __init__(self, times, nodes, faces, data, depths):
+        self.time_before, self.time_after = times
+        self.nodes = np.asarray(nodes)
+        self.faces = np.asarray(faces)
+        self.depths = depths
+        self.data = {}
+        for var, (before, after) in data.items():
+            self.data[var] = tuple(
+                np.ma.filled(np.ma.masked_invalid(
+                    np.ma.atleast_2d(d).astype(np.float64)), np.nan)
+                for d in (before, after))
+
+    @staticmethod
+    def _local_(ids, block_ids):
+        """Return index in block of ids, and boolean array of ids in block."""
+        ind = np.clip(np.searchsorted(block_ids, ids), 0, len(block_ids) - 1)
+        return ind, block_ids[ind] == ids
+
+    def covers(self, time, faces, nodes):
+        """Return True if block covers time and (valid) faces and nodes."""
+        if self.time_after is None or self.time_before == self.time_after:
+            if time != self.time_before:
+                return False
+        elif time < self.time_before or time > self.time_after:
+            return False
+        return bool(self._local_(faces, self.faces)[1].all() and
+                    self._local_(nodes, self.nodes)[1].all())
+
+    @staticmethod
+    def _vertical_(values, depths, z):
+        """Linear interpolation of columns (levels, n) at z (n)."""
+        if values.shape[0] == 1:
+            return values[0]
+        n = np.arange(values.shape[1])
+        k = np.clip((depths >= z).sum(axis=0) - 1, 0, values.shape[0] - 2)
+        d0, d1 = depths[k, n], depths[k + 1, n]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            w = np.clip(np.where(d1 != d0, (z - d0) / (d1 - d0), 0), 0, 1)
+        return (1 - w) * values[k, n] + w * values[k + 1, n]
+
+    def interpolate(self, time, faces, nodes, weights, z, variables,
+                    node_variables):
+        """Interpolate variables at elements in given faces.
+
+        Arguments:
+            time: datetime within the times of the block
+            faces: array (n) of containing face of each element
+            nodes: array (3, n) of nodes of these faces
+            weights: array (3, n) of barycentric coordinates of elements
+            z: array (n) of element depths
+            variables: list of variables
+            node_variables: list of variables defined at nodes
+
+        Returns:
+            dict with arrays (n) for each variable
+        """
+        if self.time_after is None or self.time_after == self.time_before:
+            wt = 0.
+        else:
+            wt = (time - self.time_before).total_seconds() / \
+                (self.time_after - self.time_before).total_seconds()
+
+        env = {}
+        for var in variables:
+            before, after = self.data[var]
+            depths = self.depths[var]
+            if var in node_variables:
+                columns = [self._local_(nd, self.nodes)[0] for nd in nodes]
+                weighted = [weights[i] for i in range(len(columns))]
+            else:
+                columns = [self._local_(faces, self.faces)[0]]
+                weighted = [1.]
+            value = 0.
+            for col, w in zip(columns, weighted):
+                zc = depths[:, col]
+                v = self._vertical_(before[:, col], zc, z)
+                if wt > 0:
+                    v = (1 - wt) * v + wt * self._vertical_(after[:, col],
+                                                            zc, z)
+                value = value + w * v
+            env[var] = value
+
+        return env
@@ -22,6 +22,7 @@ logger = logging.getLogger(__name__)
 
 from netCDF4 import num2date
 import xarray as xr
+from opendrift.locks import netcdf_locked, netcdf4_locked
 from opendrift.readers.basereader import BaseReader, vector_pairs_xy, StructuredReader
 
 from opendrift.readers.ECOM_dependencies import depth_ECOM, work_model_grid
@@ -91,7 +92,8 @@ class Reader(BaseReader,StructuredReader):
 						preprocess=drop_non_essential_vars_pop,
 						data_vars='minimal', coords='minimal')
 				else:
-					self.Dataset = MFDataset(filename)
+					with netcdf_locked():
+						self.Dataset = MFDataset(filename)
 			else:
 				#logger.info('Opening file with Dataset')
 				if has_xarray is True:
@@ -119,7 +121,8 @@ class Reader(BaseReader,StructuredReader):
 						self.Dataset = work_model_grid.fix_ds(self.Dataset_1.copy())
 					
 				else:
-					self.Dataset = Dataset(filename, 'r')
+					with netcdf_locked():
+						self.Dataset = Dataset(filename, 'r')
 		except Exception as e:
 			raise ValueError('e')
 
@@ -181,9 +184,9 @@ class Reader(BaseReader,StructuredReader):
 								 '"gridfile=<grid_file>"')
 
 			else:
-				gf = Dataset(gridfile)
-				self.lat = gf.variables['lat'][:]
-				self.lon = gf.variables['lon'][:]
+				with netcdf_locked(), Dataset(gridfile) as gf:
+					self.lat = gf.variables['lat'][:]
+					self.lon = gf.variables['lon'][:]
 
 		# Get time coverage
 
@@ -229,6 +232,7 @@ class Reader(BaseReader,StructuredReader):
 		super(Reader, self).__init__()
 
 
+	@netcdf4_locked
 	def get_variables(self, requested_variables, time=None,
 					  x=None, y=None, z=None):
 
@@ -327,19 +331,20 @@ class Reader(BaseReader,StructuredReader):
 #########################---This must be done to work with sigma ----###############################################
 ##################################################################################################################################
 
-		# Find depth levels covering all elements 
-		sigma = np.asarray(self.sigma)
-		H_ND = np.asarray(self.depth)
-
-		layers = self.num_layers - 1  # surface layer
-		H_shape = H_ND.shape      # Save the shape of H
-		H = H_ND.ravel()        # and make H 1D for easy shape maniplation
-		L_C = len(sigma)
-		outshape = (L_C,) + H_shape
-		S = -1.0 + (0.5+np.arange(L_C))/L_C 
-		A = (S - sigma)[:, None]
-		B = np.outer(sigma, H)
-		self.z_rho_tot = (A + B).reshape(outshape)  
+		# Depth of sigma levels for whole domain, computed once
+		if not hasattr(self, 'z_rho_tot'):
+			sigma = np.asarray(self.sigma)
+			H_ND = np.asarray(self.depth)
+
+			layers = self.num_layers - 1  # surface layer
+			H_shape = H_ND.shape      # Save the shape of H
+			H = H_ND.ravel()        # and make H 1D for easy shape maniplation
+			L_C = len(sigma)
+			outshape = (L_C,) + H_shape
+			S = -1.0 + (0.5+np.arange(L_C))/L_C 
+			A = (S - sigma)[:, None]
+			B = np.outer(sigma, H)
+			self.z_rho_tot = (A + B).reshape(outshape)  
 
 ##################################################################################################################################
 		mask_values = {}
@@ -380,35 +385,30 @@ class Reader(BaseReader,StructuredReader):
 				if len(np.atleast_1d(indz)) >= 1:
 					logger.debug('sigma to z for ' + varname[0])
 					if self.precalculate_s2z_coefficients is True: 
-
-						y_depth = self.Dataset.variables['depth'].shape[0] #Positions of depth by Y
-						x_depth = self.Dataset.variables['depth'].shape[1] #Positions of depth by X
-						L_Y = y_depth #len(y_depth)
-						L_X = x_depth #len(x_depth) 
-						L_Z = len(self.z_rho_tot)
-
-						logger.debug('Calculating sigma2z-coefficients for whole domain')
-						starttime = datetime.now()
-						dummyvar = np.ones((L_Z, L_Y, L_X))
-						dummy, self.s2z_total = depth_ECOM.multi_zslice(dummyvar, self.z_rho_tot, self.zlevels)
-						# Store arrays/coefficients
-						self.s2z_A = self.s2z_total[0].reshape(len(self.zlevels), L_Y, L_X)
-						self.s2z_C = self.s2z_total[1].reshape(len(self.zlevels), L_Y, L_X)
-						self.s2z_I = self.s2z_total[2].reshape(L_Y, L_X)
-						self.s2z_kmax = self.s2z_total[3]
-						del self.s2z_total  # Free memory
-						logger.info('Time: ' + str(datetime.now() - starttime))	
+						if not hasattr(self, 's2z_A'):
+							y_depth = self.Dataset.variables['depth'].shape[0] #Positions of depth by Y
+							x_depth = self.Dataset.variables['depth'].shape[1] #Positions of depth by X
+							L_Y = y_depth #len(y_depth)
+							L_X = x_depth #len(x_depth) 
+							L_Z = len(self.z_rho_tot)
+
+							logger.debug('Calculating sigma2z-coefficients for whole domain')
+							starttime = datetime.now()
+							dummyvar = np.ones((L_Z, L_Y, L_X))
+							dummy, self.s2z_total = depth_ECOM.multi_zslice(dummyvar, self.z_rho_tot, self.zlevels)
+							# Store arrays/coefficients
+							self.s2z_A = self.s2z_total[0].reshape(len(self.zlevels), L_Y, L_X)
+							self.s2z_C = self.s2z_total[1].reshape(len(self.zlevels), L_Y, L_X)
+							self.s2z_I = self.s2z_total[2].reshape(L_Y, L_X)
+							self.s2z_kmax = self.s2z_total[3]
+							del self.s2z_total  # Free memory
+							logger.info('Time: ' + str(datetime.now() - starttime))
 						zle = np.arange(zi1, zi2)
 						
 						#print("zle==",zle)
-						A = self.s2z_A.copy()  # Awkward subsetting to prevent losing one dimension
-						A = A[:,:,indx]
-						A = A[:,indy,:]
-						A = A[zle,:,:]
-						C = self.s2z_C.copy()
-						C = C[:,:,indx]
-						C = C[:,indy,:]
-						C = C[zle,:,:]
+						# Coefficients of block, at the requested z-levels
+						A = self.s2z_A[np.ix_(zle, indy, indx)]
+						C = self.s2z_C[np.ix_(zle, indy, indx)]
 						#print("C ==", C)
 						C = C - C.max() + variables[par].shape[0] -1
 						C[C<1] = 1
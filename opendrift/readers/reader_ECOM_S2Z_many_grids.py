@@ -22,6 +22,7 @@ logger = logging.getLogger(__name__)
 
 from netCDF4 import num2date
 import xarray as xr
+from opendrift.locks import netcdf_locked, netcdf4_locked
 from opendrift.readers.basereader import BaseReader, vector_pairs_xy, StructuredReader
 
 from opendrift.readers.ECOM_dependencies import depth_ECOM, work_model_grid
@@ -31,6 +32,13 @@ from opendrift.readers.ECOM_dependencies import depth_ECOM, work_model_grid
 
 class Reader(BaseReader,StructuredReader):
 
+	# Attributes derived from dataset, which are stored in metadata cache
+	# (see `BaseReader.metadata_cache_dir`)
+	metadata_attributes = [
+		'ECOM_variable_mapping', 'sigma', 'num_layers', 'depth', 'lon', 'lat',
+		'times', 'start_time', 'end_time', 'time_step', 'name',
+		'precalculate_s2z_coefficients', 'variables']
+
 	def __init__(self, filename=None, name=None, gridfile=None):
 
 		if filename is None:
@@ -86,11 +94,11 @@ class Reader(BaseReader,StructuredReader):
 					return ds
 
 				if has_xarray is True:
-					print("Opening with MFDataset and concat dim time")
+					logger.debug("Opening with MFDataset and concat dim time")
 					self.Dataset_1 = xr.open_mfdataset(filename,
 						chunks={'time': 1}, concat_dim='time')
 
-					print("dataset ==", self.Dataset_1)
+					logger.debug("dataset == %s", self.Dataset_1)
 					self.grid = []
 
 					if 'xpos' in self.Dataset_1:
@@ -105,12 +113,12 @@ class Reader(BaseReader,StructuredReader):
 						if len(self.x) == 152:
 							self.Dataset = work_model_grid.fix_ds_other(self.Dataset_3.copy())
 							self.zlevels = np.array([0.0000,-5.000,-10.0000,-15.0000,-20.0000])
-							print("Using Cananeia grid in spite of SBB")
+							logger.debug("Using Cananeia grid in spite of SBB")
 							self.grid.append('cananeia')
 						elif len(self.x) > 290:
 							self.Dataset = work_model_grid.fix_ds_other_2(self.Dataset_3.copy())
 							self.zlevels = np.array([0.0000,-5.000,-10.0000,-15.0000,-20.0000])
-							print("Using SESSVB grid in spite of SBB or Cananeia")
+							logger.debug("Using SESSVB grid in spite of SBB or Cananeia")
 							self.grid.append('sessvb')
 
 						else:
@@ -124,7 +132,7 @@ class Reader(BaseReader,StructuredReader):
 							#self.Dataset_3 = self.Dataset_1
 							self.Dataset = work_model_grid.fix_ds(self.Dataset_3.copy())
 							self.zlevels = np.array([0, -5, -10, -15, -25,-30, -50, -75, -100, -150, -200,-250, -300, -400, -500, -600, -700, -800, -900, -1000, -1500,-2000])
-							print("Using SBB grid")
+							logger.debug("Using SBB grid")
 							self.grid.append('sbb')
 
 					#if x is the zonal coordinate (new version from ECOM)
@@ -133,12 +141,12 @@ class Reader(BaseReader,StructuredReader):
 						if len(self.x) == 152:
 							self.Dataset = work_model_grid.fix_ds_other(self.Dataset_1.copy())
 							self.zlevels = np.array([0.0000,-5.000,-10.0000,-15.0000,-20.0000])
-							print("Using Cananeia grid in spite of SBB")
+							logger.debug("Using Cananeia grid in spite of SBB")
 							self.grid.append('cananeia')
 						elif len(self.x) > 290:
 							self.Dataset = work_model_grid.fix_ds_other_2(self.Dataset_1.copy())
 							self.zlevels = np.array([0.0000,-5.000,-10.0000,-15.0000,-20.0000])
-							print("Using SESSVB grid in spite of SBB or Cananeia")
+							logger.debug("Using SESSVB grid in spite of SBB or Cananeia")
 							self.grid.append('sessvb')
 
 						else:							
@@ -147,14 +155,14 @@ class Reader(BaseReader,StructuredReader):
 
 							self.Dataset = work_model_grid.fix_ds(self.Dataset_1.copy())
 							self.zlevels = np.array([0, -5, -10, -15, -25,-30, -50, -75, -100, -150, -200,-250, -300, -400, -500, -600, -700, -800, -900, -1000, -1500,-2000])
-							print("Using SBB grid")
+							logger.debug("Using SBB grid")
 							self.grid.append('sbb')
 			else:
 				#logger.info('Opening file with Dataset')
 				if has_xarray is True:
 					#Inserted function that work the zeros values in ECOM outputs of lat and lon
 					self.Dataset_1 = xr.open_dataset(filename)
-					print("dataset ==", self.Dataset_1)
+					logger.debug("dataset == %s", self.Dataset_1)
 					self.grid = []
 
 					if 'xpos' in self.Dataset_1:
@@ -165,35 +173,35 @@ class Reader(BaseReader,StructuredReader):
 						self.Dataset_3 = self.Dataset_3.drop(labels='corn_lon')
 						self.Dataset_3 = self.Dataset_3.drop(labels='corn_lat')
 						self.x = self.Dataset_3.variables['x']
-						print("Done with the renaming of the old version")
-						print("x coordinates are:", self.x)
+						logger.debug("Done with the renaming of the old version")
+						logger.debug("x coordinates are: %s", self.x)
 
 						if len(self.x) == 152:
 							self.Dataset = work_model_grid.fix_ds_other(self.Dataset_3.copy())
 							self.zlevels = np.array([0.0000,-5.000,-10.0000,-15.0000,-20.0000])
-							print("Using Cananeia grid in spite of SBB")
+							logger.debug("Using Cananeia grid in spite of SBB")
 							self.grid.append('cananeia')
 						elif len(self.x) > 290:
 							self.Dataset = work_model_grid.fix_ds_other_2(self.Dataset_3.copy())
 							self.zlevels = np.array([0.0000,-5.000,-10.0000,-15.0000,-20.0000])
-							print("Using SESSVB grid in spite of SBB or Cananeia")
+							logger.debug("Using SESSVB grid in spite of SBB or Cananeia")
 							self.grid.append('sessvb')
 
 						else:
 							if 'xpos' and 'x' in self.Dataset_1:
 								self.x = self.Dataset_1.variables['xpos']
 								self.y = self.Dataset_1.variables['ypos']
-								print("Both xpos and x were in cdf")
+								logger.debug("Both xpos and x were in cdf")
 
 							else:
-								print("Aquiring x and y from renamed coordinates")
+								logger.debug("Aquiring x and y from renamed coordinates")
 								self.x = self.Dataset_3.variables['x']
 								self.y = self.Dataset_3.variables['y']
 
 							#self.Dataset_3 = self.Dataset_1
 							self.Dataset = work_model_grid.fix_ds(self.Dataset_3.copy())
 							self.zlevels = np.array([0, -5, -10, -15, -25,-30, -50, -75, -100, -150, -200,-250, -300, -400, -500, -600, -700, -800, -900, -1000, -1500,-2000])
-							print("Using SBB grid")
+							logger.debug("Using SBB grid")
 							self.grid.append('sbb')
 
 					#if x is the zonal coordinate (new version from ECOM)
@@ -202,12 +210,12 @@ class Reader(BaseReader,StructuredReader):
 						if len(self.x) == 152:
 							self.Dataset = work_model_grid.fix_ds_other(self.Dataset_1.copy())
 							self.zlevels = np.array([0.0000,-5.000,-10.0000,-15.0000,-20.0000])
-							print("Using Cananeia grid in spite of SBB")
+							logger.debug("Using Cananeia grid in spite of SBB")
 							self.grid.append('cananeia')
 						elif len(self.x) > 290:
 							self.Dataset = work_model_grid.fix_ds_other_2(self.Dataset_1.copy())
 							self.zlevels = np.array([0.0000,-5.000,-10.0000,-15.0000,-20.0000])
-							print("Using SESSVB grid in spite of SBB or Cananeia")
+							logger.debug("Using SESSVB grid in spite of SBB or Cananeia")
 							self.grid.append('sessvb')
 
 						else:							
@@ -216,16 +224,27 @@ class Reader(BaseReader,StructuredReader):
 
 							self.Dataset = work_model_grid.fix_ds(self.Dataset_1.copy())
 							self.zlevels = np.array([0, -5, -10, -15, -25,-30, -50, -75, -100, -150, -200,-250, -300, -400, -500, -600, -700, -800, -900, -1000, -1500,-2000])
-							print("Using SBB grid")
+							logger.debug("Using SBB grid")
 							self.grid.append('sbb')
 					
 				else:
-					print("Has no Xarray")
-					self.Dataset = Dataset(filename, 'r')
+					logger.debug("Has no Xarray")
+					with netcdf_locked():
+						self.Dataset = Dataset(filename, 'r')
 		except Exception as e:
 			raise ValueError('e')
 
-		print("The grid is", self.grid)
+		logger.debug("The grid is %s", self.grid)
+		if not self._load_metadata_cache_([filename, gridfile], self.grid):
+			self._read_metadata(filename, gridfile)
+			self._store_metadata_cache_(*self.metadata_attributes)
+			self._write_metadata_cache_()
+
+		# Run constructor of parent Reader class
+		super(Reader, self).__init__()
+
+	def _read_metadata(self, filename, gridfile):
+		"""Read vertical coordinates, grid, times and variables of dataset."""
 		if 'sigma' not in self.Dataset.variables:
 			dimensions = 2
 		else:
@@ -271,22 +290,22 @@ class Reader(BaseReader,StructuredReader):
 
 			# Horizontal coordinates and directions
 			self.lat = self.Dataset.variables['lat']
-			print("LAT==",self.lat)
-			print("Shape of lat==",self.lat.shape)
+			logger.debug("LAT== %s", self.lat)
+			logger.debug("Shape of lat== %s", self.lat.shape)
 
 			self.lon = self.Dataset.variables['lon']
-			print("LON==",self.lon)
-			print("Shape of lon==",self.lon.shape)
-			print("Ndim of depth:",self.depth.ndim)
+			logger.debug("LON== %s", self.lon)
+			logger.debug("Shape of lon== %s", self.lon.shape)
+			logger.debug("Ndim of depth: %s", self.depth.ndim)
 			if self.depth.ndim >=3:
-				print("Getting just one time of depth")
+				logger.debug("Getting just one time of depth")
 				self.depth = self.depth[0,:,:]
-				print("New ndim of depth:", self.depth.ndim)
+				logger.debug("New ndim of depth: %s", self.depth.ndim)
 
 			self.depth = ma.masked_where(self.depth<0, self.depth)
-			print("Depth:", self.depth)
-			print("min depth", np.nanmin(self.depth))
-			print("max depth", np.nanmax(self.depth))
+			logger.debug("Depth: %s", self.depth)
+			logger.debug("min depth %s", np.nanmin(self.depth))
+			logger.debug("max depth %s", np.nanmax(self.depth))
 			
 		else:
 			if gridfile is None:
@@ -295,9 +314,9 @@ class Reader(BaseReader,StructuredReader):
 								 '"gridfile=<grid_file>"')
 
 			else:
-				gf = Dataset(gridfile)
-				self.lat = gf.variables['lat'][:]
-				self.lon = gf.variables['lon'][:]
+				with netcdf_locked(), Dataset(gridfile) as gf:
+					self.lat = gf.variables['lat'][:]
+					self.lon = gf.variables['lon'][:]
 
 		# Get time coverage
 
@@ -337,13 +356,10 @@ class Reader(BaseReader,StructuredReader):
 			if var_name in self.ECOM_variable_mapping.keys():
 				var = self.Dataset.variables[var_name]
 				self.variables.append(self.ECOM_variable_mapping[var_name])
-		print("variables with standard name:", self.variables)
-		# Run constructor of parent Reader class
-
-
-		super(Reader, self).__init__()
+		logger.debug("variables with standard name: %s", self.variables)
 
 
+	@netcdf4_locked
 	def get_variables(self, requested_variables, time=None,
 					  x=None, y=None, z=None):
 
@@ -373,10 +389,10 @@ class Reader(BaseReader,StructuredReader):
 		else: clipped = 0
 		indx_i = np.floor((x-self.xmin)/self.delta_x).astype(int) + clipped 
 		indy_i = np.floor((y-self.ymin)/self.delta_y).astype(int) + clipped 
-		print ("indx_init ==", indx_i)
-		print ("indy_init ==", indy_i)
+		logger.debug("indx_init == %s", indx_i)
+		logger.debug("indy_init == %s", indy_i)
 
-		print("grid to use:", self.grid[0])
+		logger.debug("grid to use: %s", self.grid[0])
 
 		
 		buffer = self.buffer
@@ -385,49 +401,42 @@ class Reader(BaseReader,StructuredReader):
 		indy = np.arange(np.max([0, indy_i.min()-buffer]),
 							np.min([indy_i.max()+buffer, self.lon.shape[0]]))
 
-		print("Buffer ==",buffer)		
-		print ("indx ==", indx)
-		print ("indy ==", indy)
-		print ("indx_min ==", indx.min())
-		print ("indy_min ==", indy.min())
-		print ("indx_max ==", indx.max())
-		print ("indy_max ==", indy.max())
+		logger.debug("Buffer == %s", buffer)
+		logger.debug("indx == %s", indx)
+		logger.debug("indy == %s", indy)
+		logger.debug("indx_min == %s", indx.min())
+		logger.debug("indy_min == %s", indy.min())
+		logger.debug("indx_max == %s", indx.max())
+		logger.debug("indy_max == %s", indy.max())
 
 
 	
 ###########----Working with z:-------##################################
-		print("Reading sigma levels")
+		logger.debug("Reading sigma levels")
 
 		self.sigma = self.Dataset.variables['sigma']
-		print("Amount of Sigma levels:", len(self.sigma))
-
-		def find_nearest(array, value):
-			array = np.asarray(array)
-
-			idx = (np.abs(array - value)).argmin()
-
-			return idx
+		logger.debug("Amount of Sigma levels: %s", len(self.sigma))
 
 	
 		if not hasattr(self, 'z') and (z is not None):  #if z is not in netcdf, but is requested: 
-			print ("Z has been requested. Searching the nearest value inside z range ... ", z)
-			print("Depth(s) requested are:",z)
+			logger.debug("Z has been requested. Searching the nearest value inside z range ... %s", z)
+			logger.debug("Depth(s) requested are: %s", z)
 	
 			if len(self.sigma) == 1:
-				print("Sigma has only one value. Setting it to surface")
+				logger.debug("Sigma has only one value. Setting it to surface")
 				dz = np.array([0.0000,0.0000])
-				indz_i = np.asarray([find_nearest(dz, value) for value in z])
-				print("indz_i ==", indz_i)
+				indz_i = depth_ECOM.nearest_level(dz, z)
+				logger.debug("indz_i == %s", indz_i)
 				indz = range(0,1)
-				print("indz:", indz)
+				logger.debug("indz: %s", indz)
 				zi1 = 0
 				zi2 = 0
 				variables['z'] = np.zeros(2)
 
 			else:
 				dz = self.zlevels
-				indz_i = np.asarray([find_nearest(dz, value) for value in z])
-				print("indz_i ==", indz_i)
+				indz_i = depth_ECOM.nearest_level(dz, z)
+				logger.debug("indz_i == %s", indz_i)
 			
 			
 				if (indz_i.max() + self.verticalbuffer) == 1:
@@ -437,14 +446,14 @@ class Reader(BaseReader,StructuredReader):
 								np.minimum(self.num_layers,
 										indz_i.max() + self.verticalbuffer))	
 							
-				print ("indz ==", indz)
-				print("len de indz ==", len(indz))
+				logger.debug("indz == %s", indz)
+				logger.debug("len de indz == %s", len(indz))
 			
 				zi1_aux = np.maximum(0, bisect_left(-np.array(self.zlevels),-z.max()))
 				zi2_aux = np.minimum(len(self.zlevels),bisect_right(-np.array(self.zlevels),-z.min()))
 		
 				if zi1_aux == zi2_aux:
-					print("Using auxiliar zi1 and zi2")
+					logger.debug("Using auxiliar zi1 and zi2")
 					if zi1_aux == 0:
 						zi1 = 0
 						zi2 = zi2_aux +1
@@ -457,8 +466,8 @@ class Reader(BaseReader,StructuredReader):
 					zi2 = zi2_aux
 			
 		
-				print("Z1 ==", zi1)
-				print("Z2 ==", zi2)
+				logger.debug("Z1 == %s", zi1)
+				logger.debug("Z2 == %s", zi2)
 		
 				variables['z'] = np.array(self.zlevels[zi1:(zi2)])
 		
@@ -466,31 +475,32 @@ class Reader(BaseReader,StructuredReader):
 					variables['z'] = np.array(self.zlevels[zi1:(zi2 +1)])
 	
 		else:
-			print("Z has not been requested. Setting it as 0")
+			logger.debug("Z has not been requested. Setting it as 0")
 			indz = range(0,2)
 			variables['z'] = np.array(self.zlevels[0:2])
 
-		print("VAR_Z ==", variables['z'])
+		logger.debug("VAR_Z == %s", variables['z'])
 ##################################################################################################################################
 #########################---This must be done to work with sigma ----###############################################
 ##################################################################################################################################
 
-		# Find depth levels covering all elements 
-		sigma = np.asarray(self.sigma)
-		H_ND = np.asarray(self.depth)
-		if len(self.sigma) ==1 :
-			layers = 1
-		else:
-			layers = self.num_layers - 1  # surface layer
+		# Depth of sigma levels for whole domain, computed once
+		if not hasattr(self, 'z_rho_tot'):
+			sigma = np.asarray(self.sigma)
+			H_ND = np.asarray(self.depth)
+			if len(self.sigma) ==1 :
+				layers = 1
+			else:
+				layers = self.num_layers - 1  # surface layer
 		
-		H_shape = H_ND.shape      # Save the shape of H
-		H = H_ND.ravel()        # and make H 1D for easy shape maniplation
-		L_C = len(sigma)
-		outshape = (L_C,) + H_shape
-		S = -1.0 + (0.5+np.arange(L_C))/L_C 
-		A = (S - sigma)[:, None]
-		B = np.outer(sigma, H)
-		self.z_rho_tot = (A + B).reshape(outshape)  
+			H_shape = H_ND.shape      # Save the shape of H
+			H = H_ND.ravel()        # and make H 1D for easy shape maniplation
+			L_C = len(sigma)
+			outshape = (L_C,) + H_shape
+			S = -1.0 + (0.5+np.arange(L_C))/L_C 
+			A = (S - sigma)[:, None]
+			B = np.outer(sigma, H)
+			self.z_rho_tot = (A + B).reshape(outshape)  
 
 ##################################################################################################################################
 		mask_values = {}
@@ -500,33 +510,32 @@ class Reader(BaseReader,StructuredReader):
 			var = self.Dataset.variables[varname[0]]
 
 			if par == 'land_binary_mask':
-				print("Using land_binary_mask from the Eulerian Model!!")
+				logger.debug("Using land_binary_mask from the Eulerian Model!!")
 
 				if self.grid[0] == 'cananeia':
-					print("Correcting river points at Cananeia grid")
+					logger.debug("Correcting river points at Cananeia grid")
 					self.Dataset.variables['FSM'][309:314,0] = 1
-					print("New river top fsm",self.Dataset.variables['FSM'][309:314,0] )
 
 				#self.land_binary_mask = np.absolute(1 - self.Dataset.variables['FSM']) #for some reason the values are inverted, so, lets change ir
 				self.land_binary_mask = self.Dataset.variables['FSM'] 
 
-				print("land_binary_mask ==", self.land_binary_mask)
-				print("land binary mask SHAPE:", self.land_binary_mask.shape)
+				logger.debug("land_binary_mask == %s", self.land_binary_mask)
+				logger.debug("land binary mask SHAPE: %s", self.land_binary_mask.shape)
 
 				variables[par] = self.land_binary_mask[indy,indx]
 
-				print("PAR SHAPE land_binary_mask ==", variables[par].shape)
-				print("PAR NDIM land_binary_mask ==", variables[par].ndim)
+				logger.debug("PAR SHAPE land_binary_mask == %s", variables[par].shape)
+				logger.debug("PAR NDIM land_binary_mask == %s", variables[par].ndim)
 
 			elif var.ndim == 2:
 				variables[par] = var[indy, indx]
 
 			elif var.ndim == 3:
-				print("Retrieving 3D variables")
+				logger.debug("Retrieving 3D variables")
 				variables[par] = var[indxTime, indy, indx]
 
 			elif var.ndim == 4:
-				print("Retrieving 4D variables")
+				logger.debug("Retrieving 4D variables")
 				
 				if len(self.sigma) == 1:
 					variables[par] = var[indxTime, 0, indy, indx]
@@ -548,7 +557,7 @@ class Reader(BaseReader,StructuredReader):
 						if 'DUM' in self.Dataset.variables:
 							
 							self.mask_u =self.Dataset.variables['DUM']
-							print("using DUM at invalid x_sea_water_velocity with ndim:",self.mask_u.ndim)
+							logger.debug("using DUM at invalid x_sea_water_velocity with ndim: %s", self.mask_u.ndim)
 							if self.mask_u.ndim > 2:
 								self.mask_u = self.mask_u[0]
 							if self.grid[0] == 'cananeia':
@@ -561,7 +570,7 @@ class Reader(BaseReader,StructuredReader):
 						if 'DVM' in self.Dataset.variables:
 							
 							self.mask_v =self.Dataset.variables['DVM']
-							print("using DVM at invalid y_sea_water_velocity with ndim:",self.mask_v.ndim)
+							logger.debug("using DVM at invalid y_sea_water_velocity with ndim: %s", self.mask_v.ndim)
 							if self.mask_v.ndim > 2:
 								self.mask_v = self.mask_v[0]
 							if self.grid[0] == 'cananeia':
@@ -596,37 +605,35 @@ class Reader(BaseReader,StructuredReader):
 					if len(np.atleast_1d(indz)) >= 1:
 						logger.debug('sigma to z for ' + varname[0])
 						if self.precalculate_s2z_coefficients is True: 	
-							#y_depth = self.Dataset.variables['depth'].shape[0] #Positions of depth by Y
-							#x_depth = self.Dataset.variables['depth'].shape[1] #Positions of depth by X
-							y_depth = self.depth.shape[0] #Positions of depth by Y
-							x_depth = self.depth.shape[1] #Positions of depth by X
-							L_Y = y_depth #len(y_depth)
-							L_X = x_depth #len(x_depth) 
-							L_Z = len(self.z_rho_tot)	
-							logger.debug('Calculating sigma2z-coefficients for whole domain')
-							starttime = datetime.now()
-							dummyvar = np.ones((L_Z, L_Y, L_X))
-							dummy, self.s2z_total = depth_ECOM.multi_zslice(dummyvar, self.z_rho_tot, self.zlevels)
-							# Store arrays/coefficients
-							self.s2z_A = self.s2z_total[0].reshape(len(self.zlevels), L_Y, L_X)
-							self.s2z_C = self.s2z_total[1].reshape(len(self.zlevels), L_Y, L_X)
-							self.s2z_I = self.s2z_total[2].reshape(L_Y, L_X)
-							self.s2z_kmax = self.s2z_total[3]
-							del self.s2z_total  # Free memory
-							logger.info('Time: ' + str(datetime.now() - starttime))	
+							if not hasattr(self, 's2z_A'):
+								#y_depth = self.Dataset.variables['depth'].shape[0] #Positions of depth by Y
+								#x_depth = self.Dataset.variables['depth'].shape[1] #Positions of depth by X
+								y_depth = self.depth.shape[0] #Positions of depth by Y
+								x_depth = self.depth.shape[1] #Positions of depth by X
+								L_Y = y_depth #len(y_depth)
+								L_X = x_depth #len(x_depth) 
+								L_Z = len(self.z_rho_tot)	
+								logger.debug('Calculating sigma2z-coefficients for whole domain')
+								starttime = datetime.now()
+								dummyvar = np.ones((L_Z, L_Y, L_X))
+								dummy, self.s2z_total = depth_ECOM.multi_zslice(dummyvar, self.z_rho_tot, self.zlevels)
+								# Store arrays/coefficients
+								self.s2z_A = self.s2z_total[0].reshape(len(self.zlevels), L_Y, L_X)
+								self.s2z_C = self.s2z_total[1].reshape(len(self.zlevels), L_Y, L_X)
+								self.s2z_I = self.s2z_total[2].reshape(L_Y, L_X)
+								self.s2z_kmax = self.s2z_total[3]
+								del self.s2z_total  # Free memory
+								logger.info('Time: ' + str(datetime.now() - starttime))
+								self._store_metadata_cache_(
+									'z_rho_tot', 's2z_A', 's2z_C', 's2z_I', 's2z_kmax')
 							if zi2 == 1:
 								zle = np.arange(zi1, zi2+1)
 							else:
 								zle = np.arange(zi1, zi2)							
 							#print("zle==",zle)
-							A = self.s2z_A.copy()  # Awkward subsetting to prevent losing one dimension
-							A = A[:,:,indx]
-							A = A[:,indy,:]
-							A = A[zle,:,:]
-							C = self.s2z_C.copy()
-							C = C[:,:,indx]
-							C = C[:,indy,:]
-							C = C[zle,:,:]
+							# Coefficients of block, at the requested z-levels
+							A = self.s2z_A[np.ix_(zle, indy, indx)]
+							C = self.s2z_C[np.ix_(zle, indy, indx)]
 							#print("C ==", C)
 							C = C - C.max() + variables[par].shape[0] -1
 							C[C<1] = 1
@@ -660,16 +667,16 @@ class Reader(BaseReader,StructuredReader):
 						variables[par][variables[par]>1e+9] = np.nan
 						#print("Type var_par ==", type(variables[par]))
 
-			print("Len of indz after sigma to z:", len(indz))
-			print("Var ndim ==", variables[par].ndim)
+			logger.debug("Len of indz after sigma to z: %s", len(indz))
+			logger.debug("Var ndim == %s", variables[par].ndim)
 
 
 			if len(indz)<=var.ndim:			
 				if variables[par].ndim > 1:
 					variables[par] = variables[par].diagonal()
-					print("Var ndim after diag==", variables[par].ndim)					
+					logger.debug("Var ndim after diag== %s", variables[par].ndim)
 			else:
-				print("Variables good to go at right dimension")
+				logger.debug("Variables good to go at right dimension")
 				variables[par] = variables[par]				
 			
 			# Mask values outside domain			
@@ -688,17 +695,17 @@ class Reader(BaseReader,StructuredReader):
 
 
 		if 'sea_floor_depth_below_sea_level' in requested_variables:
-			print("Retrieving sea floor depth below sea level")
+			logger.debug("Retrieving sea floor depth below sea level")
 			variables['sea_floor_depth_below_sea_level'] = self.depth
 
 		if 'land_binary_mask' in requested_variables:
-			print("Using land_binary_mask from ECOM output")
+			logger.debug("Using land_binary_mask from ECOM output")
 
 			variables['land_binary_mask'] = self.land_binary_mask[indy,indx]
 	
-			print("Final land_binary_mask:", variables['land_binary_mask'])
-			print("Type of final land_binary_mask:", type(variables['land_binary_mask']))
-			print("Shape of final land_binary_mask:", variables['land_binary_mask'].shape)
+			logger.debug("Final land_binary_mask: %s", variables['land_binary_mask'])
+			logger.debug("Type of final land_binary_mask: %s", type(variables['land_binary_mask']))
+			logger.debug("Shape of final land_binary_mask: %s", variables['land_binary_mask'].shape)
 
 		
 
@@ -707,11 +714,12 @@ class Reader(BaseReader,StructuredReader):
 			variables[var] = np.ma.masked_invalid(variables[var])
 
 			if 'x_sea_water_velocity' or 'x_wind' in variables.keys():
-				print("Retrieving velocities")
+				logger.debug("Retrieving velocities")
 
 
 		logger.debug('Time for ECOM reader: ' + str(datetime.now()-start_time))
 
+		self._write_metadata_cache_()
 		return variables
 
 #This follow function is not to be used at the SBB grid.
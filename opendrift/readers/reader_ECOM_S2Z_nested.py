@@ -0,0 +1,313 @@
+'''
+Reader of nested ECOM grids (e.g. Cananeia, SBB and SESSVB)
+Holds the reader of each grid, and provides each element with the
+variables of the finest grid covering it
+'''
+# This file is part of OpenDrift.
+#
+# OpenDrift is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 2
+#
+# OpenDrift is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OpenDrift.  If not, see <https://www.gnu.org/licenses/>.
+
+import numpy as np
+from matplotlib.path import Path
+from scipy.ndimage import binary_dilation
+
+import logging
+logger = logging.getLogger(__name__)
+
+from opendrift.readers.basereader import BaseReader, ContinuousReader
+
+
+class GridFootprint:
+	"""Footprint (boundary polygon in lon/lat) of the grid of a reader.
+
+	Positions are located with a raster over the footprint, where each
+	cell is either outside (0), inside (1) or on the boundary (2) of the
+	footprint. Only positions in boundary cells are tested against the
+	polygon. The raster cells are at least as large as the spacing of the
+	boundary vertices, so that the cells crossed by the boundary are the
+	cells with a vertex, and their neighbours.
+	"""
+
+	outside, inside, boundary = 0, 1, 2
+
+	def __init__(self, lon, lat, max_cells=1000000):
+		lon = np.asarray(lon, dtype=np.float64)
+		lat = np.asarray(lat, dtype=np.float64)
+		valid = np.isfinite(lon) & np.isfinite(lat)
+		lon, lat = lon[valid], lat[valid]
+		# Longitudes made continuous along boundary, and centred around
+		# lon0, to which positions are shifted before lookup
+		lon = np.degrees(np.unwrap(np.radians(lon)))
+		self.lon0 = (lon.min() + lon.max()) / 2.
+		self.path = Path(np.column_stack((lon, lat)))
+
+		spacing = np.maximum(np.abs(np.diff(lon)).max(initial=0),
+							 np.abs(np.diff(lat)).max(initial=0))
+		self.lonmin, self.latmin = lon.min(), lat.min()
+		width, height = lon.max() - self.lonmin, lat.max() - self.latmin
+		spacing = np.maximum(spacing, np.sqrt(width*height/max_cells))
+		self.delta = np.maximum(spacing, 1e-6)
+		nx = int(np.ceil(width/self.delta)) + 1
+		ny = int(np.ceil(height/self.delta)) + 1
+
+		crossed = np.zeros((ny, nx), dtype=bool)
+		i, j = self._cells(lon, lat)
+		crossed[j, i] = True
+		crossed = binary_dilation(crossed, np.ones((3, 3), dtype=bool))
+		jc, ic = np.mgrid[0:ny, 0:nx]
+		centres = np.column_stack(((ic.ravel() + .5)*self.delta + self.lonmin,
+								   (jc.ravel() + .5)*self.delta + self.latmin))
+		self.raster = np.where(
+			self.path.contains_points(centres).reshape(ny, nx),
+			self.inside, self.outside).astype(np.uint8)
+		self.raster[crossed] = self.boundary
+
+	def _cells(self, lon, lat):
+		return (np.floor((lon - self.lonmin)/self.delta).astype(int),
+				np.floor((lat - self.latmin)/self.delta).astype(int))
+
+	def contains(self, lon, lat):
+		"""Return boolean array, True for positions inside footprint."""
+		lon = (np.asarray(lon) - self.lon0 + 180.) % 360. - 180. + self.lon0
+		lat = np.asarray(lat)
+		contains = np.zeros(lon.shape, dtype=bool)
+		finite = np.isfinite(lon) & np.isfinite(lat)
+		i, j = self._cells(np.where(finite, lon, self.lonmin),
+						   np.where(finite, lat, self.latmin))
+		ny, nx = self.raster.shape
+		inraster = finite & (i >= 0) & (i < nx) & (j >= 0) & (j < ny)
+		state = np.full(lon.shape, self.outside, dtype=np.uint8)
+		state[inraster] = self.raster[j[inraster], i[inraster]]
+		contains[state == self.inside] = True
+		test = np.flatnonzero(state == self.boundary)
+		if len(test) > 0:
+			contains[test] = self.path.contains_points(
+				np.column_stack((lon[test], lat[test])))
+		return contains
+
+
+class Reader(BaseReader, ContinuousReader):
+	"""Nested grids, each element taking values from the finest grid.
+
+	Alternative to adding the reader of each grid to the simulation,
+	where every reader is called for every element not covered by the
+	previous readers. Here the footprint of each grid is indexed once, each
+	element is dispatched to the finest grid covering it, and each grid is
+	called once per time step with all its elements (one data block per
+	grid). Elements with invalid values from a grid (e.g. at its boundary
+	or land mask) are passed on to the next grid covering them.
+
+	Arguments:
+		readers: list of readers (or filenames of ECOM files, opened with
+			:class:`.reader_ECOM_S2Z_many_grids.Reader`), one for each grid.
+			Grids are ordered by pixel size, finest first.
+		name: name of reader.
+		max_cells: maximum number of cells of the raster indexing the
+			footprint of each grid.
+	"""
+
+	def __init__(self, readers, name=None, max_cells=1000000):
+
+		readers = list(readers)
+		for i, reader in enumerate(readers):
+			if not isinstance(reader, BaseReader):
+				from opendrift.readers import reader_ECOM_S2Z_many_grids
+				readers[i] = reader_ECOM_S2Z_many_grids.Reader(reader)
+
+		def pixel_size(reader):
+			pixelsize = reader.pixel_size()
+			return np.inf if pixelsize is None else pixelsize
+		self.readers = sorted(readers, key=pixel_size)  # Finest first
+
+		if name is None:
+			self.name = 'nested: ' + ', '.join(r.name for r in self.readers)
+		else:
+			self.name = name
+
+		self.footprints = []
+		for reader in self.readers:
+			logger.debug('Indexing footprint of %s', reader.name)
+			self.footprints.append(GridFootprint(
+				*self._boundary(reader), max_cells=max_cells))
+
+		# Variables provided by all grids
+		self.variables = [v for v in self.readers[0].variables if all(
+			v in r.variables for r in self.readers[1:])]
+		self.variables = list(dict.fromkeys(self.variables))
+
+		starts = [r.start_time for r in self.readers if r.start_time is not None]
+		ends = [r.end_time for r in self.readers if r.end_time is not None]
+		steps = [r.time_step for r in self.readers if r.time_step is not None]
+		self.start_time = min(starts) if len(starts) > 0 else None
+		self.end_time = max(ends) if len(ends) > 0 else None
+		self.time_step = min(steps) if len(steps) > 0 else None
+
+		self.proj4 = '+proj=latlong'
+		path = np.concatenate([f.path.vertices for f in self.footprints])
+		self.xmin, self.ymin = path.min(axis=0)
+		self.xmax, self.ymax = path.max(axis=0)
+
+		# Run constructor of parent Reader class
+		super(Reader, self).__init__()
+
+	@staticmethod
+	def _boundary(reader):
+		"""Return lon, lat of the boundary of the grid of a reader."""
+		if reader.delta_x is None or reader.delta_y is None:
+			raise ValueError('Reader %s has no regular grid' % reader.name)
+		x = np.arange(reader.xmin, reader.xmax + reader.delta_x/2.,
+					  reader.delta_x)
+		y = np.arange(reader.ymin, reader.ymax + reader.delta_y/2.,
+					  reader.delta_y)
+		bx = np.concatenate((x, np.full(len(y), x[-1]), x[::-1],
+							 np.full(len(y), x[0])))
+		by = np.concatenate((np.full(len(x), y[0]), y, np.full(len(x), y[-1]),
+							 y[::-1]))
+		return reader.xy2lonlat(bx, by)
+
+	def dispatch(self, lon, lat, first=0):
+		"""Return index of finest grid covering each position, or -1.
+
+		Only grids from index `first` (scalar or array) are considered.
+		"""
+		lon = np.atleast_1d(lon)
+		lat = np.atleast_1d(lat)
+		first = np.broadcast_to(first, lon.shape)
+		grid = np.full(lon.shape, -1)
+		remaining = np.arange(len(lon))
+		for k, footprint in enumerate(self.footprints):
+			candidates = remaining[first[remaining] <= k]
+			if len(candidates) == 0:
+				continue
+			covered = candidates[footprint.contains(lon[candidates],
+													 lat[candidates])]
+			grid[covered] = k
+			remaining = np.setdiff1d(remaining, covered, assume_unique=True)
+			if len(remaining) == 0:
+				break
+		return grid
+
+	def covers_positions(self, lon, lat, z=0):
+		"""Return indices of input points covered by reader."""
+		lon = np.atleast_1d(lon)
+		lat = np.atleast_1d(lat)
+		indices = np.flatnonzero(self.dispatch(lon, lat) >= 0)
+		return indices, lon[indices], lat[indices]
+
+	def prepare(self, extent, start_time, end_time):
+		for reader in self.readers:
+			reader.prepare(extent=extent, start_time=start_time,
+						   end_time=end_time)
+
+	def set_buffer_size(self, max_speed, max_vertical_speed=None):
+		self.buffer = 0
+		for reader in getattr(self, 'readers', []):
+			reader.set_buffer_size(max_speed, max_vertical_speed)
+
+	def performance(self):
+		outStr = super(Reader, self).performance()
+		for reader in self.readers:
+			outStr += '  %s\n' % reader.name
+			outStr += reader.performance()
+		return outStr
+
+	def get_variables(self, requested_variables, time=None,
+					  x=None, y=None, z=None):
+		env, _ = self.get_variables_interpolated(
+			list(requested_variables), time=time, lon=x, lat=y, z=z)
+		env.update({'time': time, 'x': x, 'y': y, 'z': z})
+		return env
+
+	def get_variables_interpolated(self, variables, profiles=None,
+								   profiles_depth=None, time=None,
+								   lon=None, lat=None, z=None,
+								   rotate_to_proj=None, ids=None):
+		self.timer_start('total')
+		lon = np.atleast_1d(lon)
+		lat = np.atleast_1d(lat)
+		z = np.atleast_1d(z) if z is not None else np.zeros(1)
+		if len(z) == 1:
+			z = z*np.ones(lon.shape)
+
+		env = {var: np.full(len(lon), np.nan) for var in variables}
+		env_profiles = None
+
+		self.timer_start('dispatching')
+		grid = self.dispatch(lon, lat)
+		self.timer_end('dispatching')
+		for k, reader in enumerate(self.readers):
+			ind = np.flatnonzero(grid == k)
+			if len(ind) == 0:
+				continue
+			logger.debug('%i elements from %s', len(ind), reader.name)
+			valid = np.zeros(len(ind), dtype=bool)
+			if reader.covers_time(time):
+				self.timer_start('reading:' + reader.name)
+				try:
+					env_tmp, env_profiles_tmp = \
+						reader.get_variables_interpolated(
+							list(variables), profiles, profiles_depth, time,
+							lon[ind], lat[ind], z[ind], rotate_to_proj,
+							None if ids is None else np.atleast_1d(ids)[ind])
+				except Exception as e:
+					logger.info('Exception from %s: %s', reader.name, e)
+					env_tmp = None
+				self.timer_end('reading:' + reader.name)
+				if env_tmp is not None:
+					valid[:] = True
+					for var in variables:
+						values = np.ma.filled(np.ma.masked_invalid(
+							env_tmp[var][0:len(ind)]).astype(np.float64),
+							np.nan)
+						valid &= np.isfinite(values)
+					for var in variables:
+						env[var][ind[valid]] = np.ma.getdata(
+							env_tmp[var][0:len(ind)])[valid]
+					if profiles is not None and env_profiles_tmp is not None:
+						env_profiles = self._merge_profiles(
+							env_profiles, env_profiles_tmp, profiles,
+							len(lon), ind[valid], valid)
+			# Passing elements without valid values on to coarser grids
+			if not valid.all():
+				redo = ind[~valid]
+				grid[redo] = self.dispatch(lon[redo], lat[redo], first=k + 1)
+
+		for var in variables:
+			env[var] = np.ma.masked_invalid(env[var])
+		self.timer_end('total')
+
+		return env, env_profiles
+
+	@staticmethod
+	def _merge_profiles(env_profiles, env_profiles_tmp, profiles, num,
+						ind, valid):
+		"""Copy profiles of grid to profiles of all elements.
+
+		As in `OpenDriftSimulation.get_environment`, the levels of the
+		first grid providing profiles are used, and the overlapping
+		levels of other grids are copied.
+		"""
+		if env_profiles is None:
+			env_profiles = {'z': env_profiles_tmp['z']}
+		z_ind = np.arange(np.minimum(len(env_profiles['z']),
+									 len(env_profiles_tmp['z'])))
+		for var in profiles:
+			if var not in env_profiles_tmp:
+				continue
+			if var not in env_profiles:
+				env_profiles[var] = np.ma.masked_all(
+					(len(env_profiles['z']), num))
+			values = np.ma.atleast_2d(env_profiles_tmp[var])
+			env_profiles[var][np.ix_(z_ind, ind)] = \
+				values[np.ix_(z_ind, np.flatnonzero(valid))]
+		return env_profiles
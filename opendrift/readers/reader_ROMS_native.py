@@ -20,16 +20,27 @@ import logging
 logger = logging.getLogger(__name__)
 
 import numpy as np
-from netCDF4 import num2date
+from netCDF4 import Dataset, num2date
 import xarray as xr
 
+from opendrift.locks import netcdf_locked
 from opendrift.readers.basereader import BaseReader, vector_pairs_xy, StructuredReader
+from opendrift.readers.basereader.catalog import FileCatalog
 from opendrift.readers.roppy import depth
 
 
 class Reader(BaseReader, StructuredReader):
 
-	def __init__(self, filename=None, name=None, gridfile=None):
+	# Attributes derived from dataset, which are stored in metadata cache
+	# (see `BaseReader.metadata_cache_dir`)
+	metadata_attributes = [
+		'ROMS_variable_mapping', 'Vtransform', 'sigma', 'Cs_r', 'hc',
+		'num_layers', 'lon', 'lat', 'gls_parameters', 'times', 'start_time',
+		'end_time', 'time_step', 'name', 'precalculate_s2z_coefficients',
+		'variables']
+
+	def __init__(self, filename=None, name=None, gridfile=None,
+				 catalog=False):
 
 		if filename is None:
 			raise ValueError('Need filename as argument to constructor')
@@ -79,7 +90,18 @@ class Reader(BaseReader, StructuredReader):
 		try:
 			# Open file, check that everything is ok
 			logger.info('Opening dataset: ' + filestr)
-			if ('*' in filestr) or ('?' in filestr) or ('[' in filestr):
+			if catalog is True and (('*' in filestr) or ('?' in filestr) or
+									('[' in filestr)):
+				# Files are opened only when their time steps are needed
+				logger.info('Making catalog of files')
+				self.catalog = FileCatalog(
+					filestr,
+					lambda f: xr.open_dataset(f, decode_times=False),
+					cache_dir=self.metadata_cache_dir,
+					decode_times=self._decode_times_)
+				self.Dataset = xr.open_dataset(self.catalog.files[0],
+											   decode_times=False)
+			elif ('*' in filestr) or ('?' in filestr) or ('[' in filestr):
 				logger.info('Opening files with MFDataset')
 				def drop_non_essential_vars_pop(ds):
 					dropvars = [v for v in ds.variables if v not in
@@ -103,6 +125,32 @@ class Reader(BaseReader, StructuredReader):
 			raise ValueError(e)
 
 
+		if not self._load_metadata_cache_([filename, gridfile], catalog):
+			self._read_metadata(filename, gridfile, gls_param)
+			self._store_metadata_cache_(*self.metadata_attributes)
+			self._write_metadata_cache_()
+
+		if self.catalog is not None:
+			self.times = self.catalog.times
+			self.start_time = self.times[0]
+			self.end_time = self.times[-1]
+			if len(self.times) > 1:
+				self.time_step = self.times[1] - self.times[0]
+
+		# Run constructor of parent Reader class
+		super(Reader, self).__init__()
+
+	@staticmethod
+	def _decode_times_(values, units):
+		"""Return datetimes of ocean_time values with given units."""
+		if units == 'second':
+			logger.info('Ocean time given as seconds relative to start '
+						 'Setting artifical start time of 1 Jan 2000.')
+			units = 'seconds since 2000-01-01 00:00:00'
+		return num2date(values, units)
+
+	def _read_metadata(self, filename, gridfile, gls_param):
+		"""Read vertical coordinates, grid, times and variables of dataset."""
 		if 'Vtransform' in self.Dataset.variables:
 			self.Vtransform = self.Dataset.variables['Vtransform'].data  # scalar
 		else:
@@ -159,9 +207,9 @@ class Reader(BaseReader, StructuredReader):
 								 'arrays, please supply a grid-file '
 								 '"gridfile=<grid_file>"')
 			else:
-				gf = Dataset(gridfile)
-				self.lat = gf.variables['lat_rho'][:]
-				self.lon = gf.variables['lon_rho'][:]
+				with netcdf_locked(), Dataset(gridfile) as gf:
+					self.lat = gf.variables['lat_rho'][:]
+					self.lon = gf.variables['lon_rho'][:]
 
 		try:  # Check for GLS parameters (diffusivity)
 			self.gls_parameters = {}
@@ -178,12 +226,8 @@ class Reader(BaseReader, StructuredReader):
 			ocean_time = self.Dataset.variables['ocean_time']
 		except:
 			ocean_time = self.Dataset.variables['time']
-		time_units = ocean_time.attrs['units']
-		if time_units == 'second':
-			logger.info('Ocean time given as seconds relative to start '
-						 'Setting artifical start time of 1 Jan 2000.')
-			time_units = 'seconds since 2000-01-01 00:00:00'
-		self.times = num2date(ocean_time[:], time_units)
+		self.times = self._decode_times_(ocean_time[:],
+										 ocean_time.attrs['units'])
 		self.start_time = self.times[0]
 		self.end_time = self.times[-1]
 		if len(self.times) > 1:
@@ -206,9 +250,6 @@ class Reader(BaseReader, StructuredReader):
 				var = self.Dataset.variables[var_name]
 				self.variables.append(self.ROMS_variable_mapping[var_name])
 
-		# Run constructor of parent Reader class
-		super(Reader, self).__init__()
-
 	def get_variables(self, requested_variables, time=None,
 					  x=None, y=None, z=None):
 		start_time = datetime.now()
@@ -228,6 +269,11 @@ class Reader(BaseReader, StructuredReader):
 		nearestTime, dummy1, dummy2, indxTime, dummy3, dummy4 = \
 			self.nearest_time(time)
 
+		dataset = self.Dataset
+		if self.catalog is not None:
+			# Reading from the file containing the time step
+			dataset, indxTime = self.catalog.locate(indxTime)
+
 		variables = {}
 
 		if z is None:
@@ -267,6 +313,8 @@ class Reader(BaseReader, StructuredReader):
 				Htot = self.sea_floor_depth_below_sea_level
 				self.z_rho_tot = depth.sdepth(Htot, self.hc, self.Cs_r,
 											  Vtransform=self.Vtransform)
+				self._store_metadata_cache_(
+					'sea_floor_depth_below_sea_level', 'z_rho_tot')
 
 			H = self.sea_floor_depth_below_sea_level[indy, indx]
 			z_rho = depth.sdepth(H, self.hc, self.Cs_r,
@@ -300,7 +348,7 @@ class Reader(BaseReader, StructuredReader):
 		for par in requested_variables:
 			varname = [name for name, cf in
 					   self.ROMS_variable_mapping.items() if cf == par]
-			var = self.Dataset.variables[varname[0]]
+			var = dataset.variables[varname[0]]
 
 			if par == 'land_binary_mask':
 				print("Getting landmask")
@@ -308,6 +356,7 @@ class Reader(BaseReader, StructuredReader):
 					# Read landmask for whole domain, for later re-use
 					self.land_binary_mask = \
 						1 - self.Dataset.variables['mask_rho'][:]
+					self._store_metadata_cache_('land_binary_mask')
 				variables[par] = self.land_binary_mask[indy, indx]
 			elif var.ndim == 2:
 				variables[par] = var[indy, indx]
@@ -331,6 +380,7 @@ class Reader(BaseReader, StructuredReader):
 							self.mask_u = self.Dataset.variables['mask_u'][:]
 						else:
 							self.mask_u = self.Dataset.variables['mask_rho'][:]
+						self._store_metadata_cache_('mask_u')
 					mask = self.mask_u[indygrid, indxgrid]
 				elif par == 'y_sea_water_velocity':
 					if not hasattr(self, 'mask_v'):
@@ -338,11 +388,13 @@ class Reader(BaseReader, StructuredReader):
 							self.mask_v = self.Dataset.variables['mask_v'][:]
 						else:
 							self.mask_v = self.Dataset.variables['mask_rho'][:]
+						self._store_metadata_cache_('mask_v')
 					mask = self.mask_v[indygrid, indxgrid]
 				else:
 					if not hasattr(self, 'mask_rho'):
 						# For ROMS-Agrif this must perhaps be mask_psi?
 						self.mask_rho = self.Dataset.variables['mask_rho'][:]
+						self._store_metadata_cache_('mask_rho')
 					mask = self.mask_rho[indygrid, indxgrid]
 				mask = np.asarray(mask)
 				if mask.min() == 0 and par != 'land_binary_mask':
@@ -373,6 +425,8 @@ class Reader(BaseReader, StructuredReader):
 							#self.s2z_I = self.s2z_total[2].reshape(M, N)
 							self.s2z_kmax = self.s2z_total[3]
 							del self.s2z_total  # Free memory
+							self._store_metadata_cache_(
+								's2z_A', 's2z_C', 's2z_kmax')
 							logger.info('Time: ' + str(datetime.now() - starttime))
 						if 'A' not in locals():
 							logger.debug('Re-using sigma2z-coefficients')
@@ -484,6 +538,7 @@ class Reader(BaseReader, StructuredReader):
 			if not hasattr(self, 'angle_xi_east'):
 				logger.debug('Reading angle between xi and east...')
 				self.angle_xi_east = self.Dataset.variables['angle'][:]
+				self._store_metadata_cache_('angle_xi_east')
 			rad = self.angle_xi_east[indy, indx]
 			rad = np.ma.asarray(rad)
 			if 'x_sea_water_velocity' in variables.keys():
@@ -508,6 +563,7 @@ class Reader(BaseReader, StructuredReader):
 
 		logger.debug('Time for ROMS native reader: ' + str(datetime.now()-start_time))
 
+		self._write_metadata_cache_()
 		return variables
 
 
@@ -38,6 +38,7 @@ try:
 except:
     raise ValueError('Motu client must be installed to use reader_cmems.py: python -m pip install motuclient')
 
+from opendrift.locks import netcdf_locked
 from opendrift.readers.reader_netCDF_CF_generic import Reader as NCReader
 
 
@@ -206,9 +207,9 @@ class Reader(NCReader):
         os.system(cmd)
 
         # Update standard_name attribute with provided variable mapping
-        d = Dataset(self.nc_file, 'a')
-        for var, val in self.variable_mapping.items():
-            logger.debug('Setting standard_name of %s to %s' % (var, val))
-            d.variables[var].standard_name = val
+        with netcdf_locked(), Dataset(self.nc_file, 'a') as d:
+            for var, val in self.variable_mapping.items():
+                logger.debug('Setting standard_name of %s to %s' % (var, val))
+                d.variables[var].standard_name = val
 
         super(Reader, self).__init__(filename=self.nc_file)
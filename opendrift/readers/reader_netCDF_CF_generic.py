@@ -22,6 +22,7 @@ import logging
 logger = logging.getLogger(__name__)
 
 from opendrift.readers.basereader import BaseReader, StructuredReader
+from opendrift.readers.basereader.catalog import FileCatalog
 import xarray as xr
 
 def proj_from_CF_dict(c):
@@ -86,6 +87,11 @@ class Reader(BaseReader, StructuredReader):
         :param proj4: PROJ.4 string describing projection of data.
         :type proj4: string, optional
 
+        :param catalog: If True, files of a pattern are not opened as one
+                        dataset, but only when data of their time steps are
+                        needed (see :class:`.catalog.FileCatalog`).
+        :type catalog: bool, optional
+
     Example:
 
     .. code::
@@ -110,7 +116,16 @@ class Reader(BaseReader, StructuredReader):
 
     """
 
-    def __init__(self, filename=None, name=None, proj4=None, standard_name_mapping={}):
+    # Attributes derived from dataset, which are stored in metadata cache
+    # (see `BaseReader.metadata_cache_dir`)
+    metadata_attributes = [
+        'proj4', 'projected', 'lon', 'lat', 'x', 'y', 'z', 'xname', 'yname',
+        'numx', 'numy', 'unitfactor', 'xmin', 'xmax', 'ymin', 'ymax',
+        'delta_x', 'delta_y', 'times', 'start_time', 'end_time', 'time_step',
+        'realizations', 'variable_mapping', 'variables']
+
+    def __init__(self, filename=None, name=None, proj4=None, standard_name_mapping={},
+                 catalog=False):
 
         if filename is None:
             raise ValueError('Need filename as argument to constructor')
@@ -124,7 +139,17 @@ class Reader(BaseReader, StructuredReader):
         try:
             # Open file, check that everything is ok
             logger.info('Opening dataset: ' + filestr)
-            if ('*' in filestr) or ('?' in filestr) or ('[' in filestr):
+            if catalog is True and (('*' in filestr) or ('?' in filestr) or
+                                    ('[' in filestr)):
+                logger.info('Making catalog of files')
+                self.catalog = FileCatalog(
+                    filestr,
+                    lambda f: xr.open_dataset(f, decode_times=False),
+                    cache_dir=self.metadata_cache_dir)
+                # First file for coordinates and variables
+                self.Dataset = xr.open_dataset(self.catalog.files[0],
+                                               decode_times=False)
+            elif ('*' in filestr) or ('?' in filestr) or ('[' in filestr):
                 logger.info('Opening files with MFDataset')
                 self.Dataset = xr.open_mfdataset(filename, concat_dim='time', combine='nested',
                                                  chunks={'time': 1}, decode_times=False)
@@ -134,6 +159,24 @@ class Reader(BaseReader, StructuredReader):
         except Exception as e:
             raise ValueError(e)
 
+        if not self._load_metadata_cache_(
+                [filename], proj4, standard_name_mapping, catalog):
+            self._read_metadata(proj4, standard_name_mapping)
+            self._store_metadata_cache_(*self.metadata_attributes)
+            self._write_metadata_cache_()
+
+        if self.catalog is not None:
+            self.times = self.catalog.times
+            self.start_time = self.times[0]
+            self.end_time = self.times[-1]
+            if len(self.times) > 1:
+                self.time_step = self.times[1] - self.times[0]
+
+        # Run constructor of parent Reader class
+        super().__init__()
+
+    def _read_metadata(self, proj4, standard_name_mapping):
+        """Find coordinates, times and variables of dataset."""
         logger.debug('Finding coordinate variables.')
         if proj4 is not None:  # If user has provided a projection apriori
             self.proj4 = proj4
@@ -347,9 +390,6 @@ class Reader(BaseReader, StructuredReader):
 
         self.variables = list(self.variable_mapping.keys())
 
-        # Run constructor of parent Reader class
-        super().__init__()
-
     def get_variables(self, requested_variables, time=None,
                       x=None, y=None, z=None,
                       indrealization=None):
@@ -359,6 +399,13 @@ class Reader(BaseReader, StructuredReader):
         nearestTime, dummy1, dummy2, indxTime, dummy3, dummy4 = \
             self.nearest_time(time)
 
+        dataset = self.Dataset
+        tile_name = None
+        if self.catalog is not None:
+            # Reading from the file containing the time step
+            tile_name = self.catalog.files[self.catalog.file_index[indxTime]]
+            dataset, indxTime = self.catalog.locate(indxTime)
+
         if hasattr(self, 'z') and (z is not None):
             # Find z-index range
             # NB: may need to flip if self.z is ascending
@@ -426,10 +473,13 @@ class Reader(BaseReader, StructuredReader):
                     self.variable_mapping[par] = \
                         self.variable_mapping[
                             self.rotate_mapping[par]]
-            var = self.Dataset.variables[self.variable_mapping[par]]
+            var = dataset.variables[self.variable_mapping[par]]
 
             ensemble_dim = None
-            if continous is True:
+            if self.tile_cache is not None and var.ndim <= 4:
+                variables[par] = self._read_tiled_((par, tile_name), var,
+                                                   indxTime, indz, indy, indx)
+            elif continous is True:
                 if var.ndim == 2:
                     variables[par] = var[indy, indx]
                 elif var.ndim == 3:
@@ -26,6 +26,7 @@ import logging
 logger = logging.getLogger(__name__)
 
 from opendrift.readers.basereader import BaseReader, UnstructuredReader
+from opendrift.locks import netcdf4_locked
 
 
 class Reader(BaseReader, UnstructuredReader):
@@ -71,6 +72,9 @@ class Reader(BaseReader, UnstructuredReader):
         'upward_sea_water_velocity',
     ]
 
+    # Largest gap between ids of nodes or faces read in one slice
+    block_max_gap = 1000
+
     dataset = None
 
     # For in-memory caching of Sigma-coordinates and ocean depth
@@ -81,6 +85,7 @@ class Reader(BaseReader, UnstructuredReader):
     ocean_depth_nele = None
     ocean_depth_node = None
 
+    @netcdf4_locked
     def __init__(self, filename=None, name=None, proj4=None):
         if filename is None:
             raise ValueError('Filename is missing')
@@ -136,6 +141,15 @@ class Reader(BaseReader, UnstructuredReader):
         self.end_time = self.times[-1]
         # time steps are not constant
 
+        # Nodes of each face (1-based in FVCOM files), used for interpolation
+        if 'nv' in self.dataset.variables:
+            self.triangles = np.ascontiguousarray(
+                np.asarray(self.dataset['nv'][:]).T.astype(int) - 1)
+            # Neighbouring faces, 0 at the boundary
+            if 'nbe' in self.dataset.variables:
+                self.neighbours = np.ascontiguousarray(
+                    np.asarray(self.dataset['nbe'][:]).T.astype(int) - 1)
+
         self.xmin = np.min(self.x)
         self.xmax = np.max(self.x)
         self.ymin = np.min(self.y)
@@ -200,6 +214,7 @@ class Reader(BaseReader, UnstructuredReader):
         plt.xlabel('x [m]')
         plt.ylabel('y [m]')
 
+    @netcdf4_locked
     def get_variables(self,
                       requested_variables,
                       time=None,
@@ -218,8 +233,11 @@ class Reader(BaseReader, UnstructuredReader):
 
         .. note::
 
-            Currently this reader does not really interpolate. It looks up the
-            closest point in time and space.
+            This method does not interpolate, it looks up the closest point
+            in time and space. If the mesh (`nv`) is available, the reader
+            interpolates in time and space with an
+            :class:`.interpolation.unstructured.UnstructuredBlock`, see
+            :meth:`.basereader.unstructured.UnstructuredReader._get_variables_interpolated_`.
 
         Each element has a lookup-table of its surrounding elements, this list can be
         used when looking up elements for the interpolator of an arbitrary
@@ -326,6 +344,91 @@ class Reader(BaseReader, UnstructuredReader):
 
         return variables
 
+    @netcdf4_locked
+    def _read_block_(self, variables, indx_before, indx_after, nodes, faces):
+        """
+        Read variables at given nodes and faces, at the two time steps.
+
+        Variables are read for all sigma layers or levels, in one slice for
+        each run of (sorted) node or face ids separated by at most
+        `block_max_gap` ids. The values between the ids of a run are read
+        and discarded, so that the cost of reading is proportional to the
+        total length of the runs, at most the range of ids, times the
+        number of layers. The depths of the layers (or levels) are
+        calculated from sigma and the ocean depth.
+        """
+        data = {}
+        depths = {}
+        for var in variables:
+            dvar = self.dataset[self.variable_mapping.get(var)]
+            if var in self.node_variables:
+                ids = nodes
+                sigma_depths = self.__node_sigma_depths__
+            elif var in self.face_variables:
+                ids = faces
+                sigma_depths = self.__face_sigma_depths__
+            else:
+                raise ValueError('%s is not defined at nodes or faces' % var)
+            runs = np.split(ids, np.flatnonzero(
+                np.diff(ids) > self.block_max_gap) + 1)
+
+            def read(indx):
+                values = []
+                for run in runs:
+                    subset = slice(run[0], run[-1] + 1)
+                    if dvar.ndim == 1:  # Constant in time (e.g. depth)
+                        v = dvar[subset][np.newaxis, :]
+                    elif dvar.ndim == 2:  # No vertical dimension
+                        v = dvar[indx, subset][np.newaxis, :]
+                    else:
+                        v = dvar[indx, :, subset]
+                    values.append(v[:, run - run[0]])
+                return np.ma.concatenate(values, axis=1)
+
+            data[var] = (read(indx_before), read(indx_after))
+            if dvar.ndim == 3:
+                depths[var] = sigma_depths(dvar, ids)
+            else:
+                depths[var] = np.zeros((1, len(ids)))
+
+        return data, depths
+
+    @netcdf4_locked
+    def __node_sigma_depths__(self, var, nodes):
+        """
+        Depths of sigma layers or levels (as of var) at nodes.
+        """
+        if self.siglay is None:
+            self.siglay = self.dataset['siglay'][:]
+        if self.siglev is None:
+            self.siglev = self.dataset['siglev'][:]
+        if self.ocean_depth_node is None:
+            self.ocean_depth_node = self.dataset['h'][:]
+        if var.shape[1] == self.siglay.shape[0]:
+            sigmas = self.siglay[:, nodes]
+        else:
+            sigmas = self.siglev[:, nodes]
+        return np.ma.filled(self.z_from_sigma(
+            sigmas, self.ocean_depth_node[nodes]), np.nan)
+
+    @netcdf4_locked
+    def __face_sigma_depths__(self, var, faces):
+        """
+        Depths of sigma layers or levels (as of var) at faces.
+        """
+        if self.siglay_center is None:
+            self.siglay_center = self.dataset['siglay_center'][:]
+        if self.siglev_center is None:
+            self.siglev_center = self.dataset['siglev_center'][:]
+        if self.ocean_depth_nele is None:
+            self.ocean_depth_nele = self.dataset['h_center'][:]
+        if var.shape[1] == self.siglay_center.shape[0]:
+            sigmas = self.siglay_center[:, faces]
+        else:
+            sigmas = self.siglev_center[:, faces]
+        return np.ma.filled(self.z_from_sigma(
+            sigmas, self.ocean_depth_nele[faces]), np.nan)
+
     @staticmethod
     def _vector_nearest_(X, xp):
         """
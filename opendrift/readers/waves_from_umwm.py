@@ -24,6 +24,7 @@ logger = logging.getLogger(__name__)
 
 from netCDF4 import num2date
 import xarray as xr
+from opendrift.locks import netcdf_locked, netcdf4_locked
 from opendrift.readers.basereader import BaseReader, vector_pairs_xy, StructuredReader
 
 class Reader(BaseReader,StructuredReader):
@@ -72,13 +73,15 @@ class Reader(BaseReader,StructuredReader):
 						preprocess=drop_non_essential_vars_pop,
 						data_vars='minimal', coords='minimal')
 				else:
-					self.Dataset = MFDataset(filename)
+					with netcdf_locked():
+						self.Dataset = MFDataset(filename)
 			else:
 				logger.info('Opening file with Dataset')
 				if has_xarray is True:
 					self.Dataset = xr.open_dataset(filename)
 				else:
-					self.Dataset = Dataset(filename, 'r')
+					with netcdf_locked():
+						self.Dataset = Dataset(filename, 'r')
 		except Exception as e:
 			raise ValueError('e')
 
@@ -130,11 +133,11 @@ class Reader(BaseReader,StructuredReader):
 								 'arrays, please supply a grid-file '
 								 '"gridfile=<grid_file>"')
 			else:
-				gf = Dataset(gridfile)
-				self.lat = gf.variables['lat'][:]
-				self.lat =  np.nan_to_num(self.lat)
-				self.lon = gf.variables['lon_'][:]
-				self.lon =  np.nan_to_num(self.lon)
+				with netcdf_locked(), Dataset(gridfile) as gf:
+					self.lat = gf.variables['lat'][:]
+					self.lat =  np.nan_to_num(self.lat)
+					self.lon = gf.variables['lon_'][:]
+					self.lon =  np.nan_to_num(self.lon)
 
 		# Get time coverage
 
@@ -176,6 +179,7 @@ class Reader(BaseReader,StructuredReader):
 		super(Reader, self).__init__()
 
 
+	@netcdf4_locked
 	def get_variables(self, requested_variables, time=None,
 					  x=None, y=None, z=None):
 
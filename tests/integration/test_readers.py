@@ -17,6 +17,8 @@
 #
 # Copyright 2015, Knut-Frode Dagestad, MET Norway
 
+import os
+import tempfile
 import unittest
 from datetime import datetime, timedelta
 
@@ -27,6 +29,7 @@ from opendrift.models.leeway import Leeway
 from opendrift.models.openoil import OpenOil
 from opendrift.readers import reader_netCDF_CF_generic
 from opendrift.readers import reader_ROMS_native
+from opendrift.readers import reader_ECOM_S2Z_nested
 from opendrift.readers import reader_global_landmask
 from opendrift.readers import reader_constant
 from opendrift.readers import reader_lazy
@@ -113,6 +116,162 @@ class TestReaders(unittest.TestCase):
 
         #os.remove(outfile)
 
+    def test_prefetch(self):
+        lons = []
+        for prefetch in [False, True]:
+            o = OceanDrift(loglevel=50)
+            r = reader_netCDF_CF_generic.Reader(o.test_data_folder() +
+                '2Feb2016_Nordic_sigma_3d/Arctic20_1to5Feb_2016.nc')
+            r.set_prefetch(prefetch)
+            o.add_reader(r)
+            o.set_config('environment:fallback:land_binary_mask', 0)
+            o.seed_elements(lon=14.9, lat=71.1, radius=2000, number=100,
+                            time=r.start_time, z=0)
+            o.run(duration=timedelta(days=3), time_step=6*3600)
+            lons.append(o.history['lon'])
+        # Blocks of the next days are read in background
+        self.assertEqual(r.prefetch_hits, 2)
+        self.assertEqual(r.prefetch_misses, 0)
+        self.assertIn('prefetch hits', r.performance())
+        np.testing.assert_array_equal(lons[0], lons[1])
+
+    def test_tile_cache(self):
+        r = reader_netCDF_CF_generic.Reader(o.test_data_folder() +
+            '2Feb2016_Nordic_sigma_3d/Arctic20_1to5Feb_2016.nc')
+        variables = ['x_sea_water_velocity', 'sea_floor_depth_below_sea_level']
+        x, y = r.lonlat2xy(np.array([14.9, 15.5]), np.array([71.1, 71.3]))
+        z = np.array([0, -40])
+        direct = r.get_variables(variables, r.start_time, x, y, z)
+        r.set_tile_cache(100, tile_shape=(4, 8, 8))
+        for i in range(2):
+            tiled = r.get_variables(variables, r.start_time, x, y, z)
+            for var in variables + ['x', 'y', 'z']:
+                np.testing.assert_array_equal(tiled[var], direct[var])
+        self.assertGreater(r.tile_cache.hits, 0)
+        self.assertEqual(r.tile_cache.hits, r.tile_cache.misses)
+
+    def test_block_clustering(self):
+        lons = []
+        for cell_size in [None, 4]:
+            o = OceanDrift(loglevel=50)
+            r = reader_netCDF_CF_generic.Reader(o.test_data_folder() +
+                '2Feb2016_Nordic_sigma_3d/Arctic20_1to5Feb_2016.nc')
+            r.set_block_clustering(cell_size)
+            o.add_reader(r)
+            o.set_config('environment:fallback:land_binary_mask', 0)
+            o.set_config('drift:vertical_mixing', False)
+            # Two distant release sites
+            for lon, lat in [(14.9, 71.1), (30, 74)]:
+                o.seed_elements(lon=lon, lat=lat, radius=2000, number=50,
+                                z=np.linspace(0, -50, 50), time=r.start_time)
+            o.run(duration=timedelta(days=3), time_step=3*3600)
+            lons.append(o.history['lon'])
+        block = list(r.var_block_before.values())[0]
+        self.assertEqual(len(block.blocks), 2)
+        self.assertLess(sum(len(b.x)*len(b.y) for b in block.blocks), 500)
+        np.testing.assert_array_almost_equal(lons[0], lons[1])
+
+    def test_metadata_cache(self):
+        from opendrift.readers.basereader import BaseReader
+        cache_dir = tempfile.mkdtemp()
+        for reader_class, filename in [
+                (reader_netCDF_CF_generic.Reader,
+                 '2Feb2016_Nordic_sigma_3d/Arctic20_1to5Feb_2016.nc'),
+                (reader_ROMS_native.Reader,
+                 '2Feb2016_Nordic_sigma_3d/Nordic_subset_day1.nc')]:
+            filename = o.test_data_folder() + filename
+            values = []
+            for metadata_cache_dir in [None, cache_dir, cache_dir]:
+                BaseReader.metadata_cache_dir = metadata_cache_dir
+                try:
+                    r = reader_class(filename)
+                finally:
+                    BaseReader.metadata_cache_dir = None
+                lon, lat = r.xy2lonlat(r.xmin + (r.xmax - r.xmin)*np.array(
+                    [.3, .6]), r.ymin + (r.ymax - r.ymin)*np.array([.4, .5]))
+                v = r.get_variables_interpolated(
+                    ['x_sea_water_velocity'], lon=lon, lat=lat,
+                    z=np.array([0, -30]),
+                    time=r.start_time)[0]['x_sea_water_velocity']
+                values.append(v)
+            self.assertEqual(r.start_time, r.times[0])
+            np.testing.assert_array_equal(values[0], values[1])
+            np.testing.assert_array_equal(values[0], values[2])
+        # Metadata, and grid index of ROMS reader (no projection)
+        files = sorted(os.listdir(cache_dir))
+        self.assertEqual(len(files), 3)
+        self.assertTrue(files[0].startswith('gridindex_'))
+
+        # Metadata derived at first request of ROMS reader (depths, masks,
+        # angle) is written at once
+        from unittest import mock
+        from opendrift.readers import basereader
+        BaseReader.metadata_cache_dir = tempfile.mkdtemp()
+        try:
+            with mock.patch.object(basereader, 'store_metadata',
+                                   wraps=basereader.store_metadata) as store:
+                r = reader_ROMS_native.Reader(filename)
+                self.assertEqual(store.call_count, 1)
+                r.get_variables_interpolated(
+                    ['x_sea_water_velocity'], lon=lon, lat=lat,
+                    z=np.array([0, -30]), time=r.start_time)
+                self.assertEqual(store.call_count, 2)
+                self.assertIn('z_rho_tot', store.call_args[0][1])
+        finally:
+            BaseReader.metadata_cache_dir = None
+
+    def test_catalog(self):
+        pattern = o.test_data_folder() + \
+            '2Feb2016_Nordic_sigma_3d/Nordic_subset_day*.nc'
+        r = reader_ROMS_native.Reader(pattern, catalog=True)
+        r.catalog.max_open = 2
+        self.assertEqual(len(r.times), 3)
+        self.assertEqual(r.time_step, timedelta(days=1))
+        lon, lat = r.xy2lonlat(r.xmin + (r.xmax - r.xmin)*np.array([.3, .6]),
+                               r.ymin + (r.ymax - r.ymin)*np.array([.4, .5]))
+        for day, time in enumerate(r.times):
+            # Same values as from reader of the single file
+            single = reader_ROMS_native.Reader(pattern.replace('*',
+                                                               str(day + 1)))
+            values = [reader.get_variables_interpolated(
+                ['x_sea_water_velocity'], lon=lon, lat=lat,
+                z=np.array([0, -30]), time=time)[0]['x_sea_water_velocity']
+                for reader in [r, single]]
+            np.testing.assert_array_equal(values[0], values[1])
+        self.assertEqual(r.catalog.opened, 3)
+        self.assertEqual(len(r.catalog.datasets), 2)
+        self.assertIn('files opened, of 3 in catalog', r.performance())
+
+    def test_nested_grids(self):
+        outer = reader_netCDF_CF_generic.Reader(o.test_data_folder() +
+            '2Feb2016_Nordic_sigma_3d/Arctic20_1to5Feb_2016.nc')
+        inner = reader_ROMS_native.Reader(o.test_data_folder() +
+            '2Feb2016_Nordic_sigma_3d/Nordic_subset_day1.nc')
+        r = reader_ECOM_S2Z_nested.Reader([outer, inner])
+        self.assertEqual(r.readers, [inner, outer])  # Finest first
+        lon = np.linspace(10, 18, 40)
+        lon, lat = np.meshgrid(lon, np.linspace(66, 69, 30))
+        lon, lat = lon.ravel(), lat.ravel()
+        grid = r.dispatch(lon, lat)
+        np.testing.assert_array_equal(
+            np.flatnonzero(grid == 0), inner.covers_positions(lon, lat)[0])
+        np.testing.assert_array_equal(
+            r.covers_positions(lon, lat)[0], np.flatnonzero(grid >= 0))
+
+        # Same values as from the readers in order of priority
+        time = datetime(2016, 2, 2, 12)
+        var = 'sea_water_temperature'
+        values = [reader.get_variables_interpolated(
+            [var], lon=lon, lat=lat, z=np.zeros(len(lon)),
+            time=time)[0][var] for reader in [r, inner, outer]]
+        values = [np.ma.masked_invalid(v) for v in values]
+        expected = np.ma.where(np.ma.getmaskarray(values[1]),
+                               values[2], values[1])
+        self.assertGreater(values[0].count(), values[1].count())
+        np.testing.assert_array_equal(values[0].mask, expected.mask)
+        np.testing.assert_array_equal(values[0].compressed(),
+                                      expected.compressed())
+
     def test_reader_from_url(self):
         readers = reader_from_url(reader_list)
         self.assertIsNone(readers[0])
@@ -21,9 +21,12 @@ import unittest
 import pytest
 from datetime import datetime, timedelta
 import os
+import shutil
 import inspect
 
 import numpy as np
+import opendrift
+from netCDF4 import Dataset
 
 from opendrift.readers import reader_ArtificialOceanEddy
 from opendrift.readers import reader_global_landmask
@@ -65,6 +68,12 @@ except Exception as e:
     print(e)
     has_ogr = False
 
+try:
+    import zarr
+    has_zarr = True
+except ImportError:
+    has_zarr = False
+
 class TestRun(unittest.TestCase):
     """Tests for (non-scalar) LagrangianArray"""
 
@@ -420,6 +429,172 @@ class TestRun(unittest.TestCase):
             o4.history['lon'].compressed()))
         os.remove('export_step_interval.nc')
 
+    def test_export_output_thread(self):
+        """Background writer gives same file, with fixed dimensions"""
+        files = []
+        for output_thread in [False, True]:
+            o = OceanDrift(loglevel=30)
+            o.set_config('environment:fallback:land_binary_mask', 0)
+            o.set_config('environment:fallback:x_sea_water_velocity', 0.2)
+            o.set_config('general:output_thread', output_thread)
+            o.seed_elements(4.25, 60.2, radius=1000, number=10,
+                            time=datetime(2020, 1, 1))
+            outfile = 'export_output_thread_%s.nc' % output_thread
+            o.run(steps=40, time_step=900, time_step_output=1800,
+                  export_buffer_length=6, outfile=outfile)
+            files.append(outfile)
+        with Dataset(files[0]) as d1, Dataset(files[1]) as d2:
+            self.assertFalse(d2.dimensions['time'].isunlimited())
+            self.assertEqual(len(d1.dimensions['time']),
+                             len(d2.dimensions['time']))
+            for var in d1.variables:
+                np.testing.assert_array_equal(d1[var][:], d2[var][:])
+        for outfile in files:
+            os.remove(outfile)
+
+    def test_export_encoding(self):
+        """Compressed, chunked and packed output"""
+        histories = []
+        for compression, encoding in [
+                (0, None), (4, {'lon': {'dtype': 'i4', 'scale_factor': 1e-6},
+                                'lat': {'dtype': 'i4', 'scale_factor': 1e-6,
+                                        'add_offset': 60}})]:
+            o = OceanDrift(loglevel=30)
+            o.set_config('environment:fallback:land_binary_mask', 0)
+            o.set_config('environment:fallback:x_sea_water_velocity', 0.2)
+            o.set_config('general:output_compression_level', compression)
+            o.set_config('general:output_chunking', 'buffer')
+            o.seed_elements(4.25, 60.2, radius=1000, number=10,
+                            time=datetime(2020, 1, 1))
+            o.run(steps=20, export_buffer_length=6,
+                  outfile='export_encoding.nc', output_encoding=encoding)
+            with Dataset('export_encoding.nc') as d:
+                self.assertEqual(d['lon'].chunking(), [10, 6])
+                self.assertEqual(d['lon'].filters()['complevel'],
+                                 compression)
+                if encoding is not None:
+                    self.assertEqual(d['lat'].dtype, np.int32)
+                    self.assertEqual(d['lat'].add_offset, 60)
+            histories.append(o.history)
+            os.remove('export_encoding.nc')
+        np.testing.assert_array_almost_equal(
+            histories[0]['lat'], histories[1]['lat'], 5)
+        np.testing.assert_array_equal(histories[0]['z'], histories[1]['z'])
+
+    def test_export_ragged(self):
+        """Ragged array output gives same history as multidimensional"""
+        histories = []
+        for layout in ['multidimensional', 'ragged']:
+            o = OceanDrift(loglevel=30)
+            o.set_config('environment:fallback:land_binary_mask', 0)
+            o.set_config('environment:fallback:x_sea_water_velocity', 0.2)
+            o.set_config('drift:max_age_seconds', 5*3600)
+            o.set_config('general:output_layout', layout)
+            o.seed_elements(4.25, 60.2, radius=1000, number=20,
+                            time=[datetime(2020, 1, 1),
+                                  datetime(2020, 1, 1, 10)])
+            o.run(steps=8, time_step=3600, export_buffer_length=3,
+                  outfile='export_ragged.nc')
+            histories.append(o.history)
+        with Dataset('export_ragged.nc') as d:
+            self.assertEqual(d['lon'].dimensions, ('obs',))
+            # Only seeded elements, only active observations
+            self.assertEqual(len(d.dimensions['trajectory']), 16)
+            self.assertEqual(d['rowSize'][:].sum(),
+                             histories[0]['lon'].count())
+        os.remove('export_ragged.nc')
+        for var in ['lon', 'status', 'x_sea_water_velocity']:
+            np.testing.assert_array_equal(histories[0][var].mask,
+                                          histories[1][var].mask)
+            np.testing.assert_array_equal(histories[0][var],
+                                          histories[1][var])
+
+    def test_import_empty_ragged(self):
+        """Ragged array output without observations can be imported"""
+        o = OceanDrift(loglevel=30)
+        o.set_config('environment:fallback:land_binary_mask', 0)
+        o.set_config('general:output_layout', 'ragged')
+        o.seed_elements(4.25, 60.2, number=5, time=datetime(2020, 1, 1))
+        o.run(steps=2, time_step=3600, outfile='export_ragged.nc')
+        # Same file without any trajectories and observations
+        with Dataset('export_ragged.nc') as src, \
+                Dataset('export_ragged_empty.nc', 'w') as dst:
+            dst.setncatts(src.__dict__)
+            for name in src.dimensions:
+                dst.createDimension(name, 0)
+            for name, var in src.variables.items():
+                attrs = var.__dict__
+                v = dst.createVariable(name, var.datatype, var.dimensions,
+                                       fill_value=attrs.pop('_FillValue',
+                                                            None))
+                v.setncatts(attrs)
+        o1 = opendrift.open('export_ragged_empty.nc')
+        self.assertEqual(o1.history.shape, (0, 3))
+        self.assertEqual(o1.num_elements_total(), 0)
+        self.assertEqual(o1.start_time, datetime(2020, 1, 1))
+        os.remove('export_ragged.nc')
+        os.remove('export_ragged_empty.nc')
+
+    def test_import_lazy(self):
+        """History is read from file when accessed, for subsets"""
+        o = OceanDrift(loglevel=30)
+        o.set_config('environment:fallback:land_binary_mask', 0)
+        o.set_config('environment:fallback:x_sea_water_velocity', 0.2)
+        o.seed_elements(4.25, 60.2, radius=1000, number=20,
+                        time=[datetime(2020, 1, 1),
+                              datetime(2020, 1, 1, 4)])
+        o.run(steps=8, time_step=3600, outfile='import_lazy.nc')
+        o1 = opendrift.open('import_lazy.nc', load_history=False)
+        self.assertEqual(o1.history.shape, (20, 9))
+        np.testing.assert_array_equal(o1.history['lon'], o.history['lon'])
+        np.testing.assert_array_equal(o1.history['lon'].mask,
+                                      o.history['lon'].mask)
+        times = [0, 2, 3, 8]
+        elements = [1, 5, 19]
+        o2 = opendrift.open('import_lazy.nc', times=times,
+                            elements=elements, load_history=False)
+        self.assertEqual(o2.history.shape, (3, 4))
+        np.testing.assert_array_equal(
+            o2.history['status'], o.history['status'][elements][:, times])
+        np.testing.assert_array_equal(
+            o2.history.read('lat', times=slice(1, 3)),
+            o.history['lat'][elements][:, [2, 3]])
+        # Elements are initialised from the last state, as for full import
+        o3 = opendrift.open('import_lazy.nc', times=times, elements=elements)
+        for var in ['lon', 'lat', 'status', 'age_seconds']:
+            np.testing.assert_array_equal(getattr(o2.elements, var),
+                                          getattr(o3.elements, var))
+        o2.history.close()
+        self.assertRaises(RuntimeError, o2.history.read, 'lon')
+        del o1, o2
+        os.remove('import_lazy.nc')
+
+    @unittest.skipIf(has_zarr is False, 'Zarr is not available')
+    def test_export_zarr(self):
+        """Zarr output gives same history as netCDF, and is read lazily"""
+        histories = []
+        for iomodule, outfile in [('netcdf', 'export_zarr.nc'),
+                                  ('zarr', 'export_zarr.zarr')]:
+            o = OceanDrift(loglevel=30, iomodule=iomodule)
+            o.set_config('environment:fallback:land_binary_mask', 0)
+            o.set_config('environment:fallback:x_sea_water_velocity', 0.2)
+            o.seed_elements(4.25, 60.2, radius=1000, number=20,
+                            time=[datetime(2020, 1, 1),
+                                  datetime(2020, 1, 1, 10)])
+            o.run(steps=8, time_step=3600, export_buffer_length=3,
+                  outfile=outfile)
+            histories.append(o.history)
+        os.remove('export_zarr.nc')
+        for var in ['lon', 'status', 'x_sea_water_velocity']:
+            np.testing.assert_array_equal(histories[0][var].mask,
+                                          histories[1][var].mask)
+            np.testing.assert_array_equal(histories[0][var],
+                                          histories[1][var])
+        o = opendrift.open_xarray('export_zarr.zarr')
+        self.assertEqual(o.ds.lon.shape, (16, 9))
+        self.assertIsNotNone(o.ds.lon.chunks)  # Dask array
+        shutil.rmtree('export_zarr.zarr')
+
     def test_buffer_length_stranding(self):
         o1 = OceanDrift(loglevel=30)
         norkyst = reader_netCDF_CF_generic.Reader(o1.test_data_folder() +
@@ -612,6 +787,24 @@ class TestRun(unittest.TestCase):
         np.testing.assert_array_almost_equal(
                 o.elements.lon, o2.elements.lon, decimal=3)
 
+    def test_concurrent_readers(self):
+        lons = []
+        for concurrent in [False, True]:
+            o = OceanDrift(loglevel=50)
+            arctic = reader_netCDF_CF_generic.Reader(o.test_data_folder() +
+                '2Feb2016_Nordic_sigma_3d/Arctic20_1to5Feb_2016.nc')
+            wind = reader_oscillating.Reader('x_wind', amplitude=10,
+                                             zero_time=arctic.start_time)
+            o.add_reader([arctic, wind])
+            o.set_config('general:concurrent_readers', concurrent)
+            o.set_config('environment:fallback:land_binary_mask', 0)
+            o.seed_elements(lon=14.9, lat=71.1, radius=2000, number=100,
+                            time=arctic.start_time, wind_drift_factor=.02)
+            o.run(steps=8, time_step=3600)
+            lons.append(o.history['lon'])
+        np.testing.assert_array_equal(lons[0], lons[1])
+        self.assertIn('main loop:readers:' + wind.name, o.timing)
+
     def test_seed_seafloor(self):
         o = OpenOil(loglevel=50)
         reader_norkyst = reader_netCDF_CF_generic.Reader(o.test_data_folder() + '14Jan2016_NorKyst_z_3d/NorKyst-800m_ZDEPTHS_his_00_3Dsubset.nc')
@@ -864,6 +1057,140 @@ class TestRun(unittest.TestCase):
         # Check that simulations has run until scheduled end
         self.assertEqual(o.steps_calculation, 8)
 
+    def test_partitioned_run(self):
+        """Partitioned run shall give same result as serial run"""
+        histories = []
+        for num_processes in [1, 3]:
+            o = OceanDrift(loglevel=50)
+            o.set_config('general:num_processes', num_processes)
+            o.set_config('general:use_auto_landmask', False)
+            o.set_config('environment:fallback:land_binary_mask', 0)
+            o.set_config('environment:fallback:x_sea_water_velocity', .1)
+            o.set_config('drift:max_age_seconds', 3600*5)
+            o.seed_elements(lon=4, lat=60, number=50, radius=1000,
+                            time=[datetime(2020, 1, 1),
+                                  datetime(2020, 1, 1, 6)])
+            o.run(steps=8, time_step=1800)
+            histories.append(o.history)
+        np.testing.assert_array_almost_equal(histories[0]['lon'],
+                                             histories[1]['lon'])
+        np.testing.assert_array_equal(histories[0]['lon'].mask,
+                                      histories[1]['lon'].mask)
+        np.testing.assert_array_equal(histories[0]['status'],
+                                      histories[1]['status'])
+
+    def test_partitioned_run_diffusivity(self):
+        """Partitioned run with diffusion shall give same ensemble
+        statistics as serial run"""
+        stats = []
+        for num_processes in [1, 3]:
+            o = OceanDrift(loglevel=50)
+            o.set_config('general:num_processes', num_processes)
+            o.set_config('general:use_auto_landmask', False)
+            o.set_config('environment:fallback:land_binary_mask', 0)
+            o.set_config('environment:fallback:x_sea_water_velocity', .1)
+            o.set_config('drift:horizontal_diffusivity', 10)
+            o.seed_elements(lon=4, lat=60, number=3000,
+                            time=datetime(2020, 1, 1))
+            o.run(steps=8, time_step=1800)
+            # Approximate distances (m) east and north of seeding position
+            x = (o.history['lon'][:, -1] - 4) * 111320 * np.cos(np.pi/3)
+            y = (o.history['lat'][:, -1] - 60) * 111320
+            stats.append((x.mean(), y.mean(), x.std(), y.std()))
+        mean_x, mean_y, std_x, std_y = stats[0]
+        # Spread of about 540 m from diffusion, as sqrt(2*K*t)
+        self.assertAlmostEqual(std_x, np.sqrt(2*10*8*1800), delta=50)
+        # Means within 4 standard errors, and spread within 5%
+        se = std_x / np.sqrt(3000)
+        self.assertAlmostEqual(stats[1][0], mean_x, delta=4*se*np.sqrt(2))
+        self.assertAlmostEqual(stats[1][1], mean_y, delta=4*se*np.sqrt(2))
+        self.assertAlmostEqual(stats[1][2] / std_x, 1, delta=.05)
+        self.assertAlmostEqual(stats[1][3] / std_y, 1, delta=.05)
+        # Partitions draw other random numbers than the serial run
+        self.assertNotEqual(stats[1][0], mean_x)
+
+    def test_partitioned_run_reader(self):
+        """Partitioned run reading from file shall give same result as
+        serial run, also with blocks shared between processes"""
+        histories = []
+        for num_processes, shared in [(1, False), (3, False), (3, True)]:
+            o = OceanDrift(loglevel=50)
+            r = reader_netCDF_CF_generic.Reader(o.test_data_folder() +
+                '2Feb2016_Nordic_sigma_3d/Arctic20_1to5Feb_2016.nc')
+            o.add_reader(r)
+            o.set_config('general:num_processes', num_processes)
+            o.set_config('general:shared_reader_blocks', shared)
+            o.set_config('general:use_auto_landmask', False)
+            o.set_config('environment:fallback:land_binary_mask', 0)
+            o.set_config('drift:horizontal_diffusivity', 0)
+            o.seed_elements(lon=14, lat=70, number=60, radius=5000,
+                            time=r.start_time)
+            o.run(steps=6, time_step=3600)
+            histories.append(o.history)
+        for h in histories[1:]:
+            np.testing.assert_array_almost_equal(histories[0]['lon'],
+                                                 h['lon'])
+
+    def test_run_ensemble(self):
+        """Ensemble members shall give same result as separate runs"""
+        def make_simulation():
+            o = OceanDrift(loglevel=50)
+            o.set_config('general:use_auto_landmask', False)
+            o.set_config('environment:fallback:land_binary_mask', 0)
+            o.set_config('environment:fallback:x_sea_water_velocity', .1)
+            o.set_config('drift:horizontal_diffusivity', 0)
+            o.seed_elements(lon=4, lat=60, number=20, radius=1000,
+                            time=[datetime(2020, 1, 1),
+                                  datetime(2020, 1, 1, 2)])
+            return o
+        configs = [{'environment:fallback:x_wind': wind}
+                   for wind in [0, 10]]
+        o = make_simulation()
+        members = o.run_ensemble(configs, steps=8, time_step=1800)
+        self.assertEqual(o.history.shape, (40, 9))
+        np.testing.assert_array_equal(o.ensemble_member,
+                                      np.repeat([0, 1], 20))
+        for config, member in zip(configs, members):
+            s = make_simulation()
+            for key, value in config.items():
+                s.set_config(key, value)
+            s.run(steps=8, time_step=1800)
+            np.testing.assert_array_almost_equal(s.history['lon'],
+                                                 member.history['lon'])
+        np.testing.assert_array_almost_equal(o.history['lon'][20:],
+                                             members[1].history['lon'])
+        self.assertTrue(members[1].history['lon'][:, -1].mean() >
+                        members[0].history['lon'][:, -1].mean())
+
+    def test_run_ensemble_start_times(self):
+        """Members starting later are placed at their output times"""
+        t0 = datetime(2020, 1, 1)
+        members = []
+        for start in [0, 3]:
+            m = OceanDrift(loglevel=50)
+            m.set_config('environment:fallback:land_binary_mask', 0)
+            m.set_config('environment:fallback:x_sea_water_velocity', .1)
+            m.seed_elements(lon=4, lat=60, number=5,
+                            time=t0 + timedelta(hours=start))
+            members.append(m)
+        o = OceanDrift(loglevel=50)
+        o.set_config('general:use_auto_landmask', False)
+        o.set_config('environment:fallback:land_binary_mask', 0)
+        members = o.run_ensemble(members, time_step=3600,
+                                 end_time=t0 + timedelta(hours=6))
+        self.assertEqual(o.start_time, t0)
+        self.assertEqual(o.steps_output, 7)
+        self.assertEqual(o.history.shape, (10, 7))
+        self.assertEqual(members[1].history.shape, (5, 4))
+        np.testing.assert_array_equal(o.history['lon'][:5],
+                                      members[0].history['lon'])
+        self.assertTrue(o.history['lon'][5:, 0:3].mask.all())
+        np.testing.assert_array_equal(o.history['lon'][5:, 3:],
+                                      members[1].history['lon'])
+        # First position of each element is where it was seeded
+        np.testing.assert_array_almost_equal(
+            o.history['lon'][:, [0, 3]].min(axis=1)[[0, 5]], [4, 4])
+
 @pytest.mark.slow
 def test_plot_animation(tmpdir):
     o = OceanDrift(loglevel=0)
@@ -0,0 +1,54 @@
+import threading
+from datetime import datetime, timedelta
+import numpy as np
+from netCDF4 import Dataset
+from opendrift.readers.basereader.catalog import FileCatalog
+from opendrift.readers.reader_ROMS_native import Reader as ROMSReader
+
+
+def make_files(tmpdir, units):
+    for i in range(3):
+        with Dataset(str(tmpdir.join('file%i.nc' % i)), 'w') as d:
+            d.createDimension('ocean_time', 2)
+            t = d.createVariable('ocean_time', 'f8', ('ocean_time',))
+            t.units = units
+            t[:] = 3600. * (2 * i + np.arange(2))
+    return str(tmpdir.join('file*.nc'))
+
+
+def test_catalog_decode_times(tmpdir):
+    pattern = make_files(tmpdir, 'second')
+    c = FileCatalog(pattern, Dataset,
+                    decode_times=ROMSReader._decode_times_)
+    assert len(c.times) == 6
+    assert c.times[0] == datetime(2000, 1, 1)
+    assert c.times[-1] - c.times[0] == timedelta(hours=5)
+
+
+def test_catalog_keeps_located_open(tmpdir):
+    pattern = make_files(tmpdir, 'seconds since 2020-01-01')
+    c = FileCatalog(pattern, Dataset, max_open=1)
+    located = []
+    ready = threading.Event()
+    proceed = threading.Event()
+
+    def read():
+        located.append(c.locate(0)[0])
+        ready.set()
+        proceed.wait()
+        located.append(located[0]['ocean_time'][:])
+
+    t = threading.Thread(target=read)
+    t.start()
+    ready.wait()
+    # Dataset located by the other thread is not closed by eviction
+    dataset, index = c.locate(5)
+    assert index == 1
+    assert len(c.datasets) == 2
+    proceed.set()
+    t.join()
+    np.testing.assert_array_equal(located[1], [0, 3600])
+    # Closed when no longer located by any (living) thread
+    c.locate(3)
+    assert list(c.datasets) == [c.files[1]]
+    c.close()
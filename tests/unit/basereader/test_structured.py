@@ -3,6 +3,8 @@ import pytest
 from . import *
 from opendrift.readers import reader_netCDF_CF_generic, reader_ROMS_native
 from opendrift.readers.basereader.structured import StructuredReader
+from opendrift.readers.basereader.gridindex import CurvilinearGridIndex
+from scipy.ndimage import map_coordinates
 
 def test_set_convolve(test_data):
     reader_norkyst = reader_netCDF_CF_generic.Reader(test_data + '16Nov2015_NorKyst_z_surface/norkyst800_subset_16Nov2015.nc')
@@ -19,6 +21,29 @@ def test_set_convolve(test_data):
     assert x != x2
     np.testing.assert_allclose(x2, np.array([0.08291302]))
 
+def test_grid_index(tmpdir):
+    # Rotated and sheared grid crossing the dateline
+    y, x = np.mgrid[0:40, 0:60].astype(float)
+    lon = (175. + .2*x - .1*y + .001*x*y + 180.) % 360. - 180.
+    lat = 60. + .1*x + .1*y
+
+    xs = np.array([0., 59., 10.3, 33.7, 45.5, -1., 70.])
+    ys = np.array([0., 39., 20.1, 5.9, 38.2, 5., 5.])
+    plon = map_coordinates(lon, [ys, xs], order=1, mode='nearest')
+    plat = map_coordinates(lat, [ys, xs], order=1, mode='nearest')
+    plon[-2:] = [174., 10.]
+
+    index = CurvilinearGridIndex(lon, lat, cache_dir=str(tmpdir))
+    ix, iy = index(plon, plat)
+    np.testing.assert_allclose(ix[:-2], xs[:-2], atol=1e-9)
+    np.testing.assert_allclose(iy[:-2], ys[:-2], atol=1e-9)
+    assert np.isnan(ix[-2:]).all() and np.isnan(iy[-2:]).all()
+
+    # Index is reused from cache directory
+    assert len(tmpdir.listdir()) == 1
+    cached = CurvilinearGridIndex(lon, lat, cache_dir=str(tmpdir))
+    np.testing.assert_array_equal(cached(plon, plat)[0], ix)
+
 def test_lonlat2xy_sequential(test_data, benchmark):
     reader = reader_ROMS_native.Reader(test_data + '2Feb2016_Nordic_sigma_3d/Nordic-4km_SLEVELS_avg_00_subset2Feb2016.nc')
     assert not reader.projected
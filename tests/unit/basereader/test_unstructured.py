@@ -0,0 +1,39 @@
+import numpy as np
+from matplotlib.tri import Triangulation
+from opendrift.readers.basereader.meshlocator import MeshLocator
+
+
+def test_mesh_locator():
+    rng = np.random.default_rng(0)
+    px = rng.uniform(0, 1000, 3000)
+    py = rng.uniform(0, 1000, 3000)
+    triangles = Triangulation(px, py).triangles
+    # Concave notch in the mesh
+    cx, cy = px[triangles].mean(axis=1), py[triangles].mean(axis=1)
+    triangles = triangles[~((cx > 400) & (cx < 600) & (cy > 300))]
+    trifinder = Triangulation(px, py, triangles).get_trifinder()
+
+    m = MeshLocator(px, py, triangles)
+    # Same neighbours from an unordered table (as nbe of FVCOM)
+    np.testing.assert_array_equal(
+        MeshLocator(px, py, triangles,
+                    neighbours=m.neighbours[:, [2, 0, 1]]).neighbours,
+        m.neighbours)
+
+    x = rng.uniform(-50, 1050, 20000)
+    y = rng.uniform(-50, 1050, 20000)
+    faces, weights = m.locate(x, y)
+    np.testing.assert_array_equal(faces, trifinder(x, y))
+    np.testing.assert_allclose(weights[:, faces >= 0].sum(axis=0), 1)
+    inside = faces >= 0
+    np.testing.assert_allclose(
+        (weights[:, inside] * px[triangles[faces[inside]]].T).sum(axis=0),
+        x[inside])
+
+    # Walking from the faces of previous positions
+    x = x + rng.normal(0, 10, len(x))
+    y = y + rng.normal(0, 10, len(y))
+    m.lost = 0
+    faces, weights = m.locate(x, y, guess=faces)
+    np.testing.assert_array_equal(faces, trifinder(x, y))
+    assert m.lost < (faces < 0).sum() + len(x) / 10
@@ -0,0 +1,17 @@
+import numpy as np
+
+from opendrift.readers.ECOM_dependencies import depth_ECOM
+
+
+def test_nearest_level():
+    zlevels = np.array([0, -5, -10, -15, -25, -30, -50, -75, -100, -150,
+                        -200, -250, -300, -400, -500, -1000, -2000.])
+    z = np.concatenate([np.random.uniform(-2500, 10, 1000), zlevels,
+                        (zlevels[1:] + zlevels[:-1]) / 2])
+
+    for levels in (zlevels, zlevels[::-1], np.array([0., 0.])):
+        expected = [np.abs(levels - value).argmin() for value in z]
+        np.testing.assert_array_equal(
+            depth_ECOM.nearest_level(levels, z), expected)
+
+    assert depth_ECOM.nearest_level(zlevels, -7.6)[0] == 2
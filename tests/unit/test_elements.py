@@ -84,5 +84,37 @@ class TestElements(unittest.TestCase):
         self.assertEqual(len(e2), 2)
         self.assertEqual(len(e3), 1)
 
+    def test_storage(self):
+        """Elements are added and removed within preallocated arrays"""
+        scheduled = LagrangianArray()
+        scheduled.extend(LagrangianArray(lon=np.arange(10.), lat=60))
+        active = LagrangianArray()
+        storage = scheduled._storage['lon'][0]
+        # Releasing the first elements moves only the start of the view
+        scheduled.move_elements(active, np.arange(10) < 3)
+        self.assertIs(scheduled.lon.base, storage)
+        self.assertListEqual(list(scheduled.lon), [3, 4, 5, 6, 7, 8, 9])
+        self.assertListEqual(list(active.lon), [0, 1, 2])
+        storage = active._storage['lon'][0]
+        scheduled.move_elements(active, np.arange(7) < 2)
+        self.assertIs(active.lon.base, storage)
+        self.assertListEqual(list(active.lon), [0, 1, 2, 3, 4])
+        # Attributes may be modified in place or replaced
+        active.lon[0] = 100
+        active.lat = 61
+        scheduled.lon = scheduled.lon + 10
+        scheduled.move_elements(active, np.array([False, True, False,
+                                                  True, False]))
+        self.assertListEqual(list(active.lon), [100, 1, 2, 3, 4, 16, 18])
+        self.assertListEqual(list(active.lat), [61]*5 + [60]*2)
+        self.assertListEqual(list(scheduled.lon), [15, 17, 19])
+        # Removing other elements compacts the arrays
+        deactivated = LagrangianArray()
+        active.move_elements(deactivated, active.lon > 10)
+        self.assertIs(active.lon.base, storage)
+        self.assertListEqual(list(active.lon), [1, 2, 3, 4])
+        self.assertListEqual(list(deactivated.lon), [100, 16, 18])
+        self.assertEqual(len(active), 4)
+
 if __name__ == '__main__':
     unittest.main()
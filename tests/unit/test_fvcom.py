@@ -4,6 +4,7 @@ import matplotlib.pyplot as plt
 from tests import *
 from opendrift.readers import reader_netCDF_CF_unstructured
 from opendrift.models.oceandrift import OceanDrift
+from opendrift.readers.basereader.meshlocator import MeshLocator
 
 akvaplan = "https://thredds.met.no/thredds/dodsC/metusers/knutfd/thredds/netcdf_unstructured_samples/AkvaplanNiva_sample_lonlat_fixed.nc"
 akvaplan_local = "niva/AkvaplanNiva_sample.nc4"
@@ -144,3 +145,178 @@ def test_profile():
     # Elements at 10 and 50m depth should not have same trajectory
     # This is presently failing
     assert o.elements.lon[1] != o.elements.lon[2]
+
+
+def fvcom_mesh_file(filename):
+    """Small FVCOM-like file: 5x5 nodes 1 km apart, 32 triangles."""
+    from netCDF4 import Dataset
+    nx = 5
+    X, Y = np.meshgrid(np.arange(nx) * 1000. + 5.6e5,
+                       np.arange(nx) * 1000. + 7.76e6)
+    n = np.arange(nx * nx).reshape(nx, nx)
+    triangles = []
+    for j in range(nx - 1):
+        for i in range(nx - 1):
+            triangles.append([n[j, i], n[j, i + 1], n[j + 1, i + 1]])
+            triangles.append([n[j, i], n[j + 1, i + 1], n[j + 1, i]])
+    triangles = np.array(triangles)
+    x, y = X.ravel(), Y.ravel()
+    xc, yc = x[triangles].mean(axis=1), y[triangles].mean(axis=1)
+
+    d = Dataset(filename, 'w')
+    d.CoordinateProjection = '+proj=utm +zone=33 +north +ellps=WGS84 +datum=WGS84 +units=m +no_defs'
+    d.CoordinateSystem = 'Cartesian'
+    d.createDimension('node', len(x))
+    d.createDimension('nele', len(xc))
+    d.createDimension('three', 3)
+    d.createDimension('siglay', 3)
+    d.createDimension('siglev', 4)
+    d.createDimension('time', 2)
+    for name, dims, values in [
+            ('x', ('node',), x), ('y', ('node',), y),
+            ('xc', ('nele',), xc), ('yc', ('nele',), yc),
+            ('nv', ('three', 'nele'), triangles.T + 1),
+            ('nbe', ('three', 'nele'), MeshLocator._neighbours_(
+                triangles).T + 1),
+            ('h', ('node',), 100 * np.ones(len(x))),
+            ('h_center', ('nele',), 100 * np.ones(len(xc))),
+            ('siglay', ('siglay', 'node'),
+             np.tile([[-1/6.], [-.5], [-5/6.]], len(x))),
+            ('siglev', ('siglev', 'node'),
+             np.tile([[0], [-1/3.], [-2/3.], [-1]], len(x))),
+            ('siglay_center', ('siglay', 'nele'),
+             np.tile([[-1/6.], [-.5], [-5/6.]], len(xc))),
+            ('siglev_center', ('siglev', 'nele'),
+             np.tile([[0], [-1/3.], [-2/3.], [-1]], len(xc)))]:
+        d.createVariable(name, 'f8', dims)[:] = values
+    t = d.createVariable('time', 'f8', ('time',))
+    t.time_zone = 'UTC'
+    t.units = 'days since 1858-11-17 00:00:00'
+    t.format = 'modified julian day (MJD)'
+    t[:] = [57000, 57000.25]
+    # Linear in space, and different at the two times
+    zeta = d.createVariable('zeta', 'f8', ('time', 'node'))
+    zeta.standard_name = 'sea_surface_height_above_geoid'
+    zeta[:] = [(x - 5.6e5) / 1000., (y - 7.76e6) / 1000.]
+    # Equal to face number in upper layer, and 0 below
+    u = d.createVariable('u', 'f8', ('time', 'siglay', 'nele'))
+    u.standard_name = 'eastward_sea_water_velocity'
+    u[:] = 0
+    u[:, 0, :] = np.arange(len(xc))
+    d.close()
+
+
+def test_unstructured_block(tmpdir):
+    filename = str(tmpdir.join('mesh.nc'))
+    fvcom_mesh_file(filename)
+    r = reader_netCDF_CF_unstructured.Reader(filename)
+    assert r.triangles.shape == (32, 3)
+    np.testing.assert_array_equal(r._mesh_locator_().neighbours,
+                                  MeshLocator._neighbours_(r.triangles))
+
+    x = np.array([5.6025e5, 5.613e5, 5.6377e5, 5.7e5])
+    y = np.array([7.7601e6, 7.7625e6, 7.76399e6, 7.7625e6])
+    z = np.array([-100 / 6., -50, -100 / 3., 0])
+    time = r.start_time + (r.end_time - r.start_time) / 4
+    faces, weights = r._locate_(x, y)
+    assert faces[-1] == -1  # Outside mesh
+    np.testing.assert_array_equal(r.covers_positions(x, y),
+                                  [True, True, True, False])
+    np.testing.assert_array_equal(r._nearest_face_(x[:-1], y[:-1]),
+                                  faces[:-1])
+    np.testing.assert_allclose(weights[:, :-1].sum(axis=0), 1)
+
+    env, _ = r._get_variables_interpolated_(
+        ['sea_surface_height_above_geoid', 'x_sea_water_velocity'],
+        None, None, time, x, y, z)
+    ssh = env['sea_surface_height_above_geoid']
+    np.testing.assert_allclose(
+        ssh[:-1], .75 * (x[:-1] - 5.6e5) / 1000. + .25 * (y[:-1] - 7.76e6) / 1000.)
+    assert np.isnan(ssh[-1])
+    u = env['x_sea_water_velocity']
+    np.testing.assert_allclose(u[:-1], [faces[0], 0, faces[2] / 2.])
+
+    # The block is reused while covering time and positions
+    block = r.block
+    r._get_variables_interpolated_(
+        ['x_sea_water_velocity'], None, None, time + (r.end_time - r.start_time) / 2,
+        x[:2], y[:2], z[:2])
+    assert r.block is block
+
+    # All positions outside mesh give NaN, without reading a block
+    outside, _ = r._get_variables_interpolated_(
+        ['sea_surface_height_above_geoid', 'x_sea_water_velocity'],
+        None, None, time, x[-1:].repeat(2), y[-1:].repeat(2), z[-1:])
+    assert np.isnan(outside['sea_surface_height_above_geoid']).all()
+    assert np.isnan(outside['x_sea_water_velocity']).all()
+    assert r.block is block
+
+    # Same values when ids are read in several slices
+    r.block = None
+    r.block_max_gap = 0  # One slice per id
+    env2, _ = r._get_variables_interpolated_(
+        ['sea_surface_height_above_geoid', 'x_sea_water_velocity'],
+        None, None, time, x, y, z)
+    for var in env:
+        np.testing.assert_array_equal(env[var], env2[var])
+
+
+def test_unstructured_serialised(tmpdir):
+    """Reads wait while another thread holds the netCDF lock"""
+    import threading
+    from opendrift.locks import netcdf_locked
+    filename = str(tmpdir.join('mesh.nc'))
+    fvcom_mesh_file(filename)
+    r = reader_netCDF_CF_unstructured.Reader(filename)
+    x, y = np.array([5.6025e5]), np.array([7.7601e6])
+    env = []
+    t = threading.Thread(target=lambda: env.append(r._get_variables_interpolated_(
+        ['sea_surface_height_above_geoid'], None, None, r.start_time,
+        x, y, np.array([0]))[0]))
+    with netcdf_locked():
+        t.start()
+        t.join(timeout=.5)
+        assert t.is_alive() and env == []
+    t.join()
+    np.testing.assert_allclose(env[0]['sea_surface_height_above_geoid'], .25)
+
+
+def test_unstructured_locate_ids(tmpdir):
+    filename = str(tmpdir.join('mesh.nc'))
+    fvcom_mesh_file(filename)
+    r = reader_netCDF_CF_unstructured.Reader(filename)
+    x = np.array([5.6025e5, 5.613e5, 5.6377e5])
+    y = np.array([7.7601e6, 7.7625e6, 7.76399e6])
+    faces, _ = r._locate_(x, y, ids=[1, 2, 3])
+    lost = r.locator.lost
+    # Element 2 deactivated and element 4 seeded: only element 4 is
+    # looked up in the KD-tree, others walk from their previous faces
+    x2, y2 = np.append(x[[0, 2]] + 10, 5.621e5), np.append(y[[0, 2]], 7.762e6)
+    faces2, _ = r._locate_(x2, y2, ids=[1, 3, 4])
+    assert r.locator.lost == lost + 1
+    np.testing.assert_array_equal(faces2[:2], faces[[0, 2]])
+    np.testing.assert_array_equal(faces2, r._mesh_locator_().locate(x2, y2)[0])
+
+    # Nearest node is the nearest of all nodes, as from KD-tree
+    nodes = r._nearest_node_(x2, y2)
+    distance = np.hypot(r.x[:, np.newaxis] - x2, r.y[:, np.newaxis] - y2)
+    np.testing.assert_array_equal(nodes, np.argmin(distance, axis=0))
+
+
+def test_unstructured_without_blocks(tmpdir):
+    """Readers without _read_block_ give nearest values, also with mesh"""
+    filename = str(tmpdir.join('mesh.nc'))
+    fvcom_mesh_file(filename)
+
+    class NearestReader(reader_netCDF_CF_unstructured.Reader):
+        _read_block_ = None
+
+    r = NearestReader(filename)
+    assert r.triangles is not None and not r._has_blocks_()
+    assert reader_netCDF_CF_unstructured.Reader(filename)._has_blocks_()
+    x, y, z = np.array([5.6025e5]), np.array([7.7601e6]), np.array([-100 / 6.])
+    env, _ = r._get_variables_interpolated_(
+        ['x_sea_water_velocity'], None, None, r.start_time, x, y, z)
+    assert r.block is None
+    np.testing.assert_allclose(env['x_sea_water_velocity'],
+                               r._nearest_face_(x, y))
@@ -0,0 +1,59 @@
+import numpy as np
+
+from opendrift.export.history_buffer import HistoryBuffer, LazyHistory
+
+
+def test_history_buffer():
+    dtype = np.dtype([('lon', np.float32), ('status', np.int32)])
+    h = HistoryBuffer(dtype, 10, 3)
+    assert h.shape == (10, 3)
+    assert h.valid.shape == (3, 2)
+
+    h['lon'][[2, 5], 0] = [4., 5.]
+    h['status'][[2, 5], 0] = 1
+    h.set_valid([2, 5], 0)
+    h['lon'][[9], 1] = 6.
+    h.set_valid([9], 1)
+
+    m = h.to_masked_array()
+    assert m.shape == (10, 3)
+    assert m['lon'].count() == 3
+    np.testing.assert_array_equal(m['lon'][[2, 5], 0], [4., 5.])
+    assert m['lon'][9, 1] == 6.
+    assert m['status'][2, 0] == 1
+    assert m['status'][0, 1] is np.ma.masked
+    assert h.masked('lon', 1).count() == 2
+
+    # Values of previous cycle are replaced with fill values before writing
+    h.clear()
+    h['lon'][[3], 0] = 7.
+    h.set_valid([3], 0)
+    h.fill_invalid(2)
+    assert h['lon'][3, 0] == 7.
+    assert h['lon'][2, 0] == h.fill_values['lon']
+    assert h['lon'][9, 1] == h.fill_values['lon']
+    assert h.to_masked_array(2)['lon'].count() == 1
+
+
+def test_lazy_history():
+    data = np.ma.masked_greater(np.arange(20.).reshape(4, 5), 15)
+    reads = []
+
+    def read(var, elements, times):
+        reads.append(var)
+        if var == 'lon':
+            return data[elements][:, times]
+
+    dtype = np.dtype([('lon', np.float32), ('status', np.int32)])
+    h = LazyHistory(read, dtype, elements=[1, 3], times=[0, 2, 4])
+    assert h.shape == (2, 3)
+    assert reads == []
+    np.testing.assert_array_equal(h['lon'], [[5, 7, 9], [15, 17, 19]])
+    assert h['lon'].dtype == np.float32
+    assert h['lon'].count() == 4
+    assert h.read('lon', elements=[1], times=slice(0, 2)).tolist() == \
+        [[15, None]]
+    assert h['status'].count() == 0  # Not in file
+    assert h.to_masked_array()['lon'].count() == 4
+    np.testing.assert_array_equal(h.read_at('lon', [2, 0]), [9, 15])
+    assert reads.count('lon') == 7  # One read per distinct time step
@@ -26,9 +26,11 @@ from opendrift.models.oceandrift import OceanDrift
 from opendrift.readers import reader_netCDF_CF_generic
 from opendrift.readers import reader_ROMS_native
 from opendrift.readers.interpolation import \
-        expand_numpy_array, \
-        ReaderBlock, LinearND2DInterpolator, \
-        NDImage2DInterpolator, Nearest2DInterpolator, \
+        expand_numpy_array, extrapolate_missing, \
+        ReaderBlock, ClusteredReaderBlock, SharedReaderBlockPool, \
+        ReaderBlockCache, ReaderTileCache, \
+        LinearND2DInterpolator, \
+        NDImage2DInterpolator, Nearest2DInterpolator, Linear2DInterpolator, \
         Nearest1DInterpolator, Linear1DInterpolator
 
 o = OceanDrift()
@@ -158,6 +160,39 @@ class TestInterpolation(unittest.TestCase):
         self.assertTrue(np.allclose(interpolator(data),
                                     [0.0, 2.2, 3]))
 
+    def test_interpolators_grid_points(self):
+        # Grid coordinates map to grid indices, the last index at the
+        # maximum of the coordinates
+        xgrid = 100. + 10*np.arange(5)
+        ygrid = -20. + 5*np.arange(4)
+        data = np.arange(4)[:, np.newaxis]*10. + np.arange(5)
+        gx, gy = np.meshgrid(xgrid, ygrid)
+        x, y = gx.ravel(), gy.ravel()
+        for interpolator in [Nearest2DInterpolator, NDImage2DInterpolator,
+                             Linear2DInterpolator]:
+            values = interpolator(xgrid, ygrid, x, y)(data)
+            np.testing.assert_array_equal(values, data.ravel())
+
+        # Between grid points and at edges
+        x = np.array([105., 140., 100., 137.5])
+        y = np.array([-20., -12.5, -5., -5.])
+        np.testing.assert_allclose(
+            Linear2DInterpolator(xgrid, ygrid, x, y)(data),
+            [.5, 19, 30, 33.75])
+        np.testing.assert_allclose(
+            Linear2DInterpolator(xgrid, ygrid, x, y).layers(
+                data[np.newaxis])[0], [.5, 19, 30, 33.75])
+        np.testing.assert_array_equal(
+            Nearest2DInterpolator(xgrid, ygrid, x, y)(data),
+            [0, 24, 30, 34])
+
+        # Outside grid: value at nearest edge
+        x = np.array([95., 150.])
+        y = np.array([-25., 0.])
+        for interpolator in [Nearest2DInterpolator, Linear2DInterpolator]:
+            np.testing.assert_array_equal(
+                interpolator(xgrid, ygrid, x, y)(data.copy()), [0, 34])
+
     def test_compare_interpolators(self):
 
         data_dict, x, y, z = self.get_synthetic_data_dict()
@@ -328,6 +363,198 @@ class TestInterpolation(unittest.TestCase):
         self.assertEqual(
             np.sum(~np.isfinite(env['x_sea_water_velocity'])), 31)
 
+    def test_shared_block_pool(self):
+        import os
+        import multiprocessing
+        data_dict, x, y, z = self.get_synthetic_data_dict()
+        b = ReaderBlock(data_dict.copy())
+        env, prof = b.interpolate(x, y, z, ['var2d', 'var3d'])
+
+        pool = SharedReaderBlockPool()
+        key = ('reader', ('var2d', 'var3d'), 0)
+        bs = pool.get(key, lambda: ReaderBlock(data_dict.copy()))
+        self.assertEqual(pool.misses, 1)
+        envs, profs = bs.interpolate(x, y, z, ['var2d', 'var3d'])
+        for var in ['var2d', 'var3d']:
+            np.testing.assert_array_equal(env[var], envs[var])
+            # Shared arrays are not modified by interpolation
+            self.assertFalse(bs.data_dict[var].flags.writeable)
+
+        # Block is reused by forked process, without reading data
+        def use_shared(pool):
+            block = pool.get(key, None)
+            ok = pool.hits == 1 and block.x[0] == -70
+            pool.release(key)
+            os._exit(0 if ok else 1)
+        p = multiprocessing.get_context('fork').Process(
+            target=use_shared, args=(pool,))
+        p.start()
+        p.join()
+        self.assertEqual(p.exitcode, 0)
+
+        self.assertIs(pool.get(key, None), bs)
+        segment = '/dev/shm/' + pool._segment_name(key)
+        self.assertTrue(os.path.exists(segment))
+        pool.release(key)  # Last reference is released
+        self.assertFalse(os.path.exists(segment))
+
+    def test_shared_block_pool_bounded(self):
+        from multiprocessing import shared_memory
+        data_dict, x, y, z = self.get_synthetic_data_dict()
+        pool = SharedReaderBlockPool()
+        keys = [('reader', ('var2d', 'var3d'), t) for t in range(3)]
+
+        def segments():
+            count = 0
+            for key in keys:
+                try:
+                    shared_memory.SharedMemory(
+                        name=pool._segment_name(key)).close()
+                    count += 1
+                except FileNotFoundError:
+                    pass
+            return count
+
+        # Repeated requests of a key hold one segment, released once
+        for i in range(10):
+            for key in keys[0:2]:
+                pool.get(key, lambda: ReaderBlock(data_dict.copy()))
+        self.assertEqual((pool.hits, pool.misses), (18, 2))
+        self.assertEqual(segments(), 2)
+        pool.release(keys[0])
+        self.assertEqual(segments(), 1)
+        pool.get(keys[2], lambda: ReaderBlock(data_dict.copy()))
+        self.assertEqual(segments(), 2)
+        pool.close()
+        self.assertEqual(segments(), 0)
+        self.assertEqual(pool.held, {})
+
+    def test_block_cache(self):
+        data_dict, x, y, z = self.get_synthetic_data_dict()
+        t = data_dict['time']
+        block_mb = ReaderBlockCache.block_nbytes(
+            ReaderBlock(data_dict.copy())) / 1e6
+        cache = ReaderBlockCache(max_mb=2.5*block_mb)
+        covers = lambda block: block.covers_positions(x, y)
+        make_block = lambda: ReaderBlock(data_dict.copy())
+
+        b1 = cache.get(['var2d', 'var3d'], t, covers, make_block)
+        # Subset of variables at same time is taken from cache
+        self.assertIs(cache.get(['var2d'], t, covers, make_block), b1)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        # Block not covering positions, or other time, is not reused
+        b2 = cache.get(['var2d'], t, lambda block: False, make_block)
+        self.assertIsNot(b2, b1)
+        b3 = cache.get(['var2d'], 0, covers, make_block)
+        self.assertEqual((cache.hits, cache.misses), (1, 3))
+        # Least recently used block is removed, within memory budget
+        self.assertEqual(len(cache.blocks), 2)
+        self.assertLessEqual(cache.nbytes, 2.5*block_mb*1e6)
+        self.assertIsNot(cache.get(['var3d'], t, covers, make_block), b1)
+        self.assertIs(cache.get(['var2d'], 0, covers, make_block), b3)
+        cache.clear()
+        self.assertEqual(cache.nbytes, 0)
+
+    def test_tile_cache(self):
+        data_dict, x, y, z = self.get_synthetic_data_dict()
+        grid = data_dict['var3d'].filled(np.nan)  # (z, y, x)
+        reads = []
+
+        def read(slices):
+            reads.append(slices)
+            return grid[slices]
+
+        cache = ReaderTileCache(max_mb=10, tile_shape=(2, 16, 32))
+        indices = [np.arange(1, 4), np.arange(10, 40), np.arange(-5, 50)]
+        values = cache.get('var3d', indices, grid.shape, read)
+        np.testing.assert_array_equal(values, grid[np.ix_(*indices)])
+        # Tiles along x are read together, also across x-boundary
+        self.assertEqual(cache.misses, 2*3*3)
+        self.assertEqual(len(reads), 2*3*2)
+        # Only tiles not already read are read when block grows
+        reads.clear()
+        indices = [np.arange(1, 4), np.arange(10, 50), np.arange(20, 40)]
+        values = cache.get('var3d', indices, grid.shape, read)
+        np.testing.assert_array_equal(values, grid[np.ix_(*indices)])
+        self.assertEqual((cache.hits, cache.misses), (2*3*2, 2*3*3 + 2*1*2))
+        self.assertEqual(len(reads), 2)
+        # Least recently used tiles are removed, within memory budget
+        tile_mb = 2*16*32*grid.itemsize / 1e6
+        cache.max_bytes = 5.5*tile_mb*1e6
+        cache.get('var3d', [np.arange(2), np.arange(16), np.arange(64)],
+                  grid.shape, read)
+        self.assertEqual(len(cache.tiles), 5)
+        self.assertIn(('var3d', (0, 0, 1)), cache.tiles)
+
+    def test_clustered_block(self):
+        data_dict, x, y, z = self.get_synthetic_data_dict()
+        b = ReaderBlock(data_dict.copy())
+        env, prof = b.interpolate(x, y, z, ['var2d', 'var3d'],
+                                  profiles=['var3d'], profiles_depth=[-100, 0])
+
+        def sub_block(ix, iy):
+            d = {'x': data_dict['x'][ix], 'y': data_dict['y'][iy],
+                 'z': data_dict['z'], 'time': data_dict['time'],
+                 'var2d': data_dict['var2d'][iy, ix],
+                 'var3d': data_dict['var3d'][:, iy, ix]}
+            return ReaderBlock(d)
+
+        # Overlapping blocks, each containing the holes near its points
+        cb = ClusteredReaderBlock([sub_block(slice(0, 130), slice(0, 70)),
+                                   sub_block(slice(70, 200), slice(30, 100))])
+        self.assertTrue(cb.covers_positions(x, y))
+        self.assertFalse(cb.covers_positions(np.array([400.]),
+                                             np.array([20.])))
+        # First block is used where blocks overlap
+        indices = cb.block_indices(x, y)
+        self.assertEqual(indices[0:60].tolist(), [0]*60)
+        self.assertEqual(indices[70:].tolist(), [1]*30)
+        envc, profc = cb.interpolate(x, y, z, ['var2d', 'var3d'],
+                                     profiles=['var3d'],
+                                     profiles_depth=[-100, 0])
+        for var in ['var2d', 'var3d']:
+            np.testing.assert_array_almost_equal(env[var], envc[var])
+        np.testing.assert_array_equal(prof['z'], profc['z'])
+        np.testing.assert_array_almost_equal(prof['var3d'], profc['var3d'])
+
+    def test_linear_layers(self):
+        data_dict, x, y, z = self.get_synthetic_data_dict()
+        # Including points outside grid
+        x = np.append(x, [-100, 500])
+        y = np.append(y, [20, 400])
+        data = data_dict['var3d'].filled(np.nan)
+        interpolator = Linear2DInterpolator(data_dict['x'], data_dict['y'],
+                                            x, y)
+        layers = interpolator.layers(data.copy())
+        self.assertEqual(layers.shape, (5, 102))
+        for layer in range(5):
+            np.testing.assert_array_almost_equal(
+                layers[layer], interpolator(data[layer].copy()))
+
+    def test_coast_extrapolation(self):
+        data_dict, x, y, z = self.get_synthetic_data_dict()
+        data = data_dict['var3d'].filled(np.nan)
+        # Same values as repeated expansion of array in place
+        expanded = data[1].copy()
+        for i in range(3):
+            expand_numpy_array(expanded)
+        np.testing.assert_array_equal(
+            extrapolate_missing(data, max_iterations=3)[1], expanded)
+        filled = extrapolate_missing(data, method='nearest')
+        self.assertTrue(np.isfinite(filled).all())
+        np.testing.assert_array_equal(filled[np.isfinite(data)],
+                                      data[np.isfinite(data)])
+
+        b = ReaderBlock(data_dict.copy())
+        original = b.data_dict['var3d'].copy()
+        env, prof = b.interpolate(x, y, z, ['var2d', 'var3d'])
+        # Extrapolated arrays are kept, and block data is not modified
+        self.assertEqual(set(b.extrapolated_dict), {'var2d', 'var3d'})
+        np.testing.assert_array_equal(b.data_dict['var3d'], original)
+        interpolator = Linear2DInterpolator(b.x, b.y, x, y)
+        np.testing.assert_array_equal(
+            env['var2d'], interpolator(data_dict['var2d'].filled(np.nan)))
+
     def test_expand_array(self):
         reader = reader_ROMS_native.Reader(o.test_data_folder() +
             '2Feb2016_Nordic_sigma_3d/Nordic-4km_SLEVELS_avg_00_subset2Feb2016.nc')
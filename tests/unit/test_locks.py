@@ -0,0 +1,64 @@
+import threading
+from datetime import datetime
+import xarray as xr
+
+from opendrift import locks
+from opendrift.export import io_netcdf
+from opendrift.models.oceandrift import OceanDrift
+
+
+def held():
+    """Whether netcdf_lock is held, as seen from another thread."""
+    acquired = []
+
+    def acquire():
+        acquired.append(locks.netcdf_lock.acquire(blocking=False))
+        if acquired[0]:
+            locks.netcdf_lock.release()
+    t = threading.Thread(target=acquire)
+    t.start()
+    t.join()
+    return not acquired[0]
+
+
+class FakeReader:
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    @locks.netcdf4_locked
+    def read(self):
+        return held()
+
+
+def test_netcdf_locked_reentrant():
+    assert locks.shared_with_xarray
+    with locks.netcdf_locked():
+        with locks.netcdf_locked():
+            assert held()
+        assert held()
+    assert not held()
+
+
+def test_netcdf4_locked():
+    # Locked for netCDF4 datasets, not for xarray which locks itself
+    assert FakeReader(None).read() is True
+    assert FakeReader(xr.Dataset()).read() is False
+
+
+def test_reads_netcdf4(tmpdir):
+    from netCDF4 import Dataset
+    with Dataset(str(tmpdir.join('f.nc')), 'w') as d:
+        assert locks.reads_netcdf4(FakeReader(d))
+    assert not locks.reads_netcdf4(FakeReader(xr.Dataset()))
+    assert not locks.reads_netcdf4(FakeReader(None))
+
+
+def test_output_thread_without_xarray_lock(tmpdir, monkeypatch):
+    monkeypatch.setattr(io_netcdf, 'shared_with_xarray', False)
+    o = OceanDrift(loglevel=50)
+    o.set_config('environment:fallback:land_binary_mask', 0)
+    o.set_config('general:output_thread', True)
+    o.seed_elements(4.25, 60.2, number=3, time=datetime(2020, 1, 1))
+    o.run(steps=4, time_step=900, outfile=str(tmpdir.join('out.nc')))
+    assert o.output_writer is None
+    assert o.history.shape == (3, 5)